@@ -0,0 +1,158 @@
+"""基準測試的計時、統計與基準線比較工具。"""
+
+from __future__ import annotations
+
+import json
+import math
+import platform
+import statistics
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+RESULT_SCHEMA_VERSION = 1
+
+
+@dataclass
+class BenchmarkResult:
+    name: str
+    group: str
+    params: Dict[str, Any]
+    samples_ms: List[float] = field(repr=False)
+
+    def summary(self) -> Dict[str, Any]:
+        stats = summarize(self.samples_ms)
+        return {"name": self.name, "group": self.group, "params": self.params, **stats}
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """線性內插的百分位數；`sorted_values` 需已排序。"""
+
+    if not sorted_values:
+        return math.nan
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    rank = (len(sorted_values) - 1) * pct / 100.0
+    low = math.floor(rank)
+    high = math.ceil(rank)
+    if low == high:
+        return sorted_values[low]
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(samples_ms: Sequence[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "n": len(ordered),
+        "min_ms": ordered[0] if ordered else math.nan,
+        "median_ms": percentile(ordered, 50),
+        "p95_ms": percentile(ordered, 95),
+        "p99_ms": percentile(ordered, 99),
+        "max_ms": ordered[-1] if ordered else math.nan,
+        "mean_ms": statistics.fmean(ordered) if ordered else math.nan,
+        "stdev_ms": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def measure(
+    name: str,
+    group: str,
+    params: Dict[str, Any],
+    func: Callable[[], Any],
+    *,
+    repeat: int,
+    warmup: int,
+    inner_loops: int = 1,
+) -> BenchmarkResult:
+    """執行 `func`，先暖機再記錄每次（平均到 `inner_loops` 次呼叫）的耗時。"""
+
+    for _ in range(warmup):
+        func()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(inner_loops):
+            func()
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed * 1000.0 / inner_loops)
+    return BenchmarkResult(name=name, group=group, params=params, samples_ms=samples)
+
+
+def build_report(results: Sequence[BenchmarkResult], meta: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "schema_version": RESULT_SCHEMA_VERSION,
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            **meta,
+        },
+        "results": [result.summary() for result in results],
+    }
+
+
+def write_report(report: Dict[str, Any], path: Path) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+def load_report(path: Path) -> Dict[str, Any]:
+    report = json.loads(path.read_text())
+    if report.get("schema_version") != RESULT_SCHEMA_VERSION:
+        raise ValueError(f"不支援的基準線格式：{path}")
+    return report
+
+
+@dataclass
+class Comparison:
+    name: str
+    baseline_ms: float
+    current_ms: float
+    ratio: float
+    regressed: bool
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def compare_reports(
+    current: Dict[str, Any],
+    baseline: Dict[str, Any],
+    *,
+    tolerance: float,
+    metric: str = "median_ms",
+) -> List[Comparison]:
+    """以 `metric` 比較兩份報告中同名案例；比值超過 `1 + tolerance` 視為退步。"""
+
+    baseline_by_name = {item["name"]: item for item in baseline.get("results", [])}
+    comparisons: List[Comparison] = []
+    for item in current.get("results", []):
+        reference: Optional[Dict[str, Any]] = baseline_by_name.get(item["name"])
+        if reference is None or not reference.get(metric):
+            continue
+        ratio = item[metric] / reference[metric]
+        comparisons.append(
+            Comparison(
+                name=item["name"],
+                baseline_ms=reference[metric],
+                current_ms=item[metric],
+                ratio=ratio,
+                regressed=ratio > 1.0 + tolerance,
+            )
+        )
+    return comparisons
+
+
+def format_comparisons(comparisons: Sequence[Comparison]) -> str:
+    if not comparisons:
+        return "基準線中沒有可比較的案例"
+    width = max(len(c.name) for c in comparisons)
+    lines = [f"{'case'.ljust(width)}  baseline_ms  current_ms   ratio"]
+    for c in comparisons:
+        flag = "  REGRESSED" if c.regressed else ""
+        lines.append(
+            f"{c.name.ljust(width)}  {c.baseline_ms:11.3f}  {c.current_ms:10.3f}  {c.ratio:6.2f}x{flag}"
+        )
+    return "\n".join(lines)
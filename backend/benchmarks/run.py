@@ -0,0 +1,357 @@
+"""陰影查詢與 Python 熱點的基準測試入口。
+
+涵蓋案例：
+- `decode_polyline`：不同長度的合成路線。
+- `compute_solar_position`：單次 pvlib 太陽位置計算。
+- `compute_shadow_geojson`：搜尋半徑 × 太陽仰角。
+- `score_route`：評分模式（dissolve / clip）× 路線長度 × 太陽仰角，並記錄分數以確認兩種模式結果一致。
+- `rank_routes`：同一組候選路線以 exact 與 two_phase 排序 × 太陽仰角，記錄精確評分數、剪枝數與勝出路線是否一致。
+
+資料庫案例需先以 `benchmarks.synthetic_city` 將合成城市載入本機 PostGIS；
+結果輸出為 JSON，可透過 `--baseline` 與先前存下的結果比較。
+
+範例：
+    uv run python -m benchmarks.run --database vampire_bench --output data/bench/current.json
+    uv run python -m benchmarks.run --database vampire_bench --baseline data/bench/baseline.json --fail-on-regression
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from dataclasses import asdict
+from pathlib import Path
+from typing import List, Sequence
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+for path in (BACKEND_ROOT / "src", BACKEND_ROOT):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from benchmarks.harness import (
+    BenchmarkResult,
+    build_report,
+    compare_reports,
+    format_comparisons,
+    load_report,
+    measure,
+    write_report,
+)
+from benchmarks.synthetic_city import CityConfig, generate_buildings, generate_route, load_city
+
+DEFAULT_AZIMUTH_DEG = 132.62093746276173
+DEFAULT_RADII_M = (50.0, 200.0, 500.0)
+DEFAULT_ELEVATIONS_DEG = (10.0, 35.0, 80.0)
+DEFAULT_ROUTE_LENGTHS_M = (500.0, 2000.0, 5000.0)
+DEFAULT_SCORING_MODES = ("dissolve", "clip")
+DEFAULT_RANKING_CANDIDATES = 8
+DEFAULT_RANKING_ROUTE_LENGTH_M = 1500.0
+
+
+def _parse_floats(value: str) -> List[float]:
+    return [float(item) for item in value.split(",") if item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="執行陰影查詢與 Python 熱點的基準測試")
+    parser.add_argument("--database", help="資料庫名稱（覆寫 PGDATABASE）；建議使用獨立的基準測試資料庫")
+    parser.add_argument("--load-city", action="store_true", help="執行前重建合成城市（會 DROP buildings）")
+    parser.add_argument("--skip-db", action="store_true", help="只跑不需資料庫的 Python 案例")
+    parser.add_argument("--seed", type=int, default=CityConfig.seed, help="合成城市種子")
+    parser.add_argument("--density", type=float, default=CityConfig.density_per_hectare, help="每公頃建物數")
+    parser.add_argument(
+        "--radii",
+        type=_parse_floats,
+        default=list(DEFAULT_RADII_M),
+        help="compute_shadow_geojson 的搜尋半徑（公尺，逗號分隔）",
+    )
+    parser.add_argument(
+        "--elevations",
+        type=_parse_floats,
+        default=list(DEFAULT_ELEVATIONS_DEG),
+        help="太陽仰角（度，逗號分隔）",
+    )
+    parser.add_argument(
+        "--route-lengths",
+        type=_parse_floats,
+        default=list(DEFAULT_ROUTE_LENGTHS_M),
+        help="score_route / decode_polyline 的路線長度（公尺，逗號分隔）",
+    )
+    parser.add_argument(
+        "--scoring-modes",
+        type=lambda value: [item.strip() for item in value.split(",") if item.strip()],
+        default=list(DEFAULT_SCORING_MODES),
+        help="score_route 的評分模式（逗號分隔）",
+    )
+    parser.add_argument(
+        "--ranking-candidates",
+        type=int,
+        default=DEFAULT_RANKING_CANDIDATES,
+        help="rank_routes 的候選路線數（0 表示略過）",
+    )
+    parser.add_argument(
+        "--ranking-route-length",
+        type=float,
+        default=DEFAULT_RANKING_ROUTE_LENGTH_M,
+        help="rank_routes 每條候選路線的長度（公尺）",
+    )
+    parser.add_argument("--repeat", type=int, default=10, help="每個案例記錄的次數")
+    parser.add_argument("--warmup", type=int, default=2, help="每個案例的暖機次數")
+    parser.add_argument("--output", help="結果 JSON 輸出路徑；未指定則只印出摘要")
+    parser.add_argument("--baseline", help="要比較的基準線 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="中位數允許退步比例（預設 10%%）")
+    parser.add_argument(
+        "--fail-on-regression",
+        action="store_true",
+        help="任何案例退步超過容忍值時以非零狀態結束",
+    )
+    return parser
+
+
+def bench_python(config: CityConfig, args: argparse.Namespace) -> List[BenchmarkResult]:
+    import pandas as pd
+
+    from utils import solar_position
+    from utils.shadow_route_optimizer import decode_polyline
+
+    results: List[BenchmarkResult] = []
+    for length in args.route_lengths:
+        encoded = generate_route(config, length).encoded_polyline
+        results.append(
+            measure(
+                f"decode_polyline[len={length:g}]",
+                "decode_polyline",
+                {"route_length_m": length, "encoded_chars": len(encoded)},
+                lambda encoded=encoded: decode_polyline(encoded),
+                repeat=args.repeat,
+                warmup=args.warmup,
+                inner_loops=100,
+            )
+        )
+
+    timestamp = pd.Timestamp("2024-11-05T09:00:00+08:00")
+    results.append(
+        measure(
+            "compute_solar_position",
+            "compute_solar_position",
+            {"timestamp": timestamp.isoformat()},
+            lambda: solar_position.compute_solar_position(
+                timestamp=timestamp,
+                latitude=config.center_lat,
+                longitude=config.center_lng,
+                altitude=20.0,
+                pressure=101325.0,
+                temperature=25.0,
+            ),
+            repeat=args.repeat,
+            warmup=args.warmup,
+            inner_loops=10,
+        )
+    )
+    return results
+
+
+def bench_database(config: CityConfig, args: argparse.Namespace) -> List[BenchmarkResult]:
+    from db.database import get_session
+    from utils.shadow_area import ShadowAreaParams, compute_shadow_geojson
+    from utils.shadow_route_optimizer import RouteCandidate, ShadowRouteParams, score_route
+
+    results: List[BenchmarkResult] = []
+    for radius in args.radii:
+        for elevation in args.elevations:
+            params = ShadowAreaParams(
+                center_lat=config.center_lat,
+                center_lng=config.center_lng,
+                search_radius=radius,
+                azimuth_deg=DEFAULT_AZIMUTH_DEG,
+                elevation_deg=elevation,
+            )
+            results.append(
+                measure(
+                    f"compute_shadow_geojson[r={radius:g},el={elevation:g}]",
+                    "compute_shadow_geojson",
+                    {"search_radius_m": radius, "elevation_deg": elevation},
+                    lambda params=params: compute_shadow_geojson(params),
+                    repeat=args.repeat,
+                    warmup=args.warmup,
+                )
+            )
+
+    session = get_session()
+    try:
+        for length in args.route_lengths:
+            route = generate_route(config, length)
+            origin, dest = route.coordinates[0], route.coordinates[-1]
+            candidate = RouteCandidate(
+                route_id=route.route_id,
+                encoded_polyline=route.encoded_polyline,
+                coordinates=route.coordinates,
+                distance_m=int(route.length_m),
+                duration=None,
+                description=None,
+                wkt=route.wkt,
+            )
+            for elevation in args.elevations:
+                for mode in args.scoring_modes:
+                    route_params = ShadowRouteParams(
+                        origin_lat=origin[0],
+                        origin_lng=origin[1],
+                        dest_lat=dest[0],
+                        dest_lng=dest[1],
+                        azimuth_deg=DEFAULT_AZIMUTH_DEG,
+                        elevation_deg=elevation,
+                        scoring_mode=mode,
+                    )
+                    results.append(
+                        measure(
+                            f"score_route[mode={mode},len={length:g},el={elevation:g}]",
+                            "score_route",
+                            {
+                                "scoring_mode": mode,
+                                "route_length_m": round(route.length_m, 1),
+                                "elevation_deg": elevation,
+                            },
+                            lambda route_params=route_params: score_route(candidate, session, route_params),
+                            repeat=args.repeat,
+                            warmup=args.warmup,
+                        )
+                    )
+                    results[-1].params["shadow_area_m2"] = round(candidate.shadow_area_m2, 3)
+        session.rollback()
+    finally:
+        session.close()
+    return results
+
+
+def bench_ranking(config: CityConfig, args: argparse.Namespace) -> List[BenchmarkResult]:
+    from utils.shadow_route_optimizer import (
+        RouteCandidate,
+        ShadowRouteParams,
+        estimate_candidates,
+        rank_candidates,
+        rank_two_phase,
+        score_candidates,
+        select_for_exact,
+    )
+
+    routes = [
+        generate_route(config, args.ranking_route_length, index=index) for index in range(args.ranking_candidates)
+    ]
+    if len(routes) < 2:
+        return []
+
+    def fresh_candidates() -> List[RouteCandidate]:
+        return [
+            RouteCandidate(
+                route_id=route.route_id,
+                encoded_polyline=route.encoded_polyline,
+                coordinates=route.coordinates,
+                distance_m=int(route.length_m),
+                duration=None,
+                description=None,
+                wkt=route.wkt,
+            )
+            for route in routes
+        ]
+
+    def rank_exact(params: ShadowRouteParams) -> dict:
+        candidates = fresh_candidates()
+        score_candidates(params, candidates)
+        return rank_candidates(params, candidates)
+
+    def rank_staged(params: ShadowRouteParams) -> dict:
+        candidates = fresh_candidates()
+        samples = estimate_candidates(params, candidates)
+        score_candidates(params, select_for_exact(candidates))
+        return rank_two_phase(params, candidates, samples)
+
+    origin, dest = routes[0].coordinates[0], routes[0].coordinates[-1]
+    results: List[BenchmarkResult] = []
+    for elevation in args.elevations:
+        params = ShadowRouteParams(
+            origin_lat=origin[0],
+            origin_lng=origin[1],
+            dest_lat=dest[0],
+            dest_lng=dest[1],
+            azimuth_deg=DEFAULT_AZIMUTH_DEG,
+            elevation_deg=elevation,
+        )
+        exact = rank_exact(params)
+        staged = rank_staged(params)
+        for mode, func, outcome in (("exact", rank_exact, exact), ("two_phase", rank_staged, staged)):
+            results.append(
+                measure(
+                    f"rank_routes[mode={mode},n={len(routes)},el={elevation:g}]",
+                    "rank_routes",
+                    {
+                        "ranking": mode,
+                        "candidates": len(routes),
+                        "route_length_m": args.ranking_route_length,
+                        "elevation_deg": elevation,
+                    },
+                    lambda func=func: func(params),
+                    repeat=args.repeat,
+                    warmup=args.warmup,
+                )
+            )
+            results[-1].params["best_route_id"] = outcome["best_route_id"]
+        ranking = staged["ranking"]
+        results[-1].params.update(
+            exact_scored=ranking["exact_scored"],
+            pruned=ranking["pruned"],
+            samples=ranking["samples"],
+            same_winner=staged["best_route_id"] == exact["best_route_id"],
+        )
+    return results
+
+
+def run(argv: Sequence[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.database:
+        os.environ["PGDATABASE"] = args.database
+    config = CityConfig(seed=args.seed, density_per_hectare=args.density)
+
+    if args.load_city and not args.skip_db:
+        if not args.database:
+            parser.error("--load-city 需搭配 --database，避免覆寫正式資料庫")
+        buildings = generate_buildings(config)
+        count = load_city(buildings, database=args.database)
+        print(f"已載入 {count} 棟合成建物")
+
+    results = bench_python(config, args)
+    if not args.skip_db:
+        results.extend(bench_database(config, args))
+        results.extend(bench_ranking(config, args))
+
+    report = build_report(
+        results,
+        {
+            "city": asdict(config),
+            "database": os.getenv("PGDATABASE"),
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+        },
+    )
+    for item in report["results"]:
+        print(f"{item['name']}: median {item['median_ms']:.3f} ms, p95 {item['p95_ms']:.3f} ms")
+
+    if args.output:
+        write_report(report, Path(args.output))
+        print(f"結果已輸出至 {args.output}")
+
+    if args.baseline:
+        comparisons = compare_reports(report, load_report(Path(args.baseline)), tolerance=args.tolerance)
+        print(format_comparisons(comparisons))
+        if args.fail_on_regression and any(c.regressed for c in comparisons):
+            return 1
+    return 0
+
+
+def main() -> None:
+    sys.exit(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,335 @@
+"""可重現的合成城市產生器，供陰影查詢基準測試使用。
+
+此模組會：
+1. 依種子、街廓尺寸、建物密度與高度分布，產生固定的一批矩形建物（同一組設定永遠得到同一座城市）。
+2. 沿著街道格網產生指定長度的步行路線，並輸出 Google Encoded Polyline 與 WKT。
+3. 將建物寫入 PostGIS 的 `buildings` 資料表（欄位與 `202411051230` 遷移一致），讓 SQL 查詢可直接跑在合成資料上。
+
+範例：
+    uv run python -m benchmarks.synthetic_city --database vampire_bench --density 40
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+for path in (BACKEND_ROOT / "src", BACKEND_ROOT):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
+
+from sqlalchemy import text
+
+from db.database import get_session
+
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+@dataclass(frozen=True)
+class CityConfig:
+    """合成城市的所有可調參數；相同設定必定產生相同城市。"""
+
+    seed: int = 20241105
+    center_lat: float = 25.0217746
+    center_lng: float = 121.5351267
+    extent_m: float = 2000.0
+    block_size_m: float = 80.0
+    street_width_m: float = 12.0
+    density_per_hectare: float = 30.0
+    footprint_min_m: float = 8.0
+    footprint_max_m: float = 30.0
+    height_median_m: float = 18.0
+    height_sigma: float = 0.6
+    height_min_m: float = 3.0
+    height_max_m: float = 180.0
+
+    @property
+    def pitch_m(self) -> float:
+        return self.block_size_m + self.street_width_m
+
+
+@dataclass(frozen=True)
+class SyntheticBuilding:
+    build_id: str
+    ring: Tuple[Tuple[float, float], ...]
+    height_m: float
+
+    def to_wkt(self) -> str:
+        parts = ", ".join(f"{lng} {lat}" for lat, lng in self.ring)
+        return f"POLYGON (({parts}))"
+
+
+@dataclass(frozen=True)
+class SyntheticRoute:
+    route_id: str
+    coordinates: Tuple[Tuple[float, float], ...]
+    length_m: float
+
+    @property
+    def encoded_polyline(self) -> str:
+        return encode_polyline(self.coordinates)
+
+    @property
+    def wkt(self) -> str:
+        parts = ", ".join(f"{lng} {lat}" for lat, lng in self.coordinates)
+        return f"LINESTRING ({parts})"
+
+
+class LocalProjector:
+    """以城市中心為原點的等距近似投影，公尺與經緯度互轉。"""
+
+    def __init__(self, center_lat: float, center_lng: float) -> None:
+        self.center_lat = center_lat
+        self.center_lng = center_lng
+        self._meters_per_degree_lng = METERS_PER_DEGREE_LAT * math.cos(math.radians(center_lat))
+
+    def to_lat_lng(self, x: float, y: float) -> Tuple[float, float]:
+        lat = self.center_lat + y / METERS_PER_DEGREE_LAT
+        lng = self.center_lng + x / self._meters_per_degree_lng
+        return round(lat, 7), round(lng, 7)
+
+
+def generate_buildings(config: CityConfig) -> List[SyntheticBuilding]:
+    """於每個街廓內隨機擺放建物，數量依 `density_per_hectare` 決定。"""
+
+    rng = random.Random(config.seed)
+    projector = LocalProjector(config.center_lat, config.center_lng)
+    half = config.extent_m / 2.0
+    blocks_per_side = max(1, int(config.extent_m // config.pitch_m))
+    block_area_ha = (config.block_size_m ** 2) / 10_000.0
+    mu = math.log(config.height_median_m)
+
+    buildings: List[SyntheticBuilding] = []
+    for bx in range(blocks_per_side):
+        for by in range(blocks_per_side):
+            block_x0 = -half + bx * config.pitch_m + config.street_width_m / 2.0
+            block_y0 = -half + by * config.pitch_m + config.street_width_m / 2.0
+            expected = config.density_per_hectare * block_area_ha
+            count = int(expected) + (1 if rng.random() < expected - int(expected) else 0)
+            for _ in range(count):
+                width = rng.uniform(config.footprint_min_m, config.footprint_max_m)
+                depth = rng.uniform(config.footprint_min_m, config.footprint_max_m)
+                width = min(width, config.block_size_m)
+                depth = min(depth, config.block_size_m)
+                x0 = block_x0 + rng.uniform(0.0, config.block_size_m - width)
+                y0 = block_y0 + rng.uniform(0.0, config.block_size_m - depth)
+                height = rng.lognormvariate(mu, config.height_sigma)
+                height = min(max(height, config.height_min_m), config.height_max_m)
+                corners = [(x0, y0), (x0 + width, y0), (x0 + width, y0 + depth), (x0, y0 + depth), (x0, y0)]
+                ring = tuple(projector.to_lat_lng(x, y) for x, y in corners)
+                buildings.append(
+                    SyntheticBuilding(
+                        build_id=f"SYN_{len(buildings):07d}",
+                        ring=ring,
+                        height_m=round(height, 2),
+                    )
+                )
+    return buildings
+
+
+def generate_route(config: CityConfig, length_m: float, *, index: int = 0) -> SyntheticRoute:
+    """沿街道中心線走出長度約為 `length_m` 的折線路徑（東西、南北交替轉彎）。"""
+
+    rng = random.Random(f"{config.seed}:route:{index}:{length_m}")
+    projector = LocalProjector(config.center_lat, config.center_lng)
+    half = config.extent_m / 2.0
+    lines = max(1, int(config.extent_m // config.pitch_m))
+    street_positions = [-half + i * config.pitch_m for i in range(lines + 1)]
+
+    x = rng.choice(street_positions)
+    y = rng.choice(street_positions)
+    points = [(x, y)]
+    direction = {True: 1.0, False: 1.0}
+    remaining = length_m
+    horizontal = bool(index % 2)
+    while remaining > 0:
+        step = min(remaining, config.pitch_m * rng.randint(1, 4))
+        position = x if horizontal else y
+        if not -half <= position + direction[horizontal] * step <= half:
+            # 走到城市邊界就折返，讓長路線也能留在合成城市內
+            direction[horizontal] = -direction[horizontal]
+        position = min(max(position + direction[horizontal] * step, -half), half)
+        if horizontal:
+            x = position
+        else:
+            y = position
+        remaining -= math.dist((x, y), points[-1])
+        points.append((x, y))
+        horizontal = not horizontal
+
+    travelled = sum(math.dist(a, b) for a, b in zip(points, points[1:]))
+    coords = tuple(projector.to_lat_lng(px, py) for px, py in points)
+    return SyntheticRoute(route_id=f"syn_route_{index}", coordinates=coords, length_m=travelled)
+
+
+def encode_polyline(coords: Sequence[Tuple[float, float]]) -> str:
+    """將 (lat, lng) 序列編碼成 Google Encoded Polyline（`decode_polyline` 的反函式）。"""
+
+    chunks: List[str] = []
+    prev_lat = 0
+    prev_lng = 0
+    for lat, lng in coords:
+        lat_e5 = int(round(lat * 1e5))
+        lng_e5 = int(round(lng * 1e5))
+        chunks.append(_encode_value(lat_e5 - prev_lat))
+        chunks.append(_encode_value(lng_e5 - prev_lng))
+        prev_lat, prev_lng = lat_e5, lng_e5
+    return "".join(chunks)
+
+
+def _encode_value(value: int) -> str:
+    value = ~(value << 1) if value < 0 else value << 1
+    out: List[str] = []
+    while value >= 0x20:
+        out.append(chr((0x20 | (value & 0x1F)) + 63))
+        value >>= 5
+    out.append(chr(value + 63))
+    return "".join(out)
+
+
+CREATE_BUILDINGS_SQL = """
+DROP TABLE IF EXISTS buildings;
+CREATE TABLE buildings (
+  build_id TEXT PRIMARY KEY,
+  geom_4326 geometry(MultiPolygonZ, 4326),
+  geom_3826 geometry(MultiPolygon, 3826),
+  height_m DOUBLE PRECISION,
+  model_lod TEXT,
+  source_des TEXT,
+  source TEXT,
+  county TEXT,
+  mdate TEXT,
+  m_mdate TEXT,
+  ingested_at TIMESTAMP
+);
+"""
+
+INSERT_BUILDING_SQL = """
+INSERT INTO buildings (build_id, geom_4326, geom_3826, height_m, source, ingested_at)
+SELECT
+  :build_id,
+  ST_Force3D(ST_Multi(g.geom)),
+  ST_Transform(ST_Multi(g.geom), 3826),
+  :height_m,
+  'synthetic',
+  NOW() AT TIME ZONE 'UTC'
+FROM (SELECT ST_GeomFromText(:wkt, 4326) AS geom) g
+"""
+
+CREATE_INDEXES_SQL = """
+CREATE INDEX idx_buildings_geom_4326 ON buildings USING GIST (geom_4326);
+CREATE INDEX idx_buildings_geom_3826 ON buildings USING GIST (geom_3826);
+CREATE INDEX idx_buildings_height ON buildings (height_m);
+ANALYZE buildings;
+"""
+
+
+def upgrade_schema(database: str) -> None:
+    """建立 PostGIS extension 並套用 alembic 遷移（陰影查詢共用的 SQL 函式由遷移建立）；已是最新版時不做事。"""
+
+    from alembic import command
+    from alembic.config import Config
+
+    session = get_session(database=database)
+    try:
+        session.execute(text("CREATE EXTENSION IF NOT EXISTS postgis"))
+        session.commit()
+    finally:
+        session.close()
+
+    config = Config(str(BACKEND_ROOT / "alembic.ini"))
+    config.set_main_option("script_location", str(BACKEND_ROOT / "migrations"))
+    # migrations/env.py 以 PGDATABASE 組出連線字串
+    previous = os.environ.get("PGDATABASE")
+    os.environ["PGDATABASE"] = database
+    try:
+        command.upgrade(config, "head")
+    finally:
+        if previous is None:
+            os.environ.pop("PGDATABASE", None)
+        else:
+            os.environ["PGDATABASE"] = previous
+
+
+def load_city(buildings: Iterable[SyntheticBuilding], *, database: str, batch_size: int = 2000) -> int:
+    """以合成建物重建指定資料庫的 `buildings` 資料表，回傳寫入筆數。
+
+    先套用遷移：遷移會重建空的 `buildings`，必須在寫入合成建物之前執行。
+    """
+
+    upgrade_schema(database)
+    session = get_session(database=database)
+    total = 0
+    try:
+        session.execute(text(CREATE_BUILDINGS_SQL))
+        batch: List[Dict[str, Any]] = []
+        for building in buildings:
+            batch.append({"build_id": building.build_id, "wkt": building.to_wkt(), "height_m": building.height_m})
+            if len(batch) >= batch_size:
+                session.execute(text(INSERT_BUILDING_SQL), batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            session.execute(text(INSERT_BUILDING_SQL), batch)
+            total += len(batch)
+        session.execute(text(CREATE_INDEXES_SQL))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return total
+
+
+def build_parser() -> argparse.ArgumentParser:
+    defaults = CityConfig()
+    parser = argparse.ArgumentParser(description="產生合成城市建物並寫入 PostGIS 的 buildings 資料表")
+    parser.add_argument(
+        "--database",
+        required=True,
+        help="寫入的資料庫名稱（會 DROP 並重建 buildings，請勿指向正式資料庫）",
+    )
+    parser.add_argument("--seed", type=int, default=defaults.seed, help="隨機種子")
+    parser.add_argument("--extent-m", type=float, default=defaults.extent_m, help="城市邊長（公尺）")
+    parser.add_argument(
+        "--density",
+        type=float,
+        default=defaults.density_per_hectare,
+        help="每公頃街廓的建物數",
+    )
+    parser.add_argument("--height-median-m", type=float, default=defaults.height_median_m, help="建物高度中位數")
+    parser.add_argument("--height-sigma", type=float, default=defaults.height_sigma, help="高度對數常態分布 sigma")
+    parser.add_argument("--height-max-m", type=float, default=defaults.height_max_m, help="建物高度上限")
+    return parser
+
+
+def config_from_args(args: argparse.Namespace) -> CityConfig:
+    return CityConfig(
+        seed=args.seed,
+        extent_m=args.extent_m,
+        density_per_hectare=args.density,
+        height_median_m=args.height_median_m,
+        height_sigma=args.height_sigma,
+        height_max_m=args.height_max_m,
+    )
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+    config = config_from_args(args)
+    buildings = generate_buildings(config)
+    count = load_city(buildings, database=args.database)
+    print(f"已寫入 {count} 棟合成建物至 {args.database}.buildings：{asdict(config)}")
+
+
+if __name__ == "__main__":
+    main()
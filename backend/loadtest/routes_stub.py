@@ -0,0 +1,230 @@
+"""本機 Google Routes `computeRoutes` stub，供壓力測試使用。
+
+- 預設依請求的起訖點即時產生 1～3 條折線路徑（`computeAlternativeRoutes` 為真時回傳多條）。
+- 指定 `--recordings` 時改為輪流回放錄下的回應 JSON（檔案內容為 `computeRoutes` 回應或其陣列）。
+- 可設定延遲（平均值與抖動）與錯誤率，模擬上游變慢或失敗。
+
+搭配 API 使用時將 `GOOGLE_ROUTES_ENDPOINT` 指向 stub，並給任意非預設的 `GOOGLE_ROUTES_API_KEY`：
+    uv run python -m loadtest.routes_stub --port 8787 --latency-ms 300 --error-rate 0.01
+    GOOGLE_ROUTES_ENDPOINT=http://localhost:8787/directions/v2:computeRoutes GOOGLE_ROUTES_API_KEY=stub \\
+        uv run uvicorn main:app
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.append(str(BACKEND_ROOT))
+
+from benchmarks.synthetic_city import encode_polyline
+
+COMPUTE_ROUTES_PATH = "/directions/v2:computeRoutes"
+EARTH_RADIUS_M = 6_371_008.8
+WALK_SPEED_MPS = 1.3
+
+
+@dataclass
+class StubConfig:
+    latency_ms: float = 200.0
+    latency_jitter_ms: float = 100.0
+    error_rate: float = 0.0
+    error_status: int = 500
+    alternatives: int = 3
+    recordings: List[Dict[str, Any]] = field(default_factory=list)
+    seed: int = 0
+
+
+@dataclass
+class StubStats:
+    requests: int = 0
+    errors: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def record(self, *, error: bool) -> None:
+        with self.lock:
+            self.requests += 1
+            if error:
+                self.errors += 1
+
+
+def _haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def generate_routes(
+    origin: Tuple[float, float],
+    destination: Tuple[float, float],
+    count: int,
+    rng: random.Random,
+) -> Dict[str, Any]:
+    """產生近似街道走法的折線：主路線先南北後東西，替代路線加上隨機繞行點。"""
+
+    routes = []
+    for idx in range(count):
+        corner = (destination[0], origin[1]) if idx % 2 == 0 else (origin[0], destination[1])
+        points = [origin]
+        if idx > 0:
+            detour = 0.0005 * idx
+            points.append(
+                (
+                    (origin[0] + corner[0]) / 2 + rng.uniform(-detour, detour),
+                    (origin[1] + corner[1]) / 2 + rng.uniform(-detour, detour),
+                )
+            )
+        points.extend([corner, destination])
+        distance = sum(_haversine_m(a, b) for a, b in zip(points, points[1:]))
+        routes.append(
+            {
+                "distanceMeters": int(distance),
+                "duration": f"{int(distance / WALK_SPEED_MPS)}s",
+                "description": f"stub route {idx + 1}",
+                "polyline": {"encodedPolyline": encode_polyline(points)},
+            }
+        )
+    return {"routes": routes}
+
+
+def _lat_lng(payload: Dict[str, Any], key: str) -> Tuple[float, float]:
+    lat_lng = payload[key]["location"]["latLng"]
+    return float(lat_lng["latitude"]), float(lat_lng["longitude"])
+
+
+def make_handler(config: StubConfig, stats: StubStats) -> type[BaseHTTPRequestHandler]:
+    rng = random.Random(config.seed)
+    rng_lock = threading.Lock()
+    replay: Optional[Iterator[Dict[str, Any]]] = itertools.cycle(config.recordings) if config.recordings else None
+
+    class RoutesStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002 - 覆寫 BaseHTTPRequestHandler
+            return
+
+        def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:  # noqa: N802 - http.server 命名慣例
+            if self.path == "/stats":
+                self._send_json(200, {"requests": stats.requests, "errors": stats.errors})
+                return
+            self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+
+        def do_POST(self) -> None:  # noqa: N802 - http.server 命名慣例
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b"{}"
+            if self.path.split("?", 1)[0] != COMPUTE_ROUTES_PATH:
+                self._send_json(404, {"error": {"code": 404, "message": "not found"}})
+                return
+
+            with rng_lock:
+                delay = max(0.0, rng.gauss(config.latency_ms, config.latency_jitter_ms)) / 1000.0
+                failed = rng.random() < config.error_rate
+                route_seed = rng.random()
+                recorded = next(replay) if replay is not None else None
+            time.sleep(delay)
+
+            stats.record(error=failed)
+            if failed:
+                self._send_json(
+                    config.error_status,
+                    {"error": {"code": config.error_status, "message": "injected by routes stub"}},
+                )
+                return
+            if recorded is not None:
+                self._send_json(200, recorded)
+                return
+
+            try:
+                payload = json.loads(raw)
+                origin = _lat_lng(payload, "origin")
+                destination = _lat_lng(payload, "destination")
+            except (KeyError, TypeError, ValueError) as exc:
+                self._send_json(400, {"error": {"code": 400, "message": f"invalid request: {exc}"}})
+                return
+            count = config.alternatives if payload.get("computeAlternativeRoutes") else 1
+            self._send_json(200, generate_routes(origin, destination, count, random.Random(route_seed)))
+
+    return RoutesStubHandler
+
+
+def load_recordings(path: Path) -> List[Dict[str, Any]]:
+    data = json.loads(path.read_text())
+    recordings = data if isinstance(data, list) else [data]
+    if not all(isinstance(item, dict) and "routes" in item for item in recordings):
+        raise ValueError(f"錄製檔必須是 computeRoutes 回應或其陣列：{path}")
+    return recordings
+
+
+def start_stub(config: StubConfig, host: str = "127.0.0.1", port: int = 8787) -> Tuple[ThreadingHTTPServer, StubStats]:
+    """於背景執行緒啟動 stub，回傳 server（呼叫 `shutdown()` 停止）與統計。"""
+
+    stats = StubStats()
+    server = ThreadingHTTPServer((host, port), make_handler(config, stats))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name="routes-stub", daemon=True)
+    thread.start()
+    return server, stats
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="本機 Google Routes computeRoutes stub")
+    parser.add_argument("--host", default="127.0.0.1", help="監聽位址")
+    parser.add_argument("--port", type=int, default=8787, help="監聽埠號")
+    parser.add_argument("--latency-ms", type=float, default=200.0, help="平均回應延遲（毫秒）")
+    parser.add_argument("--latency-jitter-ms", type=float, default=100.0, help="延遲標準差（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回傳錯誤的機率（0～1）")
+    parser.add_argument("--error-status", type=int, default=500, help="注入錯誤時的 HTTP 狀態碼")
+    parser.add_argument("--alternatives", type=int, default=3, help="產生的替代路線數")
+    parser.add_argument("--recordings", help="錄下的 computeRoutes 回應 JSON，指定後改為輪流回放")
+    parser.add_argument("--seed", type=int, default=0, help="延遲與錯誤注入的隨機種子")
+    return parser
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+    if not 0.0 <= args.error_rate <= 1.0:
+        parser.error("--error-rate 必須介於 0 與 1")
+    config = StubConfig(
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        alternatives=args.alternatives,
+        recordings=load_recordings(Path(args.recordings)) if args.recordings else [],
+        seed=args.seed,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config, StubStats()))
+    server.daemon_threads = True
+    print(f"Routes stub 監聽 http://{args.host}:{args.port}{COMPUTE_ROUTES_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
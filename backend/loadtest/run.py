@@ -0,0 +1,334 @@
+"""對執行中的 FastAPI 服務重播請求組合，回報吞吐量、延遲百分位與錯誤率。
+
+- 內建情境：`shadow-area`（隨機中心點與半徑）、`shadow-route`（隨機起訖點）、`health`。
+- 以 `--mix` 調整各情境權重，例如 `shadow-area=6,shadow-route=3,health=1`。
+- 時間戳記落在同一天的白天並取整到分鐘，重現尖峰時段大量相同時段查詢的情形。
+- `--with-stub` 會在同一個行程內啟動 `loadtest.routes_stub`；API 需以 `GOOGLE_ROUTES_ENDPOINT` 指向它。
+
+範例：
+    uv run python -m loadtest.run --base-url http://localhost:8000 --concurrency 32 --duration 60 \\
+        --output data/loadtest/report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import requests
+
+BACKEND_ROOT = Path(__file__).resolve().parents[1]
+if str(BACKEND_ROOT) not in sys.path:
+    sys.path.append(str(BACKEND_ROOT))
+
+from benchmarks.harness import percentile, summarize
+from loadtest.routes_stub import StubConfig, start_stub
+
+# 台北市中心附近的預設取樣範圍 (min_lat, min_lng, max_lat, max_lng)
+DEFAULT_BBOX = (25.010, 121.510, 25.060, 121.570)
+DEFAULT_MIX = "shadow-area=6,shadow-route=3,health=1"
+METERS_PER_DEGREE_LAT = 111_320.0
+
+
+@dataclass(frozen=True)
+class PlannedRequest:
+    endpoint: str
+    method: str
+    path: str
+    body: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class Outcome:
+    endpoint: str
+    status: int
+    latency_ms: float
+    error: Optional[str] = None
+
+
+@dataclass
+class ScenarioContext:
+    rng: random.Random
+    bbox: Tuple[float, float, float, float]
+    date: str
+
+    def random_point(self) -> Tuple[float, float]:
+        min_lat, min_lng, max_lat, max_lng = self.bbox
+        return (
+            round(self.rng.uniform(min_lat, max_lat), 6),
+            round(self.rng.uniform(min_lng, max_lng), 6),
+        )
+
+    def random_timestamp(self) -> str:
+        minute = self.rng.randint(7 * 60, 17 * 60)
+        return f"{self.date}T{minute // 60:02d}:{minute % 60:02d}:00"
+
+
+def _shadow_area(ctx: ScenarioContext) -> PlannedRequest:
+    lat, lng = ctx.random_point()
+    return PlannedRequest(
+        endpoint="shadow-area",
+        method="POST",
+        path="/shadow-area",
+        body={
+            "center_lat": lat,
+            "center_lng": lng,
+            "search_radius_m": ctx.rng.choice([50, 100, 200, 500]),
+            "timestamp": ctx.random_timestamp(),
+            "timezone": "Asia/Taipei",
+        },
+    )
+
+
+def _shadow_route(ctx: ScenarioContext) -> PlannedRequest:
+    origin_lat, origin_lng = ctx.random_point()
+    distance = ctx.rng.uniform(300, 2000)
+    bearing = ctx.rng.uniform(0, 2 * math.pi)
+    dest_lat = origin_lat + distance * math.cos(bearing) / METERS_PER_DEGREE_LAT
+    dest_lng = origin_lng + distance * math.sin(bearing) / (
+        METERS_PER_DEGREE_LAT * math.cos(math.radians(origin_lat))
+    )
+    return PlannedRequest(
+        endpoint="shadow-route",
+        method="POST",
+        path="/shadow-route",
+        body={
+            "origin_lat": origin_lat,
+            "origin_lng": origin_lng,
+            "dest_lat": round(dest_lat, 6),
+            "dest_lng": round(dest_lng, 6),
+            "timestamp": ctx.random_timestamp(),
+            "timezone": "Asia/Taipei",
+            "max_alternatives": 3,
+        },
+    )
+
+
+def _health(ctx: ScenarioContext) -> PlannedRequest:
+    return PlannedRequest(endpoint="health", method="GET", path="/health")
+
+
+SCENARIOS: Dict[str, Callable[[ScenarioContext], PlannedRequest]] = {
+    "shadow-area": _shadow_area,
+    "shadow-route": _shadow_route,
+    "health": _health,
+}
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix: List[Tuple[str, float]] = []
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"未知情境：{name}（可用：{', '.join(SCENARIOS)}）")
+        mix.append((name, float(weight or 1.0)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise argparse.ArgumentTypeError("請求組合至少需一個權重大於 0 的情境")
+    return mix
+
+
+@dataclass
+class LoadTestConfig:
+    base_url: str
+    mix: List[Tuple[str, float]]
+    concurrency: int = 16
+    duration_s: float = 30.0
+    max_requests: Optional[int] = None
+    timeout_s: float = 60.0
+    bbox: Tuple[float, float, float, float] = DEFAULT_BBOX
+    date: str = "2024-11-05"
+    seed: int = 0
+
+
+@dataclass
+class _SharedState:
+    issued: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    outcomes: List[Outcome] = field(default_factory=list)
+
+
+def _worker(worker_id: int, config: LoadTestConfig, state: _SharedState, deadline: float) -> None:
+    ctx = ScenarioContext(rng=random.Random(f"{config.seed}:{worker_id}"), bbox=config.bbox, date=config.date)
+    names = [name for name, _ in config.mix]
+    weights = [weight for _, weight in config.mix]
+    session = requests.Session()
+    local: List[Outcome] = []
+    try:
+        while time.monotonic() < deadline:
+            with state.lock:
+                if config.max_requests is not None and state.issued >= config.max_requests:
+                    break
+                state.issued += 1
+            planned = SCENARIOS[ctx.rng.choices(names, weights)[0]](ctx)
+            start = time.perf_counter()
+            try:
+                response = session.request(
+                    planned.method,
+                    config.base_url.rstrip("/") + planned.path,
+                    json=planned.body,
+                    timeout=config.timeout_s,
+                )
+                latency = (time.perf_counter() - start) * 1000.0
+                error = None if response.status_code < 400 else response.text[:200]
+                local.append(Outcome(planned.endpoint, response.status_code, latency, error))
+            except requests.RequestException as exc:
+                latency = (time.perf_counter() - start) * 1000.0
+                local.append(Outcome(planned.endpoint, 0, latency, type(exc).__name__))
+    finally:
+        session.close()
+        with state.lock:
+            state.outcomes.extend(local)
+
+
+def run_load_test(config: LoadTestConfig) -> Dict[str, Any]:
+    """以固定併發數的封閉迴圈送出請求，直到時間或請求數上限，回傳統計報告。"""
+
+    state = _SharedState()
+    started = time.monotonic()
+    deadline = started + config.duration_s
+    threads = [
+        threading.Thread(target=_worker, args=(idx, config, state, deadline), name=f"loadtest-{idx}")
+        for idx in range(config.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    return build_report(state.outcomes, elapsed, config)
+
+
+def _endpoint_summary(outcomes: Sequence[Outcome], elapsed_s: float) -> Dict[str, Any]:
+    latencies = [o.latency_ms for o in outcomes]
+    errors = [o for o in outcomes if o.status == 0 or o.status >= 400]
+    stats = summarize(latencies)
+    return {
+        "requests": len(outcomes),
+        "errors": len(errors),
+        "error_rate": len(errors) / len(outcomes) if outcomes else 0.0,
+        "throughput_rps": len(outcomes) / elapsed_s if elapsed_s > 0 else 0.0,
+        "latency_ms": {
+            "p50": stats["median_ms"],
+            "p90": percentile(sorted(latencies), 90),
+            "p95": stats["p95_ms"],
+            "p99": stats["p99_ms"],
+            "max": stats["max_ms"],
+            "mean": stats["mean_ms"],
+        },
+        "status_codes": dict(Counter(str(o.status) for o in outcomes)),
+        "sample_errors": sorted({o.error for o in errors if o.error})[:5],
+    }
+
+
+def build_report(outcomes: Sequence[Outcome], elapsed_s: float, config: LoadTestConfig) -> Dict[str, Any]:
+    by_endpoint: Dict[str, List[Outcome]] = defaultdict(list)
+    for outcome in outcomes:
+        by_endpoint[outcome.endpoint].append(outcome)
+    return {
+        "config": {
+            "base_url": config.base_url,
+            "mix": dict(config.mix),
+            "concurrency": config.concurrency,
+            "duration_s": config.duration_s,
+            "max_requests": config.max_requests,
+            "seed": config.seed,
+        },
+        "elapsed_s": elapsed_s,
+        "overall": _endpoint_summary(outcomes, elapsed_s),
+        "endpoints": {name: _endpoint_summary(items, elapsed_s) for name, items in sorted(by_endpoint.items())},
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"elapsed {report['elapsed_s']:.1f}s"]
+    header = f"{'endpoint':<14} {'reqs':>7} {'rps':>8} {'err%':>6} {'p50':>8} {'p95':>8} {'p99':>8}"
+    lines.append(header)
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, item in rows:
+        latency = item["latency_ms"]
+        lines.append(
+            f"{name:<14} {item['requests']:>7} {item['throughput_rps']:>8.1f} "
+            f"{item['error_rate'] * 100:>5.1f}% {latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+def _parse_bbox(value: str) -> Tuple[float, float, float, float]:
+    parts = [float(item) for item in value.split(",")]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("--bbox 格式為 min_lat,min_lng,max_lat,max_lng")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="對 Vampire Map API 進行端到端壓力測試")
+    parser.add_argument("--base-url", default="http://localhost:8000", help="API 位址")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="情境權重，例如 shadow-area=6,health=1")
+    parser.add_argument("--concurrency", type=int, default=16, help="同時進行中的請求數")
+    parser.add_argument("--duration", type=float, default=30.0, help="測試秒數")
+    parser.add_argument("--max-requests", type=int, help="總請求數上限")
+    parser.add_argument("--timeout", type=float, default=60.0, help="單一請求逾時（秒）")
+    parser.add_argument("--bbox", type=_parse_bbox, default=DEFAULT_BBOX, help="隨機座標範圍 min_lat,min_lng,max_lat,max_lng")
+    parser.add_argument("--date", default="2024-11-05", help="請求時間戳記使用的日期")
+    parser.add_argument("--seed", type=int, default=0, help="請求產生器的隨機種子")
+    parser.add_argument("--with-stub", action="store_true", help="同時啟動本機 Google Routes stub")
+    parser.add_argument("--stub-port", type=int, default=8787, help="stub 監聽埠號")
+    parser.add_argument("--stub-latency-ms", type=float, default=200.0, help="stub 平均延遲（毫秒）")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="stub 錯誤率（0～1）")
+    parser.add_argument("--output", help="報告 JSON 輸出路徑")
+    return parser
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+    config = LoadTestConfig(
+        base_url=args.base_url,
+        mix=args.mix,
+        concurrency=args.concurrency,
+        duration_s=args.duration,
+        max_requests=args.max_requests,
+        timeout_s=args.timeout,
+        bbox=args.bbox,
+        date=args.date,
+        seed=args.seed,
+    )
+
+    stub = None
+    if args.with_stub:
+        stub, stub_stats = start_stub(
+            StubConfig(latency_ms=args.stub_latency_ms, error_rate=args.stub_error_rate, seed=args.seed),
+            port=args.stub_port,
+        )
+        print(f"Routes stub 已啟動於 http://127.0.0.1:{args.stub_port}")
+
+    try:
+        report = run_load_test(config)
+    finally:
+        if stub is not None:
+            stub.shutdown()
+    if stub is not None:
+        report["routes_stub"] = {"requests": stub_stats.requests, "errors": stub_stats.errors}
+
+    print(format_report(report))
+    if args.output:
+        path = Path(args.output)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2))
+        print(f"報告已輸出至 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
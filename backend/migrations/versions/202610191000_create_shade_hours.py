@@ -0,0 +1,49 @@
+"""Create shade_hours tables for offline shade-duration aggregation
+
+Revision ID: 202610191000
+Revises: 202411051230
+Create Date: 2026-10-19 10:00:00.000000
+"""
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "202610191000"
+down_revision = "202411051230"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shade_hours_runs (
+          run_id TEXT PRIMARY KEY,
+          start_date DATE NOT NULL,
+          end_date DATE NOT NULL,
+          cell_size DOUBLE PRECISION NOT NULL,
+          daylight_hours DOUBLE PRECISION NOT NULL,
+          metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+          created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        );
+        """
+    )
+    # cell_x / cell_y 為 EPSG:3826 座標除以 cell_size 後取 floor 的絕對索引，點查詢直接走主鍵
+    op.execute(
+        """
+        CREATE TABLE IF NOT EXISTS shade_hours_cells (
+          run_id TEXT NOT NULL REFERENCES shade_hours_runs (run_id) ON DELETE CASCADE,
+          cell_x INTEGER NOT NULL,
+          cell_y INTEGER NOT NULL,
+          shade_hours REAL NOT NULL,
+          PRIMARY KEY (run_id, cell_x, cell_y)
+        );
+        """
+    )
+    op.execute("CREATE INDEX IF NOT EXISTS idx_shade_hours_runs_created_at ON shade_hours_runs (created_at DESC);")
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS shade_hours_cells;")
+    op.execute("DROP TABLE IF EXISTS shade_hours_runs;")
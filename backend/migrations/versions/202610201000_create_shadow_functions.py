@@ -0,0 +1,114 @@
+"""Create shared shadow geometry functions used by the shadow queries
+
+Revision ID: 202610201000
+Revises: 202610191000
+Create Date: 2026-10-20 10:00:00.000000
+"""
+from __future__ import annotations
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "202610201000"
+down_revision = "202610191000"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 角度一律以度為單位，幾何為 EPSG:3826（公尺）
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION shadow_length(
+          height_m double precision,
+          elevation_deg double precision,
+          max_length double precision
+        ) RETURNS double precision
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+          -- 仰角趨近 0 時 tan 為 0，LEAST 會略過 NULL，直接取上限
+          SELECT LEAST(height_m / NULLIF(tan(radians(elevation_deg)), 0), max_length)
+        $$;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION building_shadow(
+          geom geometry,
+          height_m double precision,
+          azimuth_deg double precision,
+          elevation_deg double precision,
+          max_length double precision
+        ) RETURNS geometry
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+          -- 陰影朝太陽的反方向 (-sin az, -cos az) 投射：建物與其平移陰影長度後的凸包
+          SELECT ST_ConvexHull(
+            ST_Collect(
+              geom,
+              ST_Translate(
+                geom,
+                -sin(radians(azimuth_deg)) * shadow_length(height_m, elevation_deg, max_length),
+                -cos(radians(azimuth_deg)) * shadow_length(height_m, elevation_deg, max_length)
+              )
+            )
+          )
+        $$;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION upsun_sweep(
+          geom geometry,
+          azimuth_deg double precision,
+          length double precision
+        ) RETURNS geometry
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$
+          -- geom 往太陽方向 (sin az, cos az) 平移 0…length 掃過的範圍；以凸包表示，
+          -- 非凸的輸入（整條路線）請先拆成線段。能把陰影投到 geom 的建物都在這個範圍內。
+          SELECT ST_ConvexHull(
+            ST_Collect(
+              geom,
+              ST_Translate(geom, sin(radians(azimuth_deg)) * length, cos(radians(azimuth_deg)) * length)
+            )
+          )
+        $$;
+        """
+    )
+    op.execute(
+        """
+        CREATE OR REPLACE FUNCTION shadow_reach(
+          area geometry,
+          azimuth_deg double precision,
+          elevation_deg double precision,
+          max_length double precision,
+          tolerance double precision DEFAULT 0
+        ) RETURNS double precision
+        LANGUAGE sql STABLE PARALLEL SAFE
+        AS $$
+          -- 能把陰影投到 area（外擴 tolerance）的建物中，最長的陰影長度。
+          -- 先以全體最高建物（走 height_m 索引）算出上限，只在這個長度的掃掠範圍內找最高建物，
+          -- 正午時探查範圍只比 area 大一點。area 需為凸形（點、線段、矩形）。
+          WITH bound AS (
+            SELECT shadow_length(COALESCE(MAX(height_m), 0), elevation_deg, max_length) AS len
+            FROM buildings
+            WHERE height_m > 0
+          )
+          SELECT shadow_length(COALESCE(MAX(b.height_m), 0), elevation_deg, max_length)
+          FROM bound
+          LEFT JOIN buildings b
+            ON b.geom_3826 && ST_Expand(upsun_sweep(area, azimuth_deg, bound.len), tolerance)
+           AND b.height_m > 0
+        $$;
+        """
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP FUNCTION IF EXISTS shadow_reach(geometry, double precision, double precision, double precision, double precision);")
+    op.execute("DROP FUNCTION IF EXISTS upsun_sweep(geometry, double precision, double precision);")
+    op.execute(
+        "DROP FUNCTION IF EXISTS building_shadow(geometry, double precision, double precision, double precision, double precision);"
+    )
+    op.execute("DROP FUNCTION IF EXISTS shadow_length(double precision, double precision, double precision);")
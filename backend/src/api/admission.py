@@ -0,0 +1,158 @@
+"""Admission control and dedicated executors per workload class.
+
+Blocking work no longer shares asyncio's default thread pool: Google Routes
+calls and PostGIS queries each get a bounded executor plus a bounded wait
+queue. Once both are full, new work is rejected immediately so the API can
+answer ``503`` with ``Retry-After`` instead of piling up requests.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, TypeVar
+
+T = TypeVar("T")
+
+# 服務時間的指數移動平均權重，用於估算 Retry-After
+_EWMA_ALPHA = 0.2
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+class OverCapacityError(RuntimeError):
+    """Raised when a workload pool has no free worker and its queue is full."""
+
+    def __init__(self, pool: str, retry_after_s: int) -> None:
+        super().__init__(f"{pool} workload is over capacity")
+        self.pool = pool
+        self.retry_after_s = retry_after_s
+
+
+@dataclass
+class WorkloadPoolStats:
+    submitted: int = 0
+    completed: int = 0
+    failed: int = 0
+    rejected: int = 0
+    avg_service_s: float = 0.0
+
+
+class WorkloadPool:
+    """A bounded thread pool with a fixed-depth admission queue."""
+
+    def __init__(self, name: str, *, max_workers: int, queue_depth: int) -> None:
+        if max_workers < 1:
+            raise ValueError(f"{name} pool needs at least one worker")
+        self.name = name
+        self.max_workers = max_workers
+        self.queue_depth = max(0, queue_depth)
+        self.stats = WorkloadPoolStats()
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        _REGISTRY[name] = self
+
+    @property
+    def capacity(self) -> int:
+        return self.max_workers + self.queue_depth
+
+    @property
+    def running(self) -> int:
+        return min(self._pending, self.max_workers)
+
+    @property
+    def queued(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def retry_after_s(self) -> int:
+        backlog_rounds = (self._pending + 1) / self.max_workers
+        return max(1, math.ceil(self.stats.avg_service_s * backlog_rounds))
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run ``func`` on this pool or raise :class:`OverCapacityError` right away.
+
+        A slot is released when the worker finishes, not when the caller stops
+        waiting: a cancelled caller (e.g. the client disconnected) leaves the
+        thread running, and that work still counts against the bound.
+        """
+
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.stats.rejected += 1
+                raise OverCapacityError(self.name, self.retry_after_s())
+            self._pending += 1
+            self.stats.submitted += 1
+
+        started = time.perf_counter()
+        try:
+            future = self._executor.submit(partial(func, *args, **kwargs))
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+                self.stats.failed += 1
+            raise
+        future.add_done_callback(partial(self._finished, started))
+        return await asyncio.wrap_future(future)
+
+    def _finished(self, started: float, future: Future[Any]) -> None:
+        # 在 worker 執行緒（或 shutdown 取消時的呼叫端）執行
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            if future.cancelled() or future.exception() is not None:
+                self.stats.failed += 1
+            else:
+                self.stats.completed += 1
+            self.stats.avg_service_s += _EWMA_ALPHA * (elapsed - self.stats.avg_service_s)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_workers": self.max_workers,
+            "queue_depth": self.queue_depth,
+            "running": self.running,
+            "queued": self.queued,
+            "submitted": self.stats.submitted,
+            "completed": self.stats.completed,
+            "failed": self.stats.failed,
+            "rejected": self.stats.rejected,
+            "avg_service_ms": round(self.stats.avg_service_s * 1000.0, 3),
+        }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_REGISTRY: Dict[str, WorkloadPool] = {}
+
+# Google Routes 呼叫多半在等待網路，可給較多 worker；資料庫工作受連線池限制
+google_pool = WorkloadPool(
+    "google",
+    max_workers=_env_int("ADMISSION_GOOGLE_WORKERS", 16),
+    queue_depth=_env_int("ADMISSION_GOOGLE_QUEUE", 32),
+)
+db_pool = WorkloadPool(
+    "db",
+    max_workers=_env_int("ADMISSION_DB_WORKERS", 8),
+    queue_depth=_env_int("ADMISSION_DB_QUEUE", 32),
+)
+
+
+def admission_stats() -> Dict[str, Dict[str, Any]]:
+    """Return queue depth and rejection counters for every workload pool."""
+
+    return {name: pool.snapshot() for name, pool in _REGISTRY.items()}
+
+
+def shutdown_pools() -> None:
+    for pool in _REGISTRY.values():
+        pool.shutdown()
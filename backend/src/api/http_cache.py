@@ -0,0 +1,144 @@
+"""Canonical keys, ETags and cache headers for the GET shadow endpoints.
+
+GET variants of ``/shadow-area`` and ``/shadow-route`` only answer on a
+canonical URL: coordinates snapped to ``CANONICAL_GRID_DEG``, distances
+rounded up to fixed steps and the time replaced by its sun bucket key
+(``sun=a180.00_e45.25`` or ``sun=night``). Any other URL is redirected there
+with ``308``, so edge caches see one URL per visually identical result.
+
+The ETag hashes the canonical URL with the buildings data version
+(row count and latest ``ingested_at``), which is cached for
+``BUILDINGS_VERSION_TTL_S`` seconds.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import re
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import text
+
+from api.admission import db_pool
+from db.database import get_read_session
+from db.sql import load_query
+from utils.single_flight import SingleFlight
+from utils.sun_bucket import SunBucket
+
+# 約 22 m（緯度方向）；座標取 4 位小數即可完整表示
+CANONICAL_GRID_DEG = 0.0002
+COORD_DECIMALS = 4
+RADIUS_STEP_M = 25.0
+MAX_RADIUS_M = 2000
+SHADOW_LENGTH_STEP_M = 10.0
+METERS_PER_DEG_LAT = 111_320.0
+
+NIGHT = "night"
+_SUN_KEY = re.compile(r"^a(\d{1,3}\.\d{2})_e(-?\d{1,2}\.\d{2})$")
+
+_version_flight = SingleFlight("buildings_version")
+_version_cache: Dict[str, Any] = {"value": None, "fetched_at": 0.0}
+
+
+def snap_coord(value: float) -> float:
+    return round(round(value / CANONICAL_GRID_DEG) * CANONICAL_GRID_DEG, COORD_DECIMALS)
+
+
+def format_coord(value: float) -> str:
+    return f"{value:.{COORD_DECIMALS}f}"
+
+
+def snap_up(value: float, step: float) -> int:
+    return int(math.ceil(value / step) * step)
+
+
+def snap_offset_m(lat: float, lng: float, snapped_lat: float, snapped_lng: float) -> float:
+    """中心點被吸附時偏移的距離（等距圓柱近似，格子很小時足夠）。"""
+
+    dy = (snapped_lat - lat) * METERS_PER_DEG_LAT
+    dx = (snapped_lng - lng) * METERS_PER_DEG_LAT * math.cos(math.radians(lat))
+    return math.hypot(dx, dy)
+
+
+def canonical_radius(radius_m: float, offset_m: float) -> int:
+    # 半徑先加上吸附偏移再往上取整，吸附後的範圍仍涵蓋原本要求的範圍；已在格點上的網址不會再變。
+    # 以上限封頂，否則接近上限的請求會被轉址到驗證不過的網址
+    return min(snap_up(radius_m + offset_m, RADIUS_STEP_M), MAX_RADIUS_M)
+
+
+def sun_key(azimuth_deg: float, elevation_deg: float) -> str:
+    if elevation_deg <= 0:
+        return NIGHT
+    return SunBucket.from_angles(azimuth_deg, elevation_deg).key
+
+
+def parse_sun_key(value: str) -> Optional[Tuple[str, Optional[SunBucket]]]:
+    """解析 ``sun`` 參數，回傳 (正規化後的 key, bucket)；夜間 bucket 為 None，格式錯誤回傳 None。"""
+
+    if value == NIGHT:
+        return NIGHT, None
+    match = _SUN_KEY.match(value)
+    if not match:
+        return None
+    azimuth, elevation = float(match.group(1)), float(match.group(2))
+    if not 0 <= azimuth < 360:
+        return None
+    key = sun_key(azimuth, elevation)
+    if key == NIGHT:
+        return NIGHT, None
+    return key, SunBucket.from_angles(azimuth, elevation)
+
+
+def _fetch_buildings_version() -> str:
+    session = get_read_session()
+    try:
+        row = session.execute(text(load_query("buildings_data_version.sql"))).fetchone()
+        session.rollback()
+    finally:
+        session.close()
+    ingested_at = row.ingested_at.isoformat() if row and row.ingested_at else "none"
+    return f"{row.building_count if row else 0}:{ingested_at}"
+
+
+async def buildings_version() -> str:
+    ttl = float(os.getenv("BUILDINGS_VERSION_TTL_S", "60"))
+    if _version_cache["value"] is None or time.monotonic() - _version_cache["fetched_at"] > ttl:
+        _version_cache["value"] = await _version_flight.do(
+            "version", lambda: db_pool.run(_fetch_buildings_version)
+        )
+        _version_cache["fetched_at"] = time.monotonic()
+    return _version_cache["value"]
+
+
+def make_etag(version: str, canonical_url: str) -> str:
+    digest = hashlib.sha1(f"{version}|{canonical_url}".encode("utf-8")).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def cache_headers(max_age_s: int, etag: Optional[str] = None) -> Dict[str, str]:
+    headers = {"Cache-Control": f"public, max-age={max_age_s}, stale-while-revalidate={max_age_s}"}
+    if etag is not None:
+        headers["ETag"] = etag
+    return headers
+
+
+def area_max_age_s() -> int:
+    return int(os.getenv("SHADOW_AREA_CACHE_MAX_AGE_S", "86400"))
+
+
+def route_max_age_s() -> int:
+    # 路線來自 Google Routes，路況與路網會變，快取時間較短
+    return int(os.getenv("SHADOW_ROUTE_CACHE_MAX_AGE_S", "3600"))
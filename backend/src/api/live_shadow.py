@@ -0,0 +1,308 @@
+"""Live shadow subscriptions with per-tile incremental updates.
+
+Clients subscribe with a viewport. The hub maps it to XYZ tiles at
+``LIVE_TILE_ZOOM`` and keeps one shared state per watched tile: its current
+sun bucket and shadow. Every ``LIVE_TICK_S`` seconds the hub checks the sun
+bucket (at ``LIVE_SUN_LAT``/``LIVE_SUN_LNG``). When it moves, each watched
+tile is recomputed once, no matter how many clients watch it. The resulting
+``delta`` (added/removed geometry) is encoded once and queued to every
+subscriber of that tile. New subscribers get a ``snapshot`` of each tile.
+
+Transports (WebSocket and SSE, see ``api/routes/shadow.py``) only move
+messages out of each subscriber's queue. A subscriber whose queue overflows is
+disconnected and has to reconnect for fresh snapshots, because skipping
+deltas would leave its map out of sync.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from api.admission import OverCapacityError, db_pool
+from utils.shadow_tiles import TileCoord, iter_tiles
+from utils.sun_bucket import SunBucket
+from utils.tile_delta import TileShadow, compute_tile_delta
+
+NIGHT = "night"
+
+SunState = Tuple[str, Optional[SunBucket]]
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+def tile_key(tile: TileCoord) -> str:
+    z, x, y = tile
+    return f"{z}/{x}/{y}"
+
+
+def encode(message: Dict[str, Any]) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def current_sun(latitude: float, longitude: float) -> SunState:
+    import pandas as pd
+
+    from utils import solar_position
+
+    solar = solar_position.compute_solar_position(
+        timestamp=pd.Timestamp.now(tz="UTC"),
+        latitude=latitude,
+        longitude=longitude,
+        altitude=20.0,
+        pressure=101325.0,
+        temperature=25.0,
+    )
+    if solar.elevation_deg <= 0:
+        return NIGHT, None
+    bucket = SunBucket.from_angles(solar.azimuth_deg, solar.elevation_deg)
+    return bucket.key, bucket
+
+
+class Subscriber:
+    """One connected client: the tiles it watches and its outgoing message queue."""
+
+    def __init__(self, queue_size: int) -> None:
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=queue_size)
+        self.tiles: Set[TileCoord] = set()
+        self.overflowed = False
+
+    def send(self, message: str) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+@dataclass
+class TileState:
+    sun: Optional[str] = None
+    shadow_wkb: Optional[bytes] = None
+    shadow: Optional[Dict[str, Any]] = None
+    subscribers: Set[Subscriber] = field(default_factory=set)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+@dataclass
+class LiveShadowStats:
+    subscribers: int = 0
+    tiles_watched: int = 0
+    tile_computations: int = 0
+    tile_failures: int = 0
+    snapshots_sent: int = 0
+    deltas_sent: int = 0
+    sun: Optional[str] = None
+
+
+class LiveShadowHub:
+    def __init__(
+        self,
+        *,
+        zoom: int,
+        max_tiles: int,
+        tick_s: float,
+        queue_size: int,
+        max_shadow_length: float,
+        concurrency: int,
+        sun_location: Tuple[float, float],
+    ) -> None:
+        self.zoom = zoom
+        self.max_tiles = max_tiles
+        self.tick_s = tick_s
+        self.queue_size = queue_size
+        self.max_shadow_length = max_shadow_length
+        self.sun_location = sun_location
+        self.stats = LiveShadowStats()
+        self.tiles: Dict[TileCoord, TileState] = {}
+        self.subscribers: Set[Subscriber] = set()
+        self._sun: Optional[SunState] = None
+        self._sun_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._ticker: Optional[asyncio.Task[None]] = None
+
+    # -- 訂閱管理 ---------------------------------------------------------
+
+    def viewport_tiles(self, bbox: Tuple[float, float, float, float]) -> List[TileCoord]:
+        west, south, east, north = bbox
+        if not (-180 <= west < east <= 180 and -85 <= south < north <= 85):
+            raise ValueError("bbox 需為 [west, south, east, north]，且 west < east、south < north")
+        tiles = list(iter_tiles(bbox, [self.zoom]))
+        if len(tiles) > self.max_tiles:
+            raise ValueError(f"視窗涵蓋 {len(tiles)} 張圖磚，超過上限 {self.max_tiles}，請放大地圖")
+        return tiles
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        if self._ticker is None or self._ticker.done():
+            # 閒置期間沒有 tick，重新計算太陽位置再開始
+            self._sun = None
+            self._ticker = asyncio.create_task(self._tick_loop())
+        return subscriber
+
+    async def hello(self) -> str:
+        sun, bucket = await self.sun()
+        return encode(
+            {
+                "type": "hello",
+                "zoom": self.zoom,
+                "tick_s": self.tick_s,
+                "sun": sun,
+                "sun_bucket": asdict(bucket) if bucket else None,
+            }
+        )
+
+    async def set_viewport(self, subscriber: Subscriber, bbox: Tuple[float, float, float, float]) -> None:
+        tiles = set(self.viewport_tiles(bbox))
+        for tile in subscriber.tiles - tiles:
+            state = self.tiles.get(tile)
+            if state is not None:
+                state.subscribers.discard(subscriber)
+        added = tiles - subscriber.tiles
+        subscriber.tiles = tiles
+        await asyncio.gather(*(self._watch(subscriber, tile) for tile in added))
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        self.subscribers.discard(subscriber)
+        for tile in subscriber.tiles:
+            state = self.tiles.get(tile)
+            if state is not None:
+                state.subscribers.discard(subscriber)
+        subscriber.tiles = set()
+
+    async def sun(self) -> SunState:
+        """目前的太陽 bucket；每輪 tick 只算一次，pvlib 在執行緒中執行，不阻塞事件迴圈。"""
+
+        if self._sun is None:
+            async with self._sun_lock:
+                if self._sun is None:
+                    self._sun = await asyncio.to_thread(current_sun, *self.sun_location)
+                    self.stats.sun = self._sun[0]
+        return self._sun
+
+    # -- 圖磚狀態 ---------------------------------------------------------
+
+    async def _watch(self, subscriber: Subscriber, tile: TileCoord) -> None:
+        while True:
+            state = self.tiles.setdefault(tile, TileState())
+            async with state.lock:
+                if self.tiles.get(tile) is not state:
+                    # 等鎖期間狀態被 tick 清掉了，改用新的狀態
+                    continue
+                if subscriber not in self.subscribers or tile not in subscriber.tiles:
+                    return
+                if state.sun != (await self.sun())[0]:
+                    # 先把既有訂閱者帶到目前的 bucket（送 delta），再加入新訂閱者並給快照
+                    await self._advance(tile, state)
+                state.subscribers.add(subscriber)
+                if state.sun is not None:
+                    subscriber.send(self._snapshot_message(tile, state))
+                    self.stats.snapshots_sent += 1
+                return
+
+    def _snapshot_message(self, tile: TileCoord, state: TileState) -> str:
+        return encode({"type": "snapshot", "tile": tile_key(tile), "sun": state.sun, "shadow": state.shadow})
+
+    async def _advance(self, tile: TileCoord, state: TileState) -> None:
+        """把圖磚算到目前的 bucket，並把差異推給已訂閱者；呼叫端需持有 ``state.lock``。"""
+
+        sun, bucket = await self.sun()
+        if bucket is None:
+            result = TileShadow(None, None, None, state.shadow)
+        else:
+            try:
+                async with self._semaphore:
+                    result = await db_pool.run(
+                        lambda: compute_tile_delta(
+                            tile, bucket, state.shadow_wkb, max_shadow_length=self.max_shadow_length
+                        )
+                    )
+            except (OverCapacityError, SQLAlchemyError) as exc:
+                # 失敗的圖磚維持舊狀態，下一輪 tick 會再試
+                self.stats.tile_failures += 1
+                message = encode({"type": "error", "tile": tile_key(tile), "detail": f"陰影計算失敗：{exc}"})
+                for subscriber in state.subscribers:
+                    subscriber.send(message)
+                return
+            self.stats.tile_computations += 1
+
+        previous_sun = state.sun
+        state.sun, state.shadow_wkb, state.shadow = sun, result.shadow_wkb, result.shadow
+        first = previous_sun is None
+        if first:
+            # 先前計算失敗時已加入的訂閱者還沒有快照
+            for subscriber in state.subscribers:
+                subscriber.send(self._snapshot_message(tile, state))
+            self.stats.snapshots_sent += len(state.subscribers)
+        elif state.subscribers:
+            message = encode(
+                {
+                    "type": "delta",
+                    "tile": tile_key(tile),
+                    "sun": sun,
+                    "previous_sun": previous_sun,
+                    "added": result.added,
+                    "removed": result.removed,
+                }
+            )
+            for subscriber in state.subscribers:
+                subscriber.send(message)
+            self.stats.deltas_sent += len(state.subscribers)
+
+    async def _refresh(self, tile: TileCoord, state: TileState) -> None:
+        async with state.lock:
+            if state.sun != (await self.sun())[0]:
+                await self._advance(tile, state)
+
+    async def _tick_loop(self) -> None:
+        while self.subscribers:
+            await asyncio.sleep(self.tick_s)
+            previous_state = await self.sun()
+            previous = previous_state[0]
+            self._sun = None
+            try:
+                sun, bucket = await self.sun()
+            except Exception:
+                # 太陽位置算不出來時沿用上一輪，避免整個 tick 迴圈停掉
+                self._sun = previous_state
+                continue
+            if sun != previous:
+                message = encode({"type": "sun", "sun": sun, "sun_bucket": asdict(bucket) if bucket else None})
+                for subscriber in self.subscribers:
+                    subscriber.send(message)
+            for tile in [tile for tile, state in self.tiles.items() if not state.subscribers and not state.lock.locked()]:
+                del self.tiles[tile]
+            await asyncio.gather(
+                *(self._refresh(tile, state) for tile, state in list(self.tiles.items()) if state.subscribers)
+            )
+            self.stats.tiles_watched = len(self.tiles)
+
+    def snapshot_stats(self) -> Dict[str, Any]:
+        self.stats.subscribers = len(self.subscribers)
+        self.stats.tiles_watched = len(self.tiles)
+        return asdict(self.stats)
+
+    def close(self) -> None:
+        if self._ticker is not None:
+            self._ticker.cancel()
+
+
+live_hub = LiveShadowHub(
+    zoom=int(os.getenv("LIVE_TILE_ZOOM", "16")),
+    max_tiles=int(os.getenv("LIVE_MAX_TILES", "64")),
+    tick_s=_env_float("LIVE_TICK_S", 30.0),
+    queue_size=int(os.getenv("LIVE_QUEUE_SIZE", "256")),
+    max_shadow_length=_env_float("LIVE_MAX_SHADOW_LENGTH_M", 250.0),
+    concurrency=int(os.getenv("LIVE_CONCURRENCY", "4")),
+    sun_location=(_env_float("LIVE_SUN_LAT", 25.037542), _env_float("LIVE_SUN_LNG", 121.563124)),
+)
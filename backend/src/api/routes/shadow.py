@@ -3,28 +3,196 @@
 from __future__ import annotations
 
 import asyncio
-from dataclasses import asdict
-from typing import Any, Dict
+import json
+from dataclasses import asdict, astuple
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Literal, Optional, Tuple, TypeVar
+from urllib.parse import urlencode
 
-import pandas as pd
 import requests
-from fastapi import APIRouter, HTTPException
+from fastapi import (
+    APIRouter,
+    Depends,
+    Header,
+    HTTPException,
+    Path,
+    Query,
+    Request,
+    Response,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.responses import JSONResponse, RedirectResponse, StreamingResponse
 from sqlalchemy.exc import SQLAlchemyError
 from zoneinfo import ZoneInfo
 
-from api.schemas import ShadowAreaRequest, ShadowRouteRequest
-from utils import solar_position
+from api import http_cache
+from api.admission import OverCapacityError, WorkloadPool, db_pool, google_pool
+from api.live_shadow import Subscriber, encode, live_hub
+from api.schemas import (
+    PointShadeRequest,
+    ShadowAreaRequest,
+    ShadowCoverageBatchRequest,
+    ShadowRouteRequest,
+)
+from utils.point_shade import PointInput, available_poi_sets, load_poi_set, point_shade_status, sun_steps
+from utils.route_coverage import (
+    CorridorShadow,
+    CoverageParams,
+    CoverageRoute,
+    chunked,
+    compute_corridor_shadow,
+    coverage_result,
+    score_coverage_chunk,
+)
+from utils.shade_hours import MAX_QUERY_RADIUS_M, lookup_shade_hours
 from utils.shadow_area import ShadowAreaParams, compute_shadow_geojson
+from utils.deadline import Deadline, DeadlineExceeded, is_statement_timeout
 from utils.shadow_route_optimizer import (
+    GOOGLE_ROUTES_TIMEOUT_S,
+    RouteCandidate,
     ShadowRouteParams,
-    full_shadow_coverage_routes,
-    optimize_shadow_route,
+    apply_cached_scores,
+    apply_full_shadow_coverage,
+    apply_raster_scores,
+    coarse_params,
+    estimate_candidates,
+    fetch_route_candidates,
+    rank_candidates,
+    rank_two_phase,
+    score_candidates,
+    select_for_exact,
 )
+from utils.shadow_tiles import TilePack, nearest_tile_pack, open_tile_pack
+from utils.single_flight import SingleFlight
+from utils.sun_bucket import SunBucket
 
 router = APIRouter(prefix="", tags=["shadow"])
 
+# 同一組參數（含太陽 bucket）同時進來的請求共用一次計算
+shadow_area_flight = SingleFlight("shadow_area")
+shadow_route_flight = SingleFlight("shadow_route")
+point_shade_flight = SingleFlight("point_shade")
+
+T = TypeVar("T")
+
+# 批次覆蓋率同時送進 db 池的批次數；其餘批次在此排隊，不會一次塞滿 admission 佇列
+COVERAGE_CHUNK_CONCURRENCY = 4
+
+# 請求預算分配（秒）：Google 呼叫替評分保留的時間、精確評分替降級評分保留的時間，
+# 以及精確評分與粗略 SQL 評分至少需要的剩餘時間
+ROUTE_SCORING_RESERVE_S = 1.5
+GOOGLE_MIN_TIMEOUT_S = 1.0
+ROUTE_FALLBACK_RESERVE_S = 0.3
+ROUTE_EXACT_MIN_S = 0.5
+ROUTE_COARSE_MIN_S = 0.2
+# 剩餘預算少於此值時跳過兩階段的估計，直接精確評分
+ROUTE_ESTIMATE_MIN_S = 1.5
+# 區域陰影的跟隨者在領頭請求逾時後，剩餘時間至少這麼多才自己重算
+AREA_RETRY_MIN_S = 1.0
+
+
+async def _run_admitted(pool: WorkloadPool, func: Callable[..., T], *args: Any) -> T:
+    try:
+        return await pool.run(func, *args)
+    except OverCapacityError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"服務忙碌中（{exc.pool}），請稍後再試",
+            headers={"Retry-After": str(exc.retry_after_s)},
+        ) from exc
+
+
+def _request_deadline(x_request_budget_ms: Optional[str] = Header(None)) -> Deadline:
+    """每個請求的時間預算：`X-Request-Budget-Ms` 標頭，未提供時採 `REQUEST_BUDGET_MS`。"""
+
+    return Deadline.from_header(x_request_budget_ms)
+
+
+def _google_timeout_s(deadline: Deadline) -> float:
+    # 預算夠時替評分保留時間；不夠時 Google 仍至少拿到 GOOGLE_MIN_TIMEOUT_S（評分改走降級）
+    remaining = deadline.remaining_s()
+    reserve = ROUTE_SCORING_RESERVE_S if remaining >= ROUTE_SCORING_RESERVE_S + GOOGLE_MIN_TIMEOUT_S else 0.0
+    return deadline.timeout_s(cap_s=GOOGLE_ROUTES_TIMEOUT_S, reserve_s=reserve)
+
+
+async def _degraded_scores(
+    params: ShadowRouteParams,
+    candidates: List[RouteCandidate],
+    deadline: Deadline,
+) -> None:
+    """依序以快取分數、陰影點陣、粗略 SQL 補上未評分的路線；都不行就維持未評分。"""
+
+    apply_cached_scores(params, candidates)
+    if all(candidate.score_source != "none" for candidate in candidates):
+        return
+    apply_raster_scores(params, candidates)
+    if all(candidate.score_source != "none" for candidate in candidates):
+        return
+    if deadline.remaining_s() < ROUTE_COARSE_MIN_S:
+        return
+    try:
+        await db_pool.run(score_candidates, coarse_params(params), candidates, deadline, source="coarse")
+    except (OverCapacityError, DeadlineExceeded):
+        pass
+    except SQLAlchemyError as exc:
+        if not is_statement_timeout(exc):
+            raise
+
+
+async def _optimize_route(params: ShadowRouteParams, deadline: Deadline) -> Dict[str, Any]:
+    candidates = await _run_admitted(google_pool, fetch_route_candidates, params, _google_timeout_s(deadline))
+
+    reason: Optional[str] = None
+    samples = 0
+    to_score = candidates
+    if deadline.remaining_s() < ROUTE_EXACT_MIN_S + ROUTE_FALLBACK_RESERVE_S:
+        reason = "budget"
+    else:
+        remaining = deadline.remaining_s()
+        if params.ranking == "two_phase" and len(candidates) > 1 and remaining >= ROUTE_ESTIMATE_MIN_S:
+            # 估計至多用掉一半預算；失敗或逾時不影響結果，只是每條路線都要精確評分
+            reserve = max(ROUTE_EXACT_MIN_S + ROUTE_FALLBACK_RESERVE_S, remaining / 2)
+            try:
+                samples = await db_pool.run(estimate_candidates, params, candidates, deadline, reserve_s=reserve)
+                to_score = select_for_exact(candidates)
+            except (OverCapacityError, DeadlineExceeded):
+                pass
+            except SQLAlchemyError as exc:
+                if not is_statement_timeout(exc):
+                    raise
+        try:
+            await db_pool.run(score_candidates, params, to_score, deadline, reserve_s=ROUTE_FALLBACK_RESERVE_S)
+        except OverCapacityError:
+            reason = "over_capacity"
+        except DeadlineExceeded:
+            reason = "budget"
+        except SQLAlchemyError as exc:
+            if not is_statement_timeout(exc):
+                raise
+            reason = "statement_timeout"
+
+    if reason is not None:
+        await _degraded_scores(params, candidates, deadline)
+    if params.ranking == "two_phase":
+        result = rank_two_phase(params, candidates, samples)
+    else:
+        result = rank_candidates(params, candidates)
+    result["degraded"] = reason is not None
+    if reason is not None:
+        result["degraded_reason"] = reason
+    return result
+
+
+def _compute_solar(**kwargs: Any) -> Any:
+    # pandas/pvlib 匯入約需一秒，延後到第一次計算（通常是 warmup）才載入
+    from utils import solar_position
+
+    return solar_position.compute_solar_position(**kwargs)
+
+
+def _resolve_timestamp(value: Any, timezone_name: str) -> Any:
+    import pandas as pd
 
-def _resolve_timestamp(value: pd.Timestamp | str, timezone_name: str) -> pd.Timestamp:
     try:
         timestamp = pd.Timestamp(value)
     except ValueError as exc:
@@ -51,8 +219,11 @@ def _build_shadow_params(body: ShadowRouteRequest, azimuth: float, elevation: fl
         "azimuth_deg": azimuth,
         "elevation_deg": elevation,
         "building_search_radius": body.building_search_radius,
+        "max_shadow_length": body.max_shadow_length_m,
         "route_buffer_m": body.route_buffer_m,
         "snap_tolerance": body.snap_tolerance,
+        "scoring_mode": body.scoring_mode,
+        "ranking": body.ranking,
     }
 
     return ShadowRouteParams(**kwargs)
@@ -63,20 +234,111 @@ def _build_shadow_area_params(body: ShadowAreaRequest, azimuth: float, elevation
         "center_lat": body.center_lat,
         "center_lng": body.center_lng,
         "search_radius": body.search_radius_m,
+        "max_shadow_length": body.max_shadow_length_m,
         "azimuth_deg": azimuth,
         "elevation_deg": elevation,
     }
 
     return ShadowAreaParams(**kwargs)
 
+
+NIGHT_AREA_RESULT: Dict[str, Any] = {
+    "feature_collection": {"type": "FeatureCollection", "features": []},
+    "building_count": 0,
+    "message": "太陽已下山，無陰影可顯示",
+}
+
+
+async def _coalesced(
+    flight: SingleFlight,
+    key: Any,
+    deadline: Deadline,
+    compute: Callable[[], Awaitable[T]],
+    *,
+    min_retry_s: float,
+) -> T:
+    """併入進行中的計算，但結果受領頭請求的預算影響：共用的結果是降級或逾時，
+    而自己還有至少 `min_retry_s` 秒時，跟隨者改以自己的預算重算，不被小預算的請求拖累。"""
+
+    led = False
+
+    def lead() -> Awaitable[T]:
+        nonlocal led
+        led = True
+        return compute()
+
+    try:
+        result = await flight.do(key, lead)
+    except (DeadlineExceeded, requests.Timeout, SQLAlchemyError) as exc:
+        timed_out = not isinstance(exc, SQLAlchemyError) or is_statement_timeout(exc)
+        if led or not timed_out or deadline.remaining_s() < min_retry_s:
+            raise
+        return await compute()
+    if not led and isinstance(result, dict) and result.get("degraded") and deadline.remaining_s() >= min_retry_s:
+        return await compute()
+    return result
+
+
+async def _shadow_route_result(params: ShadowRouteParams, deadline: Deadline) -> Dict[str, Any]:
+    try:
+        return await _coalesced(
+            shadow_route_flight,
+            astuple(params),
+            deadline,
+            lambda: _optimize_route(params, deadline),
+            min_retry_s=ROUTE_EXACT_MIN_S + ROUTE_FALLBACK_RESERVE_S,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except (requests.Timeout, DeadlineExceeded) as exc:
+        raise HTTPException(status_code=504, detail=f"Google Routes API 未在請求預算內回應：{exc}") from exc
+    except requests.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Google Routes API 呼叫失敗：{exc}") from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
+
+
+async def _night_route_result(params: ShadowRouteParams, deadline: Deadline) -> Dict[str, Any]:
+    try:
+        timeout_s = deadline.timeout_s(cap_s=GOOGLE_ROUTES_TIMEOUT_S)
+        candidates = await _run_admitted(google_pool, fetch_route_candidates, params, timeout_s)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except (requests.Timeout, DeadlineExceeded) as exc:
+        raise HTTPException(status_code=504, detail=f"Google Routes API 未在請求預算內回應：{exc}") from exc
+    except requests.HTTPError as exc:
+        raise HTTPException(status_code=502, detail=f"Google Routes API 呼叫失敗：{exc}") from exc
+    return apply_full_shadow_coverage(params, candidates)
+
+
+async def _shadow_area_result(params: ShadowAreaParams, deadline: Deadline) -> Dict[str, Any]:
+    try:
+        return await _coalesced(
+            shadow_area_flight,
+            astuple(params),
+            deadline,
+            lambda: _run_admitted(db_pool, compute_shadow_geojson, params, deadline),
+            min_retry_s=AREA_RETRY_MIN_S,
+        )
+    except DeadlineExceeded as exc:
+        raise HTTPException(status_code=504, detail=f"陰影計算超過請求預算：{exc}") from exc
+    except SQLAlchemyError as exc:
+        if is_statement_timeout(exc):
+            raise HTTPException(status_code=504, detail="陰影計算超過請求預算，請縮小範圍或提高預算") from exc
+        raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
+
+
 @router.post("/shadow-route")
-async def shadow_route(body: ShadowRouteRequest) -> Dict[str, Any]:
+async def shadow_route(
+    body: ShadowRouteRequest,
+    deadline: Deadline = Depends(_request_deadline),
+) -> Dict[str, Any]:
     timestamp = _resolve_timestamp(body.timestamp, body.timezone)
     solar_lat = body.solar_latitude if body.solar_latitude is not None else body.origin_lat
     solar_lng = body.solar_longitude if body.solar_longitude is not None else body.origin_lng
 
     try:
-        solar = solar_position.compute_solar_position(
+        solar = _compute_solar(
             timestamp=timestamp,
             latitude=solar_lat,
             longitude=solar_lng,
@@ -87,42 +349,30 @@ async def shadow_route(body: ShadowRouteRequest) -> Dict[str, Any]:
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
 
-    params = _build_shadow_params(body, solar.azimuth_deg, solar.elevation_deg)
-
     if solar.elevation_deg <= 0:
-        try:
-            result = await asyncio.to_thread(full_shadow_coverage_routes, params)
-        except ValueError as exc:
-            raise HTTPException(status_code=400, detail=str(exc)) from exc
-        except requests.HTTPError as exc:
-            raise HTTPException(status_code=502, detail=f"Google Routes API 呼叫失敗：{exc}") from exc
-
+        params = _build_shadow_params(body, solar.azimuth_deg, solar.elevation_deg)
         payload = {"solar": asdict(solar), "message": "太陽已下山，全程視為陰影"}
-        payload.update(result)
+        payload.update(await _night_route_result(params, deadline))
         return payload
 
-    try:
-        result = await asyncio.to_thread(optimize_shadow_route, params)
-    except ValueError as exc:
-        raise HTTPException(status_code=400, detail=str(exc)) from exc
-    except requests.HTTPError as exc:
-        raise HTTPException(status_code=502, detail=f"Google Routes API 呼叫失敗：{exc}") from exc
-    except SQLAlchemyError as exc:
-        raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
-
-    payload = {"solar": asdict(solar)}
-    payload.update(result)
+    bucket = SunBucket.from_angles(solar.azimuth_deg, solar.elevation_deg)
+    params = _build_shadow_params(body, bucket.azimuth_deg, bucket.elevation_deg)
+    payload = {"solar": asdict(solar), "sun_bucket": asdict(bucket)}
+    payload.update(await _shadow_route_result(params, deadline))
     return payload
 
 
 @router.post("/shadow-area")
-async def shadow_area(body: ShadowAreaRequest) -> Dict[str, Any]:
+async def shadow_area(
+    body: ShadowAreaRequest,
+    deadline: Deadline = Depends(_request_deadline),
+) -> Dict[str, Any]:
     timestamp = _resolve_timestamp(body.timestamp, body.timezone)
     solar_lat = body.solar_latitude if body.solar_latitude is not None else body.center_lat
     solar_lng = body.solar_longitude if body.solar_longitude is not None else body.center_lng
 
     try:
-        solar = solar_position.compute_solar_position(
+        solar = _compute_solar(
             timestamp=timestamp,
             latitude=solar_lat,
             longitude=solar_lng,
@@ -134,20 +384,526 @@ async def shadow_area(body: ShadowAreaRequest) -> Dict[str, Any]:
         raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
 
     if solar.elevation_deg <= 0:
-        return {
-            "solar": asdict(solar),
-            "feature_collection": {"type": "FeatureCollection", "features": []},
-            "building_count": 0,
-            "message": "太陽已下山，無陰影可顯示",
+        return {"solar": asdict(solar), **NIGHT_AREA_RESULT}
+
+    bucket = SunBucket.from_angles(solar.azimuth_deg, solar.elevation_deg)
+    params = _build_shadow_area_params(body, bucket.azimuth_deg, bucket.elevation_deg)
+    payload = {"solar": asdict(solar), "sun_bucket": asdict(bucket)}
+    payload.update(await _shadow_area_result(params, deadline))
+    return payload
+
+
+def _canonical_sun(
+    sun: Optional[str],
+    timestamp: Optional[str],
+    timezone: str,
+    lat: float,
+    lng: float,
+) -> Tuple[str, Optional[SunBucket]]:
+    """取得正規化的 sun key：直接給 `sun` 時驗證格式，否則以吸附後座標計算 `timestamp` 的太陽 bucket。"""
+
+    if sun is None:
+        if timestamp is None:
+            raise HTTPException(status_code=400, detail="需提供 timestamp 或 sun")
+        resolved = _resolve_timestamp(timestamp, timezone)
+        try:
+            solar = _compute_solar(
+                timestamp=resolved,
+                latitude=lat,
+                longitude=lng,
+                altitude=20.0,
+                pressure=101325.0,
+                temperature=25.0,
+            )
+        except Exception as exc:
+            raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
+        sun = http_cache.sun_key(solar.azimuth_deg, solar.elevation_deg)
+
+    parsed = http_cache.parse_sun_key(sun)
+    if parsed is None:
+        raise HTTPException(status_code=400, detail=f"無法解析 sun 參數：{sun}（格式如 a180.00_e45.25 或 night）")
+    return parsed
+
+
+async def _cacheable(
+    request: Request,
+    canonical_url: str,
+    max_age_s: int,
+    compute: Callable[[], Awaitable[Dict[str, Any]]],
+) -> Response:
+    """非正規網址一律 308 轉址；正規網址附 ETag/Cache-Control，If-None-Match 相符時回 304。"""
+
+    current = request.url.path + (f"?{request.url.query}" if request.url.query else "")
+    if current != canonical_url:
+        return RedirectResponse(canonical_url, status_code=308, headers=http_cache.cache_headers(max_age_s))
+
+    try:
+        version = await http_cache.buildings_version()
+    except OverCapacityError as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=f"服務忙碌中（{exc.pool}），請稍後再試",
+            headers={"Retry-After": str(exc.retry_after_s)},
+        ) from exc
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
+
+    etag = http_cache.make_etag(version, canonical_url)
+    headers = http_cache.cache_headers(max_age_s, etag)
+    if http_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    payload = await compute()
+    payload["canonical_url"] = canonical_url
+    if payload.get("degraded"):
+        # 降級結果不能讓快取存起來，下一次請求應重新精確計算
+        headers = {"Cache-Control": "no-store"}
+    return JSONResponse(payload, headers=headers)
+
+
+@router.get("/shadow-area")
+async def shadow_area_cacheable(
+    request: Request,
+    lat: float = Query(..., ge=-90, le=90, description="查詢中心緯度，會吸附到格網"),
+    lng: float = Query(..., ge=-180, le=180, description="查詢中心經度，會吸附到格網"),
+    radius_m: float = Query(
+        50.0, gt=0, le=http_cache.MAX_RADIUS_M, description="建物搜尋半徑 (公尺)，會加上吸附偏移後往上取整"
+    ),
+    max_shadow_length_m: float = Query(250.0, gt=0, le=1000, description="單棟建物陰影長度上限 (公尺)"),
+    timestamp: Optional[str] = Query(None, description="ISO 8601 時間；會換算成 sun 參數後轉址"),
+    timezone: str = Query("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區"),
+    sun: Optional[str] = Query(None, description="太陽 bucket（如 a180.00_e45.25 或 night），正規網址使用"),
+    deadline: Deadline = Depends(_request_deadline),
+) -> Response:
+    center_lat, center_lng = http_cache.snap_coord(lat), http_cache.snap_coord(lng)
+    sun_key, bucket = _canonical_sun(sun, timestamp, timezone, center_lat, center_lng)
+    offset_m = http_cache.snap_offset_m(lat, lng, center_lat, center_lng)
+    radius = http_cache.canonical_radius(radius_m, offset_m)
+    max_shadow_length = http_cache.snap_up(max_shadow_length_m, http_cache.SHADOW_LENGTH_STEP_M)
+    query = urlencode(
+        [
+            ("lat", http_cache.format_coord(center_lat)),
+            ("lng", http_cache.format_coord(center_lng)),
+            ("radius_m", radius),
+            ("max_shadow_length_m", max_shadow_length),
+            ("sun", sun_key),
+        ]
+    )
+
+    async def compute() -> Dict[str, Any]:
+        if bucket is None:
+            return {"sun_bucket": None, **NIGHT_AREA_RESULT}
+        params = ShadowAreaParams(
+            center_lat=center_lat,
+            center_lng=center_lng,
+            search_radius=float(radius),
+            max_shadow_length=float(max_shadow_length),
+            azimuth_deg=bucket.azimuth_deg,
+            elevation_deg=bucket.elevation_deg,
+        )
+        return {"sun_bucket": asdict(bucket), **(await _shadow_area_result(params, deadline))}
+
+    return await _cacheable(request, f"/shadow-area?{query}", http_cache.area_max_age_s(), compute)
+
+
+@router.get("/shadow-route")
+async def shadow_route_cacheable(
+    request: Request,
+    origin_lat: float = Query(..., ge=-90, le=90, description="起點緯度，會吸附到格網"),
+    origin_lng: float = Query(..., ge=-180, le=180, description="起點經度，會吸附到格網"),
+    dest_lat: float = Query(..., ge=-90, le=90, description="終點緯度，會吸附到格網"),
+    dest_lng: float = Query(..., ge=-180, le=180, description="終點經度，會吸附到格網"),
+    max_alternatives: int = Query(3, ge=1, le=10, description="最多候選路線數"),
+    scoring_mode: Literal["clip", "dissolve"] = Query("clip", description="陰影評分方式"),
+    ranking: Literal["exact", "two_phase"] = Query(
+        "exact", description="exact：全部精確評分；two_phase：先估計再精確評分可能勝出者"
+    ),
+    timestamp: Optional[str] = Query(None, description="ISO 8601 時間；會換算成 sun 參數後轉址"),
+    timezone: str = Query("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區"),
+    sun: Optional[str] = Query(None, description="太陽 bucket（如 a180.00_e45.25 或 night），正規網址使用"),
+    deadline: Deadline = Depends(_request_deadline),
+) -> Response:
+    origin = (http_cache.snap_coord(origin_lat), http_cache.snap_coord(origin_lng))
+    dest = (http_cache.snap_coord(dest_lat), http_cache.snap_coord(dest_lng))
+    sun_key, bucket = _canonical_sun(sun, timestamp, timezone, *origin)
+    query = urlencode(
+        [
+            ("origin_lat", http_cache.format_coord(origin[0])),
+            ("origin_lng", http_cache.format_coord(origin[1])),
+            ("dest_lat", http_cache.format_coord(dest[0])),
+            ("dest_lng", http_cache.format_coord(dest[1])),
+            ("max_alternatives", max_alternatives),
+            ("scoring_mode", scoring_mode),
+            ("ranking", ranking),
+            ("sun", sun_key),
+        ]
+    )
+
+    async def compute() -> Dict[str, Any]:
+        params = ShadowRouteParams(
+            origin_lat=origin[0],
+            origin_lng=origin[1],
+            dest_lat=dest[0],
+            dest_lng=dest[1],
+            max_alternatives=max_alternatives,
+            azimuth_deg=bucket.azimuth_deg if bucket else 0.0,
+            elevation_deg=bucket.elevation_deg if bucket else 0.0,
+            scoring_mode=scoring_mode,
+            ranking=ranking,
+        )
+        if bucket is None:
+            night = await _night_route_result(params, deadline)
+            return {"sun_bucket": None, "message": "太陽已下山，全程視為陰影", **night}
+        return {"sun_bucket": asdict(bucket), **(await _shadow_route_result(params, deadline))}
+
+    return await _cacheable(request, f"/shadow-route?{query}", http_cache.route_max_age_s(), compute)
+
+
+@router.get("/shade-hours")
+async def shade_hours(
+    lat: float = Query(..., ge=-90, le=90, description="查詢點緯度"),
+    lng: float = Query(..., ge=-180, le=180, description="查詢點經度"),
+    run_id: Optional[str] = Query(None, description="離線彙整的 run_id，不填則使用最新一次發佈的結果"),
+    radius_m: float = Query(0.0, ge=0, le=MAX_QUERY_RADIUS_M, description="一併回傳半徑內各格的遮蔭時數 (公尺)"),
+) -> Dict[str, Any]:
+    try:
+        result = await _run_admitted(db_pool, lambda: lookup_shade_hours(lat, lng, run_id=run_id, radius_m=radius_m))
+    except SQLAlchemyError as exc:
+        raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
+
+    if result is None:
+        raise HTTPException(status_code=404, detail="尚未發佈遮蔭時數結果，請先執行 utils.shade_hours build --publish")
+    return result
+
+
+@router.get("/shadow-tiles")
+async def shadow_tiles(
+    timestamp: str = Query(..., description="ISO 8601 時間，可含時區"),
+    timezone: str = Query("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區"),
+    lat: float = Query(25.037542, ge=-90, le=90, description="計算太陽位置使用的緯度"),
+    lng: float = Query(121.563124, ge=-180, le=180, description="計算太陽位置使用的經度"),
+) -> Dict[str, Any]:
+    resolved = _resolve_timestamp(timestamp, timezone)
+    try:
+        solar = _compute_solar(
+            timestamp=resolved,
+            latitude=lat,
+            longitude=lng,
+            altitude=20.0,
+            pressure=101325.0,
+            temperature=25.0,
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
+
+    if solar.elevation_deg <= 0:
+        raise HTTPException(status_code=404, detail="太陽已下山，沒有陰影圖磚")
+    found = await _run_admitted(db_pool, _find_tile_pack, solar.azimuth_deg, solar.elevation_deg)
+    if found is None:
+        raise HTTPException(status_code=404, detail="此時間沒有預先渲染的陰影圖磚，請改用 /shadow-area")
+    pack, metadata = found
+    return {
+        "solar": asdict(solar),
+        "bucket": pack.key,
+        "tiles": f"/shadow-tiles/{pack.key}/{{z}}/{{x}}/{{y}}.pbf",
+        "metadata": metadata,
+    }
+
+
+def _find_tile_pack(azimuth_deg: float, elevation_deg: float) -> Optional[Tuple[TilePack, Dict[str, str]]]:
+    # 圖磚包的查找與 sqlite 讀取都是阻塞 I/O，不能在事件迴圈上跑
+    pack = nearest_tile_pack(azimuth_deg, elevation_deg)
+    reader = open_tile_pack(pack.key) if pack is not None else None
+    if reader is None:
+        return None
+    return pack, reader.metadata()
+
+
+def _read_tile(bucket_key: str, z: int, x: int, y: int) -> Tuple[bool, Optional[bytes]]:
+    """回傳（圖磚包是否存在, 圖磚內容）。"""
+
+    reader = open_tile_pack(bucket_key)
+    if reader is None:
+        return False, None
+    return True, reader.tile(z, x, y)
+
+
+@router.get("/shadow-tiles/{bucket_key}/{z}/{x}/{y}.pbf")
+async def shadow_tile(
+    bucket_key: str,
+    z: int = Path(..., ge=0, le=22, description="縮放層級"),
+    x: int = Path(..., description="圖磚欄"),
+    y: int = Path(..., description="圖磚列（XYZ，北方為 0）"),
+) -> Response:
+    if "/" in bucket_key or ".." in bucket_key:
+        raise HTTPException(status_code=404, detail=f"找不到圖磚包 {bucket_key}")
+    if not 0 <= x < 2**z or not 0 <= y < 2**z:
+        raise HTTPException(status_code=400, detail="圖磚座標超出範圍")
+
+    found, data = await _run_admitted(db_pool, _read_tile, bucket_key, z, x, y)
+    if not found:
+        raise HTTPException(status_code=404, detail=f"找不到圖磚包 {bucket_key}")
+    if data is None:
+        # 沒有陰影的圖磚不寫入圖磚包，回傳空內容讓地圖端直接略過
+        return Response(status_code=204)
+    return Response(
+        content=data,
+        media_type="application/x-protobuf",
+        headers={"Content-Encoding": "gzip", "Cache-Control": "public, max-age=86400, immutable"},
+    )
+
+
+def _ndjson(payload: Dict[str, Any]) -> bytes:
+    return (json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def _stream_coverage(
+    meta: Dict[str, Any],
+    routes: List[CoverageRoute],
+    corridor: CorridorShadow,
+    chunk_size: int,
+) -> AsyncIterator[bytes]:
+    yield _ndjson(meta)
+    for route in routes:
+        if route.error:
+            yield _ndjson({"type": "route", "route_id": route.route_id, "error": route.error})
+
+    semaphore = asyncio.Semaphore(COVERAGE_CHUNK_CONCURRENCY)
+
+    async def run_chunk(chunk: List[CoverageRoute]) -> List[Dict[str, Any]]:
+        async with semaphore:
+            try:
+                return await db_pool.run(score_coverage_chunk, chunk, corridor)
+            except OverCapacityError as exc:
+                error = f"服務忙碌中（{exc.pool}），請稍後再試"
+            except SQLAlchemyError as exc:
+                error = f"資料庫操作失敗：{exc}"
+            return [{"route_id": route.route_id, "error": error} for route in chunk]
+
+    valid = [route for route in routes if route.wkt]
+    tasks = [asyncio.ensure_future(run_chunk(chunk)) for chunk in chunked(valid, chunk_size)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            for result in await next_done:
+                yield _ndjson({"type": "route", **result})
+    finally:
+        # 用戶端中途斷線時不必再算剩下的批次
+        for task in tasks:
+            task.cancel()
+    yield _ndjson({"type": "done", "route_count": len(routes)})
+
+
+@router.post("/shadow-coverage/batch")
+async def shadow_coverage_batch(body: ShadowCoverageBatchRequest) -> StreamingResponse:
+    routes = [
+        CoverageRoute.decode(item.route_id or f"route_{idx}", item.encoded_polyline)
+        for idx, item in enumerate(body.routes, start=1)
+    ]
+    if len({route.route_id for route in routes}) != len(routes):
+        raise HTTPException(status_code=400, detail="route_id 不可重複")
+    valid = [route for route in routes if route.wkt]
+
+    timestamp = _resolve_timestamp(body.timestamp, body.timezone)
+    first = valid[0].coordinates[0] if valid else (25.037542, 121.563124)
+    solar_lat = body.solar_latitude if body.solar_latitude is not None else first[0]
+    solar_lng = body.solar_longitude if body.solar_longitude is not None else first[1]
+    try:
+        solar = _compute_solar(
+            timestamp=timestamp,
+            latitude=solar_lat,
+            longitude=solar_lng,
+            altitude=body.solar_altitude_m,
+            pressure=body.solar_pressure,
+            temperature=body.solar_temperature,
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
+
+    meta: Dict[str, Any] = {"type": "meta", "solar": asdict(solar), "route_count": len(routes)}
+    if solar.elevation_deg <= 0:
+        meta["message"] = "太陽已下山，全程視為陰影"
+        lines = [_ndjson(meta)]
+        for route in routes:
+            if route.error:
+                lines.append(_ndjson({"type": "route", "route_id": route.route_id, "error": route.error}))
+            else:
+                length = route.length_m()
+                lines.append(_ndjson({"type": "route", **coverage_result(route.route_id, length, length)}))
+        lines.append(_ndjson({"type": "done", "route_count": len(routes)}))
+        return StreamingResponse(iter(lines), media_type="application/x-ndjson")
+
+    bucket = SunBucket.from_angles(solar.azimuth_deg, solar.elevation_deg)
+    params = CoverageParams(
+        azimuth_deg=bucket.azimuth_deg,
+        elevation_deg=bucket.elevation_deg,
+        building_search_radius=body.building_search_radius,
+        max_shadow_length=body.max_shadow_length_m,
+        route_buffer_m=body.route_buffer_m,
+    )
+    corridor = CorridorShadow(None, 0, 0)
+    if valid:
+        # 走廊陰影在開始串流前算好，忙碌或資料庫錯誤仍能以 HTTP 狀態碼回報
+        try:
+            corridor = await _run_admitted(db_pool, compute_corridor_shadow, valid, params)
+        except SQLAlchemyError as exc:
+            raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
+
+    meta.update(
+        {
+            "sun_bucket": asdict(bucket),
+            "corridor": {"shadow_pieces": corridor.piece_count, "building_count": corridor.building_count},
         }
+    )
+    return StreamingResponse(
+        _stream_coverage(meta, routes, corridor, body.chunk_size),
+        media_type="application/x-ndjson",
+    )
+
 
-    params = _build_shadow_area_params(body, solar.azimuth_deg, solar.elevation_deg)
+@router.get("/shadow-points/sets")
+async def shadow_point_sets() -> Dict[str, Any]:
+    return {"poi_sets": available_poi_sets()}
 
+
+@router.post("/shadow-points")
+async def shadow_points(body: PointShadeRequest) -> Dict[str, Any]:
+    if body.poi_set is not None:
+        points = load_poi_set(body.poi_set)
+        if points is None:
+            raise HTTPException(status_code=404, detail=f"找不到 POI 集合：{body.poi_set}")
+    else:
+        points = tuple(
+            PointInput(id=item.id if item.id is not None else str(idx), lat=item.lat, lng=item.lng)
+            for idx, item in enumerate(body.points or [])
+        )
+    if not points:
+        return {"points": [], "horizon_minutes": body.horizon_minutes, "step_minutes": body.step_minutes}
+
+    # 狀態精度本來就是 step_minutes，時間取整到分鐘，讓同一分鐘內刷新同一圖層的請求可以合併
+    timestamp = _resolve_timestamp(body.timestamp, body.timezone).floor("min")
+    solar_lat = sum(point.lat for point in points) / len(points)
+    solar_lng = sum(point.lng for point in points) / len(points)
     try:
-        result = await asyncio.to_thread(compute_shadow_geojson, params)
+        steps = sun_steps(
+            timestamp,
+            solar_lat,
+            solar_lng,
+            horizon_minutes=body.horizon_minutes,
+            step_minutes=body.step_minutes,
+        )
+    except Exception as exc:
+        raise HTTPException(status_code=400, detail=f"無法計算太陽位置：{exc}") from exc
+
+    key = (
+        body.poi_set or points,
+        timestamp.isoformat(),
+        body.horizon_minutes,
+        body.step_minutes,
+        body.max_shadow_length_m,
+    )
+    try:
+        results = await point_shade_flight.do(
+            key,
+            lambda: _run_admitted(
+                db_pool,
+                lambda: point_shade_status(points, steps, max_shadow_length=body.max_shadow_length_m),
+            ),
+        )
     except SQLAlchemyError as exc:
         raise HTTPException(status_code=502, detail=f"資料庫操作失敗：{exc}") from exc
 
-    payload = {"solar": asdict(solar)}
-    payload.update(result)
-    return payload
+    return {
+        "timestamp": timestamp.isoformat(),
+        "solar": asdict(steps[0]),
+        "horizon_minutes": body.horizon_minutes,
+        "step_minutes": body.step_minutes,
+        "points": results,
+    }
+
+
+# SSE 連線沒有訊息時送出註解行，避免被代理伺服器當成閒置連線切斷
+LIVE_SSE_KEEPALIVE_S = 15.0
+
+
+def _parse_bbox(value: Any) -> Tuple[float, float, float, float]:
+    try:
+        parts = value.split(",") if isinstance(value, str) else list(value)
+        west, south, east, north = (float(part) for part in parts)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("bbox 需為 [west, south, east, north]") from exc
+    return west, south, east, north
+
+
+async def _pump_websocket(websocket: WebSocket, subscriber: Subscriber) -> None:
+    while True:
+        message = await subscriber.queue.get()
+        await websocket.send_text(message)
+        if subscriber.overflowed and subscriber.queue.empty():
+            await websocket.close(code=1013, reason="too slow, reconnect for a fresh snapshot")
+            return
+
+
+@router.websocket("/ws/shadow")
+async def shadow_live_websocket(websocket: WebSocket) -> None:
+    """訂閱即時陰影：送 `{"type": "viewport", "bbox": [w, s, e, n]}`，收到 snapshot 與後續 delta。"""
+
+    await websocket.accept()
+    subscriber = live_hub.subscribe()
+    sender = asyncio.ensure_future(_pump_websocket(websocket, subscriber))
+    try:
+        subscriber.send(await live_hub.hello())
+        while not sender.done():
+            receive = asyncio.ensure_future(websocket.receive_json())
+            done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if receive not in done:
+                receive.cancel()
+                break
+            message = receive.result()
+            if not isinstance(message, dict) or message.get("type") != "viewport":
+                subscriber.send(encode({"type": "error", "detail": "只支援 viewport 訊息"}))
+                continue
+            try:
+                await live_hub.set_viewport(subscriber, _parse_bbox(message.get("bbox")))
+            except ValueError as exc:
+                subscriber.send(encode({"type": "error", "detail": str(exc)}))
+    except (WebSocketDisconnect, json.JSONDecodeError):
+        pass
+    finally:
+        sender.cancel()
+        live_hub.unsubscribe(subscriber)
+
+
+async def _sse_stream(subscriber: Subscriber) -> AsyncIterator[bytes]:
+    try:
+        while not (subscriber.overflowed and subscriber.queue.empty()):
+            try:
+                message = await asyncio.wait_for(subscriber.queue.get(), LIVE_SSE_KEEPALIVE_S)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            yield f"data: {message}\n\n".encode("utf-8")
+    finally:
+        live_hub.unsubscribe(subscriber)
+
+
+@router.get("/shadow-live")
+async def shadow_live_sse(
+    bbox: str = Query(..., description="視窗範圍 west,south,east,north（WGS84）；換視窗請重新連線"),
+) -> StreamingResponse:
+    try:
+        viewport = _parse_bbox(bbox)
+        live_hub.viewport_tiles(viewport)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    subscriber = live_hub.subscribe()
+    try:
+        subscriber.send(await live_hub.hello())
+        await live_hub.set_viewport(subscriber, viewport)
+    except BaseException:
+        live_hub.unsubscribe(subscriber)
+        raise
+    return StreamingResponse(
+        _sse_stream(subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -3,9 +3,9 @@
 from __future__ import annotations
 
 from datetime import datetime
-from typing import Optional
+from typing import List, Literal, Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 
 
 class ShadowRouteRequest(BaseModel):
@@ -17,8 +17,17 @@ class ShadowRouteRequest(BaseModel):
     timezone: str = Field("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區")
     max_alternatives: int = Field(3, ge=1, le=10, description="最多候選路線數")
     building_search_radius: float = Field(250.0, gt=0, description="建物搜尋半徑 (公尺)")
+    max_shadow_length_m: float = Field(
+        1000.0, gt=0, description="單棟建物陰影長度上限 (公尺)；只沿太陽方向搜尋陰影可及的建物"
+    )
     route_buffer_m: float = Field(3.0, gt=0, description="路徑緩衝半徑 (公尺)")
     snap_tolerance: float = Field(0.05, ge=0, description="ST_SnapToGrid 公尺值")
+    scoring_mode: Literal["clip", "dissolve"] = Field(
+        "clip", description="clip：先裁切到路徑緩衝區再融合；dissolve：融合搜尋半徑內所有陰影"
+    )
+    ranking: Literal["exact", "two_phase"] = Field(
+        "exact", description="exact：每條候選都精確評分；two_phase：先取樣估計上下界，只精確評分可能勝出的路線"
+    )
     solar_latitude: Optional[float] = Field(None, description="計算太陽向量時使用的緯度，不填則採起點")
     solar_longitude: Optional[float] = Field(None, description="計算太陽向量時使用的經度，不填則採起點")
     solar_altitude_m: float = Field(20.0, description="太陽計算高度 (m)")
@@ -29,6 +38,9 @@ class ShadowAreaRequest(BaseModel):
     center_lat: float = Field(..., ge=-90, le=90, description="查詢中心緯度")
     center_lng: float = Field(..., ge=-180, le=180, description="查詢中心經度")
     search_radius_m: float = Field(50.0, gt=0, description="建物搜尋半徑 (公尺)")
+    max_shadow_length_m: float = Field(
+        250.0, gt=0, description="單棟建物陰影長度上限 (公尺)；範圍外只納入太陽方向上陰影可及的建物"
+    )
     timestamp: datetime = Field(..., description="ISO 8601 時間，可含時區")
     timezone: str = Field("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區")
     solar_latitude: Optional[float] = Field(None, description="計算太陽向量時使用的緯度，不填則採 center_lat")
@@ -36,3 +48,47 @@ class ShadowAreaRequest(BaseModel):
     solar_altitude_m: float = Field(20.0, description="太陽計算高度 (m)")
     solar_pressure: Optional[float] = Field(101325.0, description="地表壓力 (Pa)")
     solar_temperature: Optional[float] = Field(25.0, description="環境溫度 (°C)")
+
+
+class CoverageRouteInput(BaseModel):
+    route_id: Optional[str] = Field(None, description="路線識別碼，不填則依順序命名為 route_1、route_2…")
+    encoded_polyline: str = Field(..., min_length=2, description="Google Encoded Polyline")
+
+
+class ShadowCoverageBatchRequest(BaseModel):
+    routes: List[CoverageRouteInput] = Field(..., min_length=1, max_length=500, description="要評分的路線")
+    timestamp: datetime = Field(..., description="ISO 8601 時間，可含時區")
+    timezone: str = Field("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區")
+    building_search_radius: float = Field(250.0, gt=0, description="建物搜尋半徑 (公尺)")
+    max_shadow_length_m: float = Field(
+        1000.0, gt=0, description="單棟建物陰影長度上限 (公尺)；只沿太陽方向搜尋陰影可及的建物"
+    )
+    route_buffer_m: float = Field(1.0, gt=0, description="走廊緩衝半徑 (公尺)，陰影先裁切到此範圍再融合")
+    chunk_size: int = Field(25, ge=1, le=100, description="每次資料庫查詢評分的路線數，結果依批次串流回傳")
+    solar_latitude: Optional[float] = Field(None, description="計算太陽向量時使用的緯度，不填則採第一條路線起點")
+    solar_longitude: Optional[float] = Field(None, description="計算太陽向量時使用的經度，不填則採第一條路線起點")
+    solar_altitude_m: float = Field(20.0, description="太陽計算高度 (m)")
+    solar_pressure: Optional[float] = Field(101325.0, description="地表壓力 (Pa)")
+    solar_temperature: Optional[float] = Field(25.0, description="環境溫度 (°C)")
+
+
+class PointShadeInput(BaseModel):
+    id: Optional[str] = Field(None, description="點的識別碼，不填則以索引編號")
+    lat: float = Field(..., ge=-90, le=90, description="緯度")
+    lng: float = Field(..., ge=-180, le=180, description="經度")
+
+
+class PointShadeRequest(BaseModel):
+    points: Optional[List[PointShadeInput]] = Field(None, max_length=10000, description="要查詢的點")
+    poi_set: Optional[str] = Field(None, description="伺服器端具名 POI 集合（POI_DATA_DIR 下的 GeoJSON 檔名）")
+    timestamp: datetime = Field(..., description="ISO 8601 時間，可含時區")
+    timezone: str = Field("Asia/Taipei", description="當輸入為 naive datetime 時套用的時區")
+    horizon_minutes: int = Field(120, ge=0, le=720, description="往後檢查狀態改變的時間範圍 (分鐘)")
+    step_minutes: int = Field(5, ge=1, le=60, description="檢查間隔 (分鐘)，也是 minutes_until_change 的精度")
+    max_shadow_length_m: float = Field(250.0, gt=0, description="單棟建物陰影長度上限 (公尺)")
+
+    @model_validator(mode="after")
+    def _one_source(self) -> "PointShadeRequest":
+        if (self.points is None) == (self.poi_set is None):
+            raise ValueError("points 與 poi_set 需擇一提供")
+        return self
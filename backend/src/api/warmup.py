@@ -0,0 +1,158 @@
+"""Background warmup and the readiness state behind ``/ready``.
+
+``/ready`` answers 503 until pandas/pvlib, the SQL cache and every pooled
+read connection are warm; failed attempts retry every ``WARMUP_RETRY_S``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+
+from api.admission import db_pool
+from db.database import configured_pool_size, primary_endpoint, read_endpoints
+from db.sql import load_query, preload_queries
+
+logger = logging.getLogger("uvicorn.error")
+
+# 暖機查詢使用的固定位置與太陽角度：半徑很小，只為了讓每條連線都跑過一次查詢
+WARMUP_LAT = 25.0217746
+WARMUP_LNG = 121.5351267
+WARMUP_AZIMUTH_DEG = 180.0
+WARMUP_ELEVATION_DEG = 45.0
+WARMUP_ROUTE_WKT = f"LINESTRING ({WARMUP_LNG} {WARMUP_LAT}, {WARMUP_LNG + 0.0002} {WARMUP_LAT + 0.0002})"
+
+
+@dataclass
+class WarmupState:
+    status: str = "pending"
+    attempts: int = 0
+    error: Optional[str] = None
+    steps_ms: Dict[str, float] = field(default_factory=dict)
+    started_at: Optional[float] = None
+    ready_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    def snapshot(self) -> Dict[str, Any]:
+        warmup_s = None
+        if self.started_at is not None and self.ready_at is not None:
+            warmup_s = round(self.ready_at - self.started_at, 3)
+        return {
+            "status": self.status,
+            "attempts": self.attempts,
+            "error": self.error,
+            "steps_ms": self.steps_ms,
+            "warmup_s": warmup_s,
+        }
+
+
+warmup_state = WarmupState()
+
+
+def _warm_solar() -> None:
+    import pandas as pd
+
+    from utils import solar_position
+
+    solar_position.compute_solar_position(
+        timestamp=pd.Timestamp("2024-11-05T09:00:00", tz="Asia/Taipei"),
+        latitude=WARMUP_LAT,
+        longitude=WARMUP_LNG,
+        altitude=20.0,
+        pressure=101325.0,
+        temperature=25.0,
+    )
+
+
+def _prime_runs() -> int:
+    # 要讓 psycopg 改用 prepared statement，同一語句需在同一連線上執行達門檻次數
+    threshold = os.getenv("PGPREPARE_THRESHOLD")
+    return min(max(int(threshold), 1), 5) if threshold else 1
+
+
+def _warm_connections(connections: int) -> None:
+    """每個讀取節點同時開 `connections` 個 session（各佔一條連線），每條都跑過 SELECT 1 與小型陰影查詢。"""
+
+    area_params = {
+        "center_lat": WARMUP_LAT,
+        "center_lng": WARMUP_LNG,
+        "search_radius": 10.0,
+        "azimuth_deg": WARMUP_AZIMUTH_DEG,
+        "elevation_deg": WARMUP_ELEVATION_DEG,
+        "snap_to_grid": 0.05,
+        "max_shadow_length": 50.0,
+    }
+    route_params = {
+        "route_wkt": WARMUP_ROUTE_WKT,
+        "azimuth_deg": WARMUP_AZIMUTH_DEG,
+        "elevation_deg": WARMUP_ELEVATION_DEG,
+        "building_search_radius": 50.0,
+        "max_shadow_length": 50.0,
+        "route_buffer": 3.0,
+        "snap_to_grid": 0.05,
+    }
+    sessions: List[Any] = []
+    try:
+        for endpoint in read_endpoints() or (primary_endpoint(),):
+            for _ in range(connections):
+                session = endpoint.session()
+                sessions.append(session)
+                session.execute(text("SELECT 1"))
+        for session in sessions:
+            for _ in range(_prime_runs()):
+                session.execute(text(load_query("building_shadow_geojson.sql")), area_params).fetchall()
+                session.execute(text(load_query("route_shadow_intersection_clipped.sql")), route_params).fetchall()
+    finally:
+        for session in sessions:
+            session.rollback()
+            session.close()
+
+
+async def _timed(name: str, func: Any, *args: Any) -> None:
+    started = time.perf_counter()
+    await db_pool.run(func, *args)
+    warmup_state.steps_ms[name] = round((time.perf_counter() - started) * 1000.0, 1)
+
+
+async def run_warmup() -> None:
+    connections = int(os.getenv("WARMUP_CONNECTIONS", str(configured_pool_size())))
+    await _timed("solar", _warm_solar)
+    await _timed("queries", preload_queries)
+    await _timed("connections", _warm_connections, connections)
+
+
+async def warmup_loop() -> None:
+    """在背景暖機直到成功；`WARMUP_ENABLED=0` 時直接視為就緒。"""
+
+    warmup_state.started_at = time.monotonic()
+    if os.getenv("WARMUP_ENABLED", "1") == "0":
+        warmup_state.status = "ready"
+        warmup_state.ready_at = warmup_state.started_at
+        return
+
+    retry_s = float(os.getenv("WARMUP_RETRY_S", "5"))
+    while True:
+        warmup_state.status = "warming"
+        warmup_state.attempts += 1
+        try:
+            await run_warmup()
+        except Exception as exc:
+            warmup_state.status = "failed"
+            warmup_state.error = str(exc)
+            logger.warning("warmup attempt %d failed: %s", warmup_state.attempts, exc)
+            await asyncio.sleep(retry_s)
+            continue
+        warmup_state.status = "ready"
+        warmup_state.error = None
+        warmup_state.ready_at = time.monotonic()
+        logger.info("warmup finished in %.2fs", warmup_state.ready_at - warmup_state.started_at)
+        return
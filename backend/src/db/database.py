@@ -1,12 +1,24 @@
-"""SQLAlchemy engine/session helpers for Vampire Map API."""
+"""SQLAlchemy engine/session helpers for Vampire Map API.
+
+Writes and migrations always go to the primary configured by ``PG*``.
+Read-only shadow/scoring queries use :func:`get_read_session`, which spreads
+sessions over the endpoints in ``PGREAD_HOSTS`` (``host[:port]`` list, same
+database and credentials as the primary): the healthy endpoint with the
+fewest open sessions relative to its pool size wins. An endpoint whose
+connection fails is skipped for ``PGREAD_COOLDOWN_S`` seconds; when every
+read endpoint is cooling down, reads fall back to the primary.
+"""
 
 from __future__ import annotations
 
+import itertools
 import os
+import threading
+import time
 from functools import lru_cache
-from typing import Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session, sessionmaker
 
@@ -30,11 +42,27 @@ def _default_db_settings() -> Tuple[str, int, str, str, str]:
     return host, port, database, user, password
 
 
+def configured_pool_size() -> int:
+    return int(os.getenv("PGPOOL_SIZE", "5"))
+
+
+def _engine_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "pool_size": configured_pool_size(),
+        "max_overflow": int(os.getenv("PGPOOL_MAX_OVERFLOW", "10")),
+    }
+    threshold = os.getenv("PGPREPARE_THRESHOLD")
+    if threshold:
+        # psycopg 在同一連線執行同一語句達此次數後改用伺服器端 prepared statement（0 表示第一次就 prepare）
+        options["connect_args"] = {"prepare_threshold": int(threshold)}
+    return options
+
+
 @lru_cache(maxsize=8)
 def _get_engine_cached(settings: Tuple[str, int, str, str, str]) -> Engine:
     host, port, database, user, password = settings
     url = _build_connection_url(host, port, database, user, password)
-    return create_engine(url, pool_pre_ping=True, future=True)
+    return create_engine(url, pool_pre_ping=True, future=True, **_engine_options())
 
 
 def get_engine(
@@ -66,8 +94,10 @@ def get_session(
     user: Optional[str] = None,
     password: Optional[str] = None,
 ) -> Session:
-    """Create a new SQLAlchemy Session for the given settings."""
+    """Create a new SQLAlchemy Session for the given settings (defaults to the primary)."""
 
+    if not any((host, port, database, user, password)):
+        return primary_endpoint().session()
     engine = get_engine(
         host=host,
         port=port,
@@ -77,3 +107,169 @@ def get_session(
     )
     session_factory = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
     return session_factory()
+
+
+class _TrackedSession(Session):
+    """Session that tells its endpoint when it is closed (for least-busy routing)."""
+
+    _endpoint: Optional["DatabaseEndpoint"] = None
+
+    def close(self) -> None:
+        try:
+            super().close()
+        finally:
+            endpoint, self._endpoint = self._endpoint, None
+            if endpoint is not None:
+                endpoint._release()
+
+
+class DatabaseEndpoint:
+    """One database server (primary or read replica) with its own engine and pool."""
+
+    def __init__(self, name: str, role: str, host: str, port: int) -> None:
+        self.name = name
+        self.role = role
+        self.host = host
+        self.port = port
+        self.cooldown_until = 0.0
+        self.active_sessions = 0
+        self.sessions_total = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+        self._engine: Optional[Engine] = None
+        self._session_factory: Optional[sessionmaker] = None
+
+    @property
+    def engine(self) -> Engine:
+        with self._lock:
+            if self._engine is None:
+                engine = get_engine(host=self.host, port=self.port)
+                event.listen(engine, "handle_error", self._on_error)
+                self._engine = engine
+                self._session_factory = sessionmaker(
+                    bind=engine,
+                    class_=_TrackedSession,
+                    autoflush=False,
+                    autocommit=False,
+                    future=True,
+                )
+            return self._engine
+
+    @property
+    def healthy(self) -> bool:
+        return time.monotonic() >= self.cooldown_until
+
+    def load(self) -> float:
+        """Open sessions relative to pool size; lower is less busy."""
+
+        return self.active_sessions / max(configured_pool_size(), 1)
+
+    def session(self) -> Session:
+        engine = self.engine
+        assert self._session_factory is not None, engine
+        session = self._session_factory()
+        session._endpoint = self
+        with self._lock:
+            self.active_sessions += 1
+            self.sessions_total += 1
+        return session
+
+    def _release(self) -> None:
+        with self._lock:
+            self.active_sessions -= 1
+
+    def _on_error(self, context: Any) -> None:
+        # 只有連不上或連線中斷才視為節點異常；查詢本身的錯誤（含 statement_timeout）不算
+        if context.connection is None or context.is_disconnect:
+            self.mark_failed(str(context.original_exception))
+
+    def mark_failed(self, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self.cooldown_until = time.monotonic() + float(os.getenv("PGREAD_COOLDOWN_S", "30"))
+
+    def stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {
+            "name": self.name,
+            "role": self.role,
+            "healthy": self.healthy,
+            "active_sessions": self.active_sessions,
+            "sessions_total": self.sessions_total,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+        if self._engine is not None:
+            pool = self._engine.pool
+            stats["pool"] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+            }
+        return stats
+
+
+def _parse_host(value: str, default_port: int) -> Tuple[str, int]:
+    host, sep, port = value.strip().rpartition(":")
+    if not sep:
+        return value.strip(), default_port
+    return host, int(port)
+
+
+@lru_cache(maxsize=1)
+def primary_endpoint() -> DatabaseEndpoint:
+    host, port, _, _, _ = _default_db_settings()
+    return DatabaseEndpoint(f"{host}:{port}", "primary", host, port)
+
+
+@lru_cache(maxsize=1)
+def read_endpoints() -> Tuple[DatabaseEndpoint, ...]:
+    """Read endpoints from ``PGREAD_HOSTS``; empty means reads use the primary."""
+
+    _, default_port, _, _, _ = _default_db_settings()
+    endpoints: List[DatabaseEndpoint] = []
+    for item in os.getenv("PGREAD_HOSTS", "").split(","):
+        if not item.strip():
+            continue
+        host, port = _parse_host(item, default_port)
+        if (host, port) == (primary_endpoint().host, primary_endpoint().port):
+            endpoints.append(primary_endpoint())
+        else:
+            endpoints.append(DatabaseEndpoint(f"{host}:{port}", "replica", host, port))
+    return tuple(endpoints)
+
+
+_round_robin = itertools.count()
+
+
+def choose_read_endpoint() -> DatabaseEndpoint:
+    candidates = [endpoint for endpoint in read_endpoints() if endpoint.healthy]
+    if not candidates:
+        return primary_endpoint()
+    # 負載相同時輪流挑選，避免全部落在清單第一個
+    offset = next(_round_robin)
+    ordered = candidates[offset % len(candidates) :] + candidates[: offset % len(candidates)]
+    return min(ordered, key=lambda endpoint: endpoint.load())
+
+
+def get_read_session() -> Session:
+    """Session for read-only queries, routed to the least busy healthy read endpoint."""
+
+    return choose_read_endpoint().session()
+
+
+def pool_statistics() -> List[Dict[str, Any]]:
+    endpoints = [primary_endpoint()]
+    endpoints += [endpoint for endpoint in read_endpoints() if endpoint is not primary_endpoint()]
+    return [endpoint.stats() for endpoint in endpoints]
+
+
+def dispose_engines() -> None:
+    """Drop inherited pool connections after fork without closing the parent's sockets."""
+
+    get_engine().dispose(close=False)
+    for endpoint in (primary_endpoint(), *read_endpoints()):
+        if endpoint._engine is not None:
+            endpoint._engine.dispose(close=False)
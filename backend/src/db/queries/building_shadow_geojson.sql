@@ -1,40 +1,27 @@
-WITH params AS (
-  SELECT radians(:azimuth_deg) AS azimuth,
-         radians(:elevation_deg) AS elevation
-),
-origin AS (
+-- 查詢圓（origin 外擴 search_radius）內，以及陰影可能落進查詢圓的建物陰影。陰影函式見 202610201000 遷移。
+WITH origin AS (
   SELECT ST_Transform(ST_SetSRID(ST_MakePoint(:center_lng, :center_lat), 4326), 3826) AS geom
 ),
+sweep AS (
+  -- origin 往太陽方向、長度為陰影可及距離的光線；外擴 search_radius 即為查詢圓掃過的範圍
+  SELECT upsun_sweep(
+           o.geom,
+           :azimuth_deg,
+           shadow_reach(o.geom, :azimuth_deg, :elevation_deg, :max_shadow_length, :search_radius)
+         ) AS geom
+  FROM origin o
+),
 target_buildings AS (
-  SELECT b.*
+  SELECT b.build_id, b.geom_3826, b.height_m
   FROM buildings b
-  JOIN origin o ON ST_DWithin(b.geom_3826, o.geom, :search_radius)
-  WHERE b.height_m IS NOT NULL AND b.height_m > 0
-),
-shadow_vectors AS (
-  SELECT
-    b.build_id,
-    b.geom_3826,
-    (b.height_m / NULLIF(tan(p.elevation), 0))::double precision AS shadow_len,
-    p.azimuth
-  FROM target_buildings b
-  CROSS JOIN params p
+  JOIN sweep s ON ST_DWithin(b.geom_3826, s.geom, :search_radius)
+  WHERE b.height_m > 0
 ),
 shadows_3826 AS (
   SELECT
-    sv.build_id,
-    ST_ConvexHull(
-      ST_Collect(
-        sv.geom_3826,
-        ST_Translate(
-          sv.geom_3826,
-          sv.shadow_len * (-sin(sv.azimuth)),
-          sv.shadow_len * (-cos(sv.azimuth))
-        )
-      )
-    )::geometry(Polygon, 3826) AS geom_3826
-  FROM shadow_vectors sv
-  GROUP BY sv.build_id, sv.geom_3826, sv.shadow_len, sv.azimuth
+    building_shadow(b.geom_3826, b.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length)::geometry(Polygon, 3826)
+      AS geom_3826
+  FROM target_buildings b
 ),
 dissolved AS (
   SELECT
@@ -0,0 +1,31 @@
+WITH envelope AS (
+  SELECT ST_MakeEnvelope(:min_x, :min_y, :max_x, :max_y, 3826) AS geom
+),
+search_area AS (
+  -- 範圍往太陽方向掃過陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           e.geom,
+           :azimuth_deg,
+           shadow_reach(e.geom, :azimuth_deg, :elevation_deg, :max_shadow_length)
+         ) AS geom
+  FROM envelope e
+),
+target_buildings AS (
+  SELECT b.build_id, b.geom_3826, b.height_m
+  FROM buildings b
+  JOIN search_area sa
+    ON b.geom_3826 && sa.geom
+   AND ST_Intersects(ST_ConvexHull(b.geom_3826), sa.geom)
+  WHERE b.height_m > 0
+),
+shadows_3826 AS (
+  SELECT
+    b.build_id,
+    building_shadow(b.geom_3826, b.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length) AS geom_3826
+  FROM target_buildings b
+)
+SELECT
+  s.build_id,
+  ST_AsGeoJSON(s.geom_3826, 2) AS shadow_geojson
+FROM shadows_3826 s
+JOIN envelope e ON ST_Intersects(s.geom_3826, e.geom);
@@ -0,0 +1,6 @@
+-- 建物資料版本：重新匯入（buildings_transform.sql 會重建資料表）後筆數或 ingested_at 必定改變。
+-- 作為 GET 陰影端點 ETag 的一部分，由 api/http_cache.py 快取，不會每個請求都掃表。
+SELECT
+  COUNT(*) AS building_count,
+  MAX(ingested_at) AS ingested_at
+FROM buildings;
@@ -0,0 +1,63 @@
+-- 單一 XYZ 圖磚內融合後的陰影，以及與上一個 sun bucket 陰影（:previous_wkb，EPSG:3826 WKB）的差異。
+-- 回傳新陰影的 WKB（下一輪的 previous）與 GeoJSON，以及 added / removed 兩塊差異（皆為 EPSG:4326）。
+WITH envelope AS (
+  SELECT ST_Transform(ST_TileEnvelope(:z, :x, :y), 3826) AS geom
+),
+search_area AS (
+  -- 範圍往太陽方向掃過陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           e.geom,
+           :azimuth_deg,
+           shadow_reach(e.geom, :azimuth_deg, :elevation_deg, :max_shadow_length)
+         ) AS geom
+  FROM envelope e
+),
+target_buildings AS (
+  SELECT b.build_id, b.geom_3826, b.height_m
+  FROM buildings b
+  JOIN search_area sa
+    ON b.geom_3826 && sa.geom
+   AND ST_Intersects(ST_ConvexHull(b.geom_3826), sa.geom)
+  WHERE b.height_m > 0
+),
+shadows_3826 AS (
+  SELECT
+    building_shadow(b.geom_3826, b.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length) AS geom_3826
+  FROM target_buildings b
+),
+clipped AS (
+  SELECT ST_UnaryUnion(
+           ST_Collect(
+             ST_CollectionExtract(ST_Intersection(ST_SnapToGrid(s.geom_3826, :snap_to_grid), e.geom), 3)
+           )
+         ) AS geom_3826
+  FROM shadows_3826 s
+  JOIN envelope e
+    ON s.geom_3826 && e.geom
+   AND ST_Intersects(s.geom_3826, e.geom)
+),
+shapes AS (
+  SELECT
+    COALESCE(c.geom_3826, ST_GeomFromText('POLYGON EMPTY', 3826)) AS current_geom,
+    COALESCE(
+      ST_GeomFromWKB(CAST(:previous_wkb AS bytea), 3826),
+      ST_GeomFromText('POLYGON EMPTY', 3826)
+    ) AS previous_geom
+  FROM clipped c
+),
+diffs AS (
+  SELECT
+    s.current_geom,
+    ST_CollectionExtract(ST_Difference(s.current_geom, s.previous_geom), 3) AS added_geom,
+    ST_CollectionExtract(ST_Difference(s.previous_geom, s.current_geom), 3) AS removed_geom
+  FROM shapes s
+)
+SELECT
+  CASE WHEN ST_IsEmpty(d.current_geom) THEN NULL ELSE ST_AsBinary(d.current_geom) END AS shadow_wkb,
+  CASE WHEN ST_IsEmpty(d.current_geom) THEN NULL
+       ELSE ST_AsGeoJSON(ST_Transform(d.current_geom, 4326), :precision) END AS shadow,
+  CASE WHEN ST_IsEmpty(d.added_geom) THEN NULL
+       ELSE ST_AsGeoJSON(ST_Transform(d.added_geom, 4326), :precision) END AS added,
+  CASE WHEN ST_IsEmpty(d.removed_geom) THEN NULL
+       ELSE ST_AsGeoJSON(ST_Transform(d.removed_geom, 4326), :precision) END AS removed
+FROM diffs d;
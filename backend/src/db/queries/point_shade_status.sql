@@ -0,0 +1,37 @@
+-- 一次判斷多個點在多個時間步是否位於建物陰影中，只回傳「在陰影中」的 (idx, step)。
+-- 點 p 被建物 B 遮住 ⇔ p 落在 building_shadow(B) 內（陰影函式見 202610201000 遷移）；
+-- 能遮住 p 的建物必定碰到 p 往太陽方向、長度為陰影上限的光線，先以 && 走 GiST 索引篩選。
+WITH pts AS (
+  SELECT p.idx, ST_Transform(ST_SetSRID(ST_MakePoint(p.lng, p.lat), 4326), 3826) AS geom
+  FROM unnest(CAST(:idxs AS int[]), CAST(:lats AS double precision[]), CAST(:lngs AS double precision[]))
+    AS p(idx, lat, lng)
+),
+steps AS (
+  SELECT s.step, s.azimuth_deg, s.elevation_deg
+  FROM unnest(CAST(:steps AS int[]), CAST(:azimuths AS double precision[]), CAST(:elevations AS double precision[]))
+    AS s(step, azimuth_deg, elevation_deg)
+  WHERE s.elevation_deg > 0
+),
+rays AS (
+  SELECT
+    p.idx,
+    s.step,
+    p.geom,
+    s.azimuth_deg,
+    s.elevation_deg,
+    upsun_sweep(p.geom, s.azimuth_deg, :max_shadow_length) AS ray
+  FROM pts p
+  CROSS JOIN steps s
+)
+SELECT r.idx, r.step
+FROM rays r
+WHERE EXISTS (
+  SELECT 1
+  FROM buildings b
+  WHERE b.geom_3826 && r.ray
+    AND b.height_m > 0
+    AND ST_Intersects(
+          building_shadow(b.geom_3826, b.height_m, r.azimuth_deg, r.elevation_deg, :max_shadow_length),
+          r.geom
+        )
+);
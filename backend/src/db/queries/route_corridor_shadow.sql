@@ -0,0 +1,61 @@
+-- 多條路線共用的陰影：先把所有路線合成一條走廊，只算一次走廊附近的陰影，
+-- 裁切到走廊緩衝區後融合並切成小塊（ST_Subdivide），以 WKB（EPSG:3826）回傳給逐路線的覆蓋率查詢。
+WITH corridor AS (
+  SELECT ST_UnaryUnion(ST_Collect(ST_Transform(ST_GeomFromText(w.wkt, 4326), 3826))) AS geom
+  FROM unnest(CAST(:route_wkts AS text[])) AS w(wkt)
+),
+corridor_buffer AS (
+  SELECT ST_Buffer(c.geom, :route_buffer, 'endcap=flat join=round quad_segs=4') AS geom
+  FROM corridor c
+),
+corridor_segments AS (
+  SELECT seg.geom
+  FROM corridor, ST_DumpSegments(corridor.geom) seg
+),
+sweeps AS (
+  -- 每段走廊往太陽方向掃過該段的陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           s.geom,
+           :azimuth_deg,
+           shadow_reach(s.geom, :azimuth_deg, :elevation_deg, :max_shadow_length, :route_buffer)
+         ) AS geom
+  FROM corridor_segments s
+),
+target_buildings AS (
+  -- 陰影可能落進走廊緩衝區、且在走廊 building_search_radius 內的建物
+  SELECT DISTINCT ON (b.build_id) b.build_id, b.geom_3826, b.height_m
+  FROM sweeps sw
+  CROSS JOIN corridor c
+  JOIN buildings b
+    ON b.geom_3826 && ST_Expand(sw.geom, :route_buffer)
+   AND ST_DWithin(ST_ConvexHull(b.geom_3826), sw.geom, :route_buffer)
+   AND ST_DWithin(b.geom_3826, c.geom, :building_search_radius)
+  WHERE b.height_m > 0
+),
+shadows_3826 AS (
+  SELECT
+    ST_SnapToGrid(
+      building_shadow(b.geom_3826, b.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length),
+      :snap_to_grid
+    ) AS geom_3826
+  FROM target_buildings b
+),
+clipped AS (
+  SELECT ST_CollectionExtract(ST_Intersection(s.geom_3826, cb.geom), 3) AS geom_3826
+  FROM shadows_3826 s
+  JOIN corridor_buffer cb ON s.geom_3826 && cb.geom AND ST_Intersects(s.geom_3826, cb.geom)
+),
+dissolved AS (
+  SELECT ST_UnaryUnion(ST_Collect(geom_3826)) AS geom_3826
+  FROM clipped
+),
+pieces AS (
+  SELECT ST_Subdivide(d.geom_3826, :max_vertices) AS geom_3826
+  FROM dissolved d
+  WHERE d.geom_3826 IS NOT NULL AND NOT ST_IsEmpty(d.geom_3826)
+)
+SELECT
+  ST_AsBinary(ST_Collect(p.geom_3826)) AS shadow_wkb,
+  COUNT(p.geom_3826)::int AS piece_count,
+  (SELECT COUNT(*) FROM target_buildings)::int AS building_count
+FROM pieces p;
@@ -0,0 +1,20 @@
+-- 以走廊陰影（route_corridor_shadow.sql 的 WKB 碎片）計算一批路線的陰影長度。
+-- 碎片之間共用切割邊界，沿邊界走的路段會同時落在兩塊裡；先把每條路線與各碎片的交集
+-- ST_UnaryUnion 成一組線再量長度，重疊的路段只算一次。
+WITH pieces AS (
+  SELECT dump.geom AS geom_3826
+  FROM ST_Dump(ST_GeomFromWKB(:shadow_wkb, 3826)) AS dump
+),
+routes AS (
+  SELECT r.route_id, ST_Transform(ST_GeomFromText(r.wkt, 4326), 3826) AS geom
+  FROM unnest(CAST(:route_ids AS text[]), CAST(:route_wkts AS text[])) AS r(route_id, wkt)
+)
+SELECT
+  r.route_id,
+  ST_Length(r.geom) AS total_length_m,
+  COALESCE(ST_Length(ST_UnaryUnion(ST_Collect(ST_Intersection(r.geom, p.geom_3826)))), 0) AS shaded_length_m
+FROM routes r
+LEFT JOIN pieces p
+  ON r.geom && p.geom_3826
+ AND ST_Intersects(r.geom, p.geom_3826)
+GROUP BY r.route_id, r.geom;
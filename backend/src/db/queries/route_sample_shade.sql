@@ -0,0 +1,94 @@
+-- 兩階段排序的取樣查詢：每個取樣點回傳是否在陰影中，以及半徑 radius 內的狀態是否確定。
+-- 陰影模型與 route_shadow_intersection*.sql 相同：building_shadow()（見 202610201000 遷移）。
+--   covered：點落在某個凸包內，且離該凸包邊界至少 radius（整個圓都在陰影中）
+--   near   ：有凸包距離點不到 radius（圓內可能有陰影）
+-- 凸包 = conv(B) + 陰影向量，能在 radius 內碰到點的建物，其凸包必定在往太陽方向、
+-- 長度為陰影可及距離的光線 radius 範圍內，先以外擴的 && 走 GiST 索引篩選。
+-- 與精確評分相同，只納入距所屬路線 building_search_radius 內的建物（:route_idxs 對應 :route_wkts 的索引）。
+WITH routes AS (
+  SELECT (r.ord - 1)::int AS route_idx, ST_Transform(ST_GeomFromText(r.wkt, 4326), 3826) AS geom
+  FROM unnest(CAST(:route_wkts AS text[])) WITH ORDINALITY AS r(wkt, ord)
+),
+pts AS (
+  SELECT
+    p.idx,
+    p.route_idx,
+    ST_SetSRID(ST_MakePoint(p.x, p.y), 3826) AS geom,
+    p.radius,
+    floor(p.x / :reach_tile)::int AS tx,
+    floor(p.y / :reach_tile)::int AS ty
+  FROM unnest(
+         CAST(:idxs AS int[]),
+         CAST(:route_idxs AS int[]),
+         CAST(:xs AS double precision[]),
+         CAST(:ys AS double precision[]),
+         CAST(:radii AS double precision[])
+       ) AS p(idx, route_idx, x, y, radius)
+),
+tiles AS (
+  -- 取樣點依 :reach_tile 公尺分格，每格以格內附近的最高建物算陰影可及距離，
+  -- 遠處的高樓不會拉長整批候選路線的光線
+  SELECT
+    p.tx,
+    p.ty,
+    shadow_reach(
+      ST_Expand(ST_SetSRID(ST_Extent(p.geom)::geometry, 3826), MAX(p.radius)),
+      :azimuth_deg,
+      :elevation_deg,
+      :max_shadow_length
+    ) AS len
+  FROM pts p
+  GROUP BY p.tx, p.ty
+),
+rays AS (
+  SELECT p.idx, p.route_idx, p.radius, upsun_sweep(p.geom, :azimuth_deg, t.len) AS ray
+  FROM pts p
+  JOIN tiles t ON t.tx = p.tx AND t.ty = p.ty
+),
+candidates AS (
+  -- 走 GiST 索引找出每條光線附近的建物；這裡只配對，不建凸包
+  SELECT ry.idx, ry.route_idx, b.build_id, b.geom_3826, b.height_m
+  FROM rays ry
+  JOIN buildings b ON b.geom_3826 && ST_Expand(ry.ray, ry.radius)
+  WHERE b.height_m > 0
+),
+hulls AS (
+  -- 每棟建物只算一次凸包（所有光線篩到的建物聯集），不再每個取樣點各算一次
+  SELECT
+    c.build_id,
+    building_shadow(c.geom_3826, c.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length) AS hull
+  FROM (
+    SELECT DISTINCT ON (c.build_id) c.build_id, c.geom_3826, c.height_m
+    FROM candidates c
+  ) c
+),
+route_hulls AS (
+  -- 每棟建物對每條路線只判斷一次 building_search_radius
+  SELECT pairs.build_id, pairs.route_idx
+  FROM (
+    SELECT DISTINCT ON (c.build_id, c.route_idx) c.build_id, c.route_idx, c.geom_3826
+    FROM candidates c
+  ) pairs
+  JOIN routes rt ON rt.route_idx = pairs.route_idx
+  WHERE ST_DWithin(pairs.geom_3826, rt.geom, :building_search_radius)
+),
+hits AS (
+  SELECT c.idx, h.hull
+  FROM candidates c
+  JOIN route_hulls rh ON rh.build_id = c.build_id AND rh.route_idx = c.route_idx
+  JOIN hulls h ON h.build_id = c.build_id
+)
+SELECT
+  p.idx,
+  COALESCE(bool_or(ST_Intersects(h.hull, p.geom)), false) AS shaded,
+  COALESCE(bool_or(h.hull IS NOT NULL), false) AS near,
+  COALESCE(
+    bool_or(ST_Intersects(h.hull, p.geom) AND ST_Distance(ST_ExteriorRing(h.hull), p.geom) >= p.radius),
+    false
+  ) AS covered
+FROM pts p
+LEFT JOIN hits h
+  ON h.idx = p.idx
+ AND h.hull && ST_Expand(p.geom, p.radius)
+ AND ST_DWithin(h.hull, p.geom, p.radius)
+GROUP BY p.idx;
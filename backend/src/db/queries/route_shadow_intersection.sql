@@ -1,40 +1,35 @@
 WITH route AS (
   SELECT ST_Transform(ST_GeomFromText(%(route_wkt)s, 4326), 3826) AS geom
 ),
-params AS (
-  SELECT radians(%(azimuth_deg)s) AS azimuth,
-         radians(%(elevation_deg)s) AS elevation
+route_segments AS (
+  SELECT seg.geom
+  FROM route, ST_DumpSegments(route.geom) seg
 ),
-target_buildings AS (
-  SELECT b.*
-  FROM buildings b
-  JOIN route r ON ST_DWithin(b.geom_3826, r.geom, %(building_search_radius)s)
-  WHERE b.height_m IS NOT NULL AND b.height_m > 0
+sweeps AS (
+  -- 每段路徑往太陽方向掃過該段的陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           s.geom,
+           %(azimuth_deg)s,
+           shadow_reach(s.geom, %(azimuth_deg)s, %(elevation_deg)s, %(max_shadow_length)s, %(route_buffer)s)
+         ) AS geom
+  FROM route_segments s
 ),
-shadow_vectors AS (
-  SELECT
-    b.build_id,
-    b.geom_3826,
-    (b.height_m / tan(p.elevation))::double precision AS shadow_len,
-    p.azimuth
-  FROM target_buildings b
-  CROSS JOIN params p
+target_buildings AS (
+  -- 陰影可能落進緩衝區、且在路線 building_search_radius 內的建物
+  SELECT DISTINCT ON (b.build_id) b.build_id, b.geom_3826, b.height_m
+  FROM sweeps sw
+  CROSS JOIN route r
+  JOIN buildings b
+    ON b.geom_3826 && ST_Expand(sw.geom, %(route_buffer)s)
+   AND ST_DWithin(ST_ConvexHull(b.geom_3826), sw.geom, %(route_buffer)s)
+   AND ST_DWithin(b.geom_3826, r.geom, %(building_search_radius)s)
+  WHERE b.height_m > 0
 ),
 shadows_3826 AS (
   SELECT
-    sv.build_id,
-    ST_ConvexHull(
-      ST_Collect(
-        sv.geom_3826,
-        ST_Translate(
-          sv.geom_3826,
-          sv.shadow_len * (-sin(sv.azimuth)),
-          sv.shadow_len * (-cos(sv.azimuth))
-        )
-      )
-    )::geometry(Polygon, 3826) AS geom_3826
-  FROM shadow_vectors sv
-  GROUP BY sv.build_id, sv.geom_3826, sv.shadow_len, sv.azimuth
+    building_shadow(b.geom_3826, b.height_m, %(azimuth_deg)s, %(elevation_deg)s, %(max_shadow_length)s)::geometry(Polygon, 3826)
+      AS geom_3826
+  FROM target_buildings b
 ),
 dissolved AS (
   SELECT
@@ -0,0 +1,57 @@
+-- 與 route_shadow_intersection.sql 結果相同，但先把每棟建物的陰影裁切到路徑緩衝區，
+-- 只對落在緩衝區內的小碎片做 ST_UnaryUnion，不再融合整個搜尋半徑內的陰影。
+WITH route AS (
+  SELECT ST_Transform(ST_GeomFromText(%(route_wkt)s, 4326), 3826) AS geom
+),
+route_segments AS (
+  SELECT seg.geom
+  FROM route, ST_DumpSegments(route.geom) seg
+),
+sweeps AS (
+  -- 每段路徑往太陽方向掃過該段的陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           s.geom,
+           %(azimuth_deg)s,
+           shadow_reach(s.geom, %(azimuth_deg)s, %(elevation_deg)s, %(max_shadow_length)s, %(route_buffer)s)
+         ) AS geom
+  FROM route_segments s
+),
+target_buildings AS (
+  -- 陰影可能落進緩衝區、且在路線 building_search_radius 內的建物
+  SELECT DISTINCT ON (b.build_id) b.build_id, b.geom_3826, b.height_m
+  FROM sweeps sw
+  CROSS JOIN route r
+  JOIN buildings b
+    ON b.geom_3826 && ST_Expand(sw.geom, %(route_buffer)s)
+   AND ST_DWithin(ST_ConvexHull(b.geom_3826), sw.geom, %(route_buffer)s)
+   AND ST_DWithin(b.geom_3826, r.geom, %(building_search_radius)s)
+  WHERE b.height_m > 0
+),
+route_buffer AS (
+  SELECT ST_Buffer(route.geom, %(route_buffer)s, 'endcap=flat join=round quad_segs=4') AS geom
+  FROM route
+),
+shadows_3826 AS (
+  SELECT
+    ST_SnapToGrid(
+      building_shadow(b.geom_3826, b.height_m, %(azimuth_deg)s, %(elevation_deg)s, %(max_shadow_length)s),
+      %(snap_to_grid)s
+    ) AS geom_3826
+  FROM target_buildings b
+),
+clipped AS (
+  -- 先以 bbox（&&）排除碰不到緩衝區的陰影，再做精確裁切
+  SELECT ST_CollectionExtract(ST_Intersection(s.geom_3826, rb.geom), 3) AS geom_3826
+  FROM shadows_3826 s
+  JOIN route_buffer rb ON s.geom_3826 && rb.geom AND ST_Intersects(s.geom_3826, rb.geom)
+),
+dissolved AS (
+  SELECT ST_UnaryUnion(ST_Collect(geom_3826)) AS geom_3826
+  FROM clipped
+)
+SELECT
+  COALESCE(ST_Area(d.geom_3826), 0) AS intersection_area_m2,
+  COALESCE(ST_Length(ST_Intersection(route.geom, d.geom_3826)), 0) AS intersection_length_m,
+  (SELECT COUNT(*) FROM shadows_3826)::int AS polygon_count,
+  (SELECT COUNT(*) FROM target_buildings) AS building_count
+FROM route, dissolved d;
@@ -0,0 +1,52 @@
+-- 單一 XYZ 圖磚（EPSG:3857）的建物陰影向量圖磚，圖層名稱 shadow
+WITH tile AS (
+  SELECT ST_TileEnvelope(:z, :x, :y) AS geom
+),
+envelope AS (
+  -- 圖磚範圍轉到 EPSG:3826，並依 MVT buffer 往外擴，避免圖磚邊界出現接縫
+  SELECT ST_Expand(e.geom, (ST_XMax(e.geom) - ST_XMin(e.geom)) * :buffer / :extent) AS geom
+  FROM (SELECT ST_Transform(t.geom, 3826) AS geom FROM tile t) e
+),
+search_area AS (
+  -- 範圍往太陽方向掃過陰影可及距離；陰影函式見 202610201000 遷移
+  SELECT upsun_sweep(
+           e.geom,
+           :azimuth_deg,
+           shadow_reach(e.geom, :azimuth_deg, :elevation_deg, :max_shadow_length)
+         ) AS geom
+  FROM envelope e
+),
+target_buildings AS (
+  SELECT b.build_id, b.geom_3826, b.height_m
+  FROM buildings b
+  JOIN search_area sa
+    ON b.geom_3826 && sa.geom
+   AND ST_Intersects(ST_ConvexHull(b.geom_3826), sa.geom)
+  WHERE b.height_m > 0
+),
+shadows_3826 AS (
+  SELECT
+    building_shadow(b.geom_3826, b.height_m, :azimuth_deg, :elevation_deg, :max_shadow_length) AS geom_3826
+  FROM target_buildings b
+),
+clipped AS (
+  -- 先裁切到圖磚範圍再融合，只處理落在圖磚內的碎片
+  SELECT ST_UnaryUnion(
+           ST_Collect(
+             ST_CollectionExtract(ST_Intersection(ST_SnapToGrid(s.geom_3826, :snap_to_grid), e.geom), 3)
+           )
+         ) AS geom_3826
+  FROM shadows_3826 s
+  JOIN envelope e
+    ON s.geom_3826 && e.geom
+   AND ST_Intersects(s.geom_3826, e.geom)
+),
+mvt AS (
+  SELECT ST_AsMVTGeom(ST_Transform(c.geom_3826, 3857), t.geom, :extent, :buffer, true) AS geom
+  FROM clipped c
+  CROSS JOIN tile t
+  WHERE c.geom_3826 IS NOT NULL
+)
+SELECT ST_AsMVT(mvt, 'shadow', :extent, 'geom') AS tile
+FROM mvt
+WHERE mvt.geom IS NOT NULL;
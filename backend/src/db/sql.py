@@ -0,0 +1,25 @@
+"""Lazy, cached access to the SQL files in ``db/queries``."""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import List
+
+QUERY_DIR = Path(__file__).resolve().parent / "queries"
+
+
+@lru_cache(maxsize=None)
+def load_query(name: str) -> str:
+    """Read ``db/queries/<name>`` on first use, converting ``%(name)s`` placeholders to ``:name``."""
+
+    return (QUERY_DIR / name).read_text().replace("%(", ":").replace(")s", "")
+
+
+def preload_queries() -> List[str]:
+    """Load every query file into the cache (used by the API warmup)."""
+
+    names = sorted(path.name for path in QUERY_DIR.glob("*.sql"))
+    for name in names:
+        load_query(name)
+    return names
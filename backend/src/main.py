@@ -2,15 +2,45 @@
 
 from __future__ import annotations
 
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator
+
+from dotenv import load_dotenv
+
+# 其他模組在匯入時就會讀取環境變數（例如 admission 池大小），.env 必須最先載入
+load_dotenv(Path(__file__).resolve().parents[1] / ".env")
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
+from api.admission import admission_stats, shutdown_pools
+from api.live_shadow import live_hub
 from api.routes.shadow import router as shadow_router
+from api.warmup import warmup_loop, warmup_state
+from db.database import pool_statistics
+from utils.single_flight import single_flight_stats
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # 暖機在背景進行，/health 立即可用，/ready 等暖機完成才回 200
+    warmup_task = asyncio.create_task(warmup_loop())
+    try:
+        yield
+    finally:
+        warmup_task.cancel()
+        live_hub.close()
+        shutdown_pools()
+
 
 app = FastAPI(
     title="Vampire Map API",
     description="整合太陽位置計算與陰影路線評分的 API 服務",
     version="0.2.0",
+    lifespan=lifespan,
 )
 
 app.add_middleware(
@@ -27,4 +57,20 @@ async def health() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def ready() -> JSONResponse:
+    return JSONResponse(warmup_state.snapshot(), status_code=200 if warmup_state.ready else 503)
+
+
+@app.get("/metrics")
+async def metrics() -> dict[str, Any]:
+    return {
+        "single_flight": single_flight_stats(),
+        "admission": admission_stats(),
+        "warmup": warmup_state.snapshot(),
+        "database": pool_statistics(),
+        "live_shadow": live_hub.snapshot_stats(),
+    }
+
+
 app.include_router(shadow_router)
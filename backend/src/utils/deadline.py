@@ -0,0 +1,95 @@
+"""Per-request time budgets.
+
+A request gets a budget from the ``X-Request-Budget-Ms`` header, or from
+``REQUEST_BUDGET_MS`` when the header is absent. The budget is capped at
+``REQUEST_BUDGET_MAX_MS``. Blocking steps ask the :class:`Deadline` how long
+they may take: the Google Routes timeout and the PostgreSQL
+``statement_timeout`` are derived from the remaining time. A caller can
+reserve part of the remaining time for a cheaper fallback.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import text
+
+BUDGET_HEADER = "X-Request-Budget-Ms"
+# PostgreSQL 取消查詢（含 statement_timeout）的 SQLSTATE
+QUERY_CANCELED_SQLSTATE = "57014"
+# statement_timeout 最小值；0 在 PostgreSQL 代表不限時，絕不能送出
+MIN_STATEMENT_TIMEOUT_MS = 1
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when the remaining budget cannot cover the next step."""
+
+
+def default_budget_ms() -> int:
+    return int(os.getenv("REQUEST_BUDGET_MS", "15000"))
+
+
+def max_budget_ms() -> int:
+    return int(os.getenv("REQUEST_BUDGET_MAX_MS", "60000"))
+
+
+@dataclass
+class Deadline:
+    budget_ms: int
+    started_at: float = field(default_factory=time.monotonic)
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> "Deadline":
+        """解析預算標頭；缺少或無法解析時採預設值，並以上限封頂。"""
+
+        budget = default_budget_ms()
+        if value:
+            try:
+                parsed = float(value)
+            except ValueError:
+                parsed = math.nan
+            # inf、1e400 轉 int 會 OverflowError，nan 會 ValueError；都改用預設值
+            if math.isfinite(parsed):
+                budget = int(parsed)
+        return cls(budget_ms=max(1, min(budget, max_budget_ms())))
+
+    @property
+    def expires_at(self) -> float:
+        return self.started_at + self.budget_ms / 1000.0
+
+    def remaining_s(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def elapsed_ms(self) -> float:
+        return (time.monotonic() - self.started_at) * 1000.0
+
+    def timeout_s(self, *, cap_s: Optional[float] = None, reserve_s: float = 0.0, min_s: float = 0.0) -> float:
+        """扣掉保留時間後可用的秒數；不足 `min_s` 時拋出 DeadlineExceeded。"""
+
+        available = self.remaining_s() - reserve_s
+        if cap_s is not None:
+            available = min(available, cap_s)
+        if available <= 0 or available < min_s:
+            raise DeadlineExceeded(f"剩餘預算 {self.remaining_s() * 1000:.0f} ms 不足")
+        return available
+
+    def statement_timeout_ms(self, *, reserve_s: float = 0.0, min_s: float = 0.0) -> int:
+        return max(MIN_STATEMENT_TIMEOUT_MS, int(self.timeout_s(reserve_s=reserve_s, min_s=min_s) * 1000))
+
+
+def set_statement_timeout(session: Any, timeout_ms: int) -> None:
+    """只對目前交易生效（等同 SET LOCAL），連線回到連線池後不會殘留。"""
+
+    session.execute(
+        text("SELECT set_config('statement_timeout', :timeout, true)"),
+        {"timeout": f"{int(timeout_ms)}ms"},
+    )
+
+
+def is_statement_timeout(exc: BaseException) -> bool:
+    orig = getattr(exc, "orig", None)
+    return getattr(orig, "sqlstate", None) == QUERY_CANCELED_SQLSTATE
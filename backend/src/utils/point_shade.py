@@ -0,0 +1,188 @@
+"""Batch shade status for point layers (POIs).
+
+Each request checks every point at ``now`` and at fixed steps up to a
+horizon in one set-based query (``point_shade_status.sql``). The answer
+is whether the point is shaded now and how many minutes until that state
+flips. Steps with the sun below the horizon count as shaded. The change
+time is only accurate to one step.
+
+Named POI sets are GeoJSON files of Point features in ``POI_DATA_DIR``.
+The default is the frontend's map layers (``frontend/app/assets/geos``),
+so the server answers for the same toilets and water dispensers the map
+shows. A set is addressed by its file stem, e.g. ``toliet`` for
+``toliet.geojson``.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from db.database import get_read_session
+from db.sql import load_query
+
+# 與前端地圖圖層共用同一份 GeoJSON
+DEFAULT_POI_DIR = Path(__file__).resolve().parents[3] / "frontend" / "app" / "assets" / "geos"
+DEFAULT_MAX_SHADOW_LENGTH_M = 250.0
+
+
+@dataclass(frozen=True)
+class PointInput:
+    id: str
+    lat: float
+    lng: float
+
+
+@dataclass
+class SunStep:
+    """太陽在 ``minutes`` 分鐘後的位置。"""
+
+    minutes: int
+    azimuth_deg: float
+    elevation_deg: float
+
+
+def poi_dir() -> Path:
+    return Path(os.getenv("POI_DATA_DIR", str(DEFAULT_POI_DIR)))
+
+
+def available_poi_sets() -> List[str]:
+    return sorted(path.stem for path in poi_dir().glob("*.geojson"))
+
+
+@lru_cache(maxsize=16)
+def _load_poi_file(path: str, mtime_ns: int) -> Tuple[PointInput, ...]:
+    data = json.loads(Path(path).read_text(encoding="utf-8"))
+    points = []
+    for idx, feature in enumerate(data.get("features", [])):
+        geometry = feature.get("geometry") or {}
+        if geometry.get("type") != "Point":
+            continue
+        lng, lat = geometry["coordinates"][:2]
+        properties = feature.get("properties") or {}
+        point_id = feature.get("id", properties.get("id", idx))
+        points.append(PointInput(id=str(point_id), lat=float(lat), lng=float(lng)))
+    return tuple(points)
+
+
+def load_poi_set(name: str) -> Optional[Tuple[PointInput, ...]]:
+    """讀取具名 POI 集合（依檔案修改時間快取）；不存在時回傳 None。"""
+
+    if not name or "/" in name or "\\" in name or name.startswith("."):
+        return None
+    path = poi_dir() / f"{name}.geojson"
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _load_poi_file(str(path), mtime_ns)
+
+
+def sun_steps(
+    timestamp: Any,
+    latitude: float,
+    longitude: float,
+    *,
+    horizon_minutes: int,
+    step_minutes: int,
+) -> List[SunStep]:
+    """以 pvlib 一次計算 ``timestamp`` 起每隔 ``step_minutes`` 的太陽位置（含第 0 步）。"""
+
+    import pandas as pd
+    from pvlib import solarposition
+
+    offsets = list(range(0, horizon_minutes + 1, step_minutes))
+    times = pd.DatetimeIndex([timestamp + pd.Timedelta(minutes=offset) for offset in offsets])
+    solpos = solarposition.get_solarposition(
+        times,
+        latitude=latitude,
+        longitude=longitude,
+        altitude=20.0,
+        pressure=101325.0,
+        temperature=25.0,
+    )
+    return [
+        SunStep(minutes=offset, azimuth_deg=float(azimuth), elevation_deg=float(elevation))
+        for offset, azimuth, elevation in zip(offsets, solpos["azimuth"], solpos["elevation"])
+    ]
+
+
+def shade_matrix(
+    points: Sequence[PointInput],
+    steps: Sequence[SunStep],
+    *,
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M,
+) -> np.ndarray:
+    """回傳 ``(點數, 步數)`` 的布林矩陣；太陽在地平線下的步一律視為陰影。"""
+
+    shaded = np.zeros((len(points), len(steps)), dtype=bool)
+    for col, step in enumerate(steps):
+        if step.elevation_deg <= 0:
+            shaded[:, col] = True
+    if not points or all(step.elevation_deg <= 0 for step in steps):
+        return shaded
+
+    session = get_read_session()
+    try:
+        rows = session.execute(
+            text(load_query("point_shade_status.sql")),
+            {
+                "idxs": list(range(len(points))),
+                "lats": [point.lat for point in points],
+                "lngs": [point.lng for point in points],
+                "steps": list(range(len(steps))),
+                "azimuths": [step.azimuth_deg for step in steps],
+                "elevations": [step.elevation_deg for step in steps],
+                "max_shadow_length": max_shadow_length,
+            },
+        ).fetchall()
+        session.rollback()
+    finally:
+        session.close()
+
+    for row in rows:
+        shaded[row.idx, row.step] = True
+    return shaded
+
+
+def summarize_shade(
+    points: Sequence[PointInput],
+    steps: Sequence[SunStep],
+    shaded: np.ndarray,
+) -> List[Dict[str, Any]]:
+    """每個點現在是否在陰影中，以及幾分鐘後狀態改變（視野內不變則為 None）。"""
+
+    if not len(points):
+        return []
+    changed = shaded != shaded[:, :1]
+    has_change = changed.any(axis=1)
+    first_change = changed.argmax(axis=1)
+    results = []
+    for idx, point in enumerate(points):
+        results.append(
+            {
+                "id": point.id,
+                "lat": point.lat,
+                "lng": point.lng,
+                "shaded": bool(shaded[idx, 0]),
+                "minutes_until_change": steps[first_change[idx]].minutes if has_change[idx] else None,
+            }
+        )
+    return results
+
+
+def point_shade_status(
+    points: Sequence[PointInput],
+    steps: Sequence[SunStep],
+    *,
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M,
+) -> List[Dict[str, Any]]:
+    shaded = shade_matrix(points, steps, max_shadow_length=max_shadow_length)
+    return summarize_shade(points, steps, shaded)
@@ -0,0 +1,143 @@
+"""Batch shadow coverage for client-supplied polylines.
+
+All routes in a batch share one shadow computation over their combined
+corridor (``route_corridor_shadow.sql``). The dissolved shadow comes back
+as WKB and is passed to ``route_coverage_chunk.sql`` once per chunk of
+routes, so chunks can run on any connection (including read replicas)
+without temp tables, and results can be streamed as each chunk finishes.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import text
+
+from db.database import get_read_session
+from db.sql import load_query
+from utils.shadow_route_optimizer import DEFAULT_MAX_SHADOW_LENGTH_M, coords_to_wkt, decode_polyline
+from utils.twd97 import to_twd97
+
+# ST_Subdivide 每塊的最多頂點數；塊越小，逐路線的 && 篩選越有效
+SUBDIVIDE_MAX_VERTICES = 128
+
+
+@dataclass
+class CoverageRoute:
+    route_id: str
+    coordinates: Sequence[Tuple[float, float]]
+    wkt: Optional[str] = None
+    error: Optional[str] = None
+
+    @classmethod
+    def decode(cls, route_id: str, encoded_polyline: str) -> "CoverageRoute":
+        try:
+            coords = decode_polyline(encoded_polyline)
+            wkt = coords_to_wkt(coords)
+        except ValueError as exc:
+            return cls(route_id, [], error=str(exc))
+        if any(not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0) for lat, lng in coords):
+            # 超出範圍的座標會讓整批的 ST_Transform 失敗，先在這裡擋下，只回報這條路線
+            return cls(route_id, [], error="路徑座標超出經緯度範圍")
+        return cls(route_id, coords, wkt=wkt)
+
+    def length_m(self) -> float:
+        """Planar length in EPSG:3826, matching what the SQL measures."""
+
+        if len(self.coordinates) < 2:
+            return 0.0
+        lat, lng = np.asarray(self.coordinates, dtype=np.float64).T
+        x, y = to_twd97(lat, lng)
+        return float(np.hypot(np.diff(x), np.diff(y)).sum())
+
+
+@dataclass
+class CorridorShadow:
+    shadow_wkb: Optional[bytes]
+    piece_count: int
+    building_count: int
+
+
+@dataclass
+class CoverageParams:
+    azimuth_deg: float
+    elevation_deg: float
+    building_search_radius: float = 250.0
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M
+    route_buffer_m: float = 1.0
+    snap_tolerance: float = 0.05
+
+
+def coverage_result(route_id: str, total_m: float, shaded_m: float) -> Dict[str, Any]:
+    shaded_m = min(shaded_m, total_m)
+    return {
+        "route_id": route_id,
+        "total_length_m": round(total_m, 2),
+        "shaded_length_m": round(shaded_m, 2),
+        "coverage_percent": round(shaded_m / total_m * 100.0, 2) if total_m > 0 else 0.0,
+    }
+
+
+def compute_corridor_shadow(routes: Sequence[CoverageRoute], params: CoverageParams) -> CorridorShadow:
+    """Dissolve every shadow that can reach any of ``routes`` into one subdivided WKB."""
+
+    session = get_read_session()
+    try:
+        row = session.execute(
+            text(load_query("route_corridor_shadow.sql")),
+            {
+                "route_wkts": [route.wkt for route in routes if route.wkt],
+                "azimuth_deg": params.azimuth_deg,
+                "elevation_deg": params.elevation_deg,
+                "building_search_radius": params.building_search_radius,
+                "max_shadow_length": params.max_shadow_length,
+                "route_buffer": params.route_buffer_m,
+                "snap_to_grid": params.snap_tolerance,
+                "max_vertices": SUBDIVIDE_MAX_VERTICES,
+            },
+        ).fetchone()
+        session.rollback()
+    finally:
+        session.close()
+
+    if row is None:
+        return CorridorShadow(None, 0, 0)
+    return CorridorShadow(
+        shadow_wkb=bytes(row.shadow_wkb) if row.shadow_wkb is not None else None,
+        piece_count=int(row.piece_count or 0),
+        building_count=int(row.building_count or 0),
+    )
+
+
+def score_coverage_chunk(routes: Sequence[CoverageRoute], corridor: CorridorShadow) -> List[Dict[str, Any]]:
+    """Measure shaded length for one chunk of routes against the shared corridor shadow."""
+
+    session = get_read_session()
+    try:
+        rows = session.execute(
+            text(load_query("route_coverage_chunk.sql")),
+            {
+                "shadow_wkb": corridor.shadow_wkb,
+                "route_ids": [route.route_id for route in routes],
+                "route_wkts": [route.wkt for route in routes],
+            },
+        ).fetchall()
+        session.rollback()
+    finally:
+        session.close()
+
+    by_id = {row.route_id: row for row in rows}
+    results = []
+    for route in routes:
+        row = by_id.get(route.route_id)
+        if row is None:
+            results.append({"route_id": route.route_id, "error": "資料庫未回傳此路線的結果"})
+            continue
+        results.append(coverage_result(route.route_id, float(row.total_length_m), float(row.shaded_length_m)))
+    return results
+
+
+def chunked(routes: Sequence[CoverageRoute], size: int) -> List[List[CoverageRoute]]:
+    return [list(routes[start : start + size]) for start in range(0, len(routes), size)]
@@ -0,0 +1,555 @@
+"""城市尺度的「每日遮蔭時數」離線彙整。
+
+離線流程（`build`）：
+1. 以 pvlib 一次算出整段日期（每隔 `--step-minutes`）的太陽位置，只保留太陽在地平線上的時刻，
+   再依太陽 bucket 合併；每個 bucket 記錄它代表的總分鐘數。
+2. 將範圍切成固定大小的 tile（EPSG:3826 格網），由多個 worker process 平行處理；
+   每個 tile 對每個 bucket 抓一次陰影多邊形（`db/queries/building_shadow_polygons.sql`），
+   柵格化後把該 bucket 的分鐘數累加到被遮住的格子上。
+3. 每個 tile 完成後立即寫成 `tiles/{tx}_{ty}.npy` 檢查點，中斷後以同一個 `--run-id` 重跑會略過已完成的 tile。
+4. 全部完成後合併成 `shade_hours.npz`（每格平均每日遮蔭時數），`--publish` 時再寫入
+   `shade_hours_runs` / `shade_hours_cells` 資料表，供 `GET /shade-hours` 查詢。
+
+範例：
+    uv run python -m utils.shade_hours build --run-id 2024-07 --start 2024-07-01 --end 2024-07-31 --from-buildings --workers 8 --publish
+    uv run python -m utils.shade_hours query --run-id 2024-07 --point 25.0217,121.5351
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+SRC_ROOT = Path(__file__).resolve().parents[1]
+if str(SRC_ROOT) not in sys.path:
+    sys.path.append(str(SRC_ROOT))
+
+from sqlalchemy import text
+
+from db.database import dispose_engines, get_read_session, get_session
+from utils.shade_raster import (
+    DEFAULT_MAX_SHADOW_LENGTH_M,
+    Bounds,
+    buildings_extent,
+    fetch_shadow_rings,
+    rasterize_rings,
+)
+from utils.sun_bucket import SunBucket
+from utils.twd97 import to_twd97, to_wgs84
+
+DEFAULT_CELL_SIZE_M = 10.0
+DEFAULT_TILE_CELLS = 200
+DEFAULT_STEP_MINUTES = 15
+DEFAULT_RUN_ROOT = SRC_ROOT.parent / "data" / "shade_hours"
+MAX_QUERY_RADIUS_M = 500.0
+
+LATEST_RUN_SQL = """
+SELECT run_id, start_date, end_date, cell_size, daylight_hours
+FROM shade_hours_runs
+ORDER BY created_at DESC
+LIMIT 1
+"""
+
+RUN_SQL = """
+SELECT run_id, start_date, end_date, cell_size, daylight_hours
+FROM shade_hours_runs
+WHERE run_id = :run_id
+"""
+
+CELLS_SQL = """
+SELECT cell_x, cell_y, shade_hours
+FROM shade_hours_cells
+WHERE run_id = :run_id
+  AND cell_x BETWEEN :min_cx AND :max_cx
+  AND cell_y BETWEEN :min_cy AND :max_cy
+"""
+
+
+@dataclass(frozen=True)
+class SunSlot:
+    """一個太陽 bucket 與它在整段期間代表的總分鐘數。"""
+
+    azimuth_deg: float
+    elevation_deg: float
+    minutes: float
+
+
+@dataclass
+class ShadeHoursConfig:
+    run_id: str
+    start_date: str
+    end_date: str
+    timezone: str
+    bounds: Tuple[float, float, float, float]
+    cell_size: float = DEFAULT_CELL_SIZE_M
+    tile_cells: int = DEFAULT_TILE_CELLS
+    step_minutes: int = DEFAULT_STEP_MINUTES
+    day_stride: int = 1
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M
+
+    @property
+    def days(self) -> int:
+        return (date.fromisoformat(self.end_date) - date.fromisoformat(self.start_date)).days + 1
+
+
+@dataclass(frozen=True)
+class Grid:
+    """以 `cell_size` 對齊的格網；`cell_x`/`cell_y` 為絕對索引（座標 ÷ 格網大小）。"""
+
+    min_cx: int
+    min_cy: int
+    nx: int
+    ny: int
+    cell_size: float
+
+    @classmethod
+    def from_bounds(cls, bounds: Bounds, cell_size: float) -> "Grid":
+        min_cx = int(math.floor(bounds[0] / cell_size))
+        min_cy = int(math.floor(bounds[1] / cell_size))
+        max_cx = int(math.ceil(bounds[2] / cell_size))
+        max_cy = int(math.ceil(bounds[3] / cell_size))
+        return cls(min_cx, min_cy, max(1, max_cx - min_cx), max(1, max_cy - min_cy), cell_size)
+
+    def tiles(self, tile_cells: int) -> Iterator[Tuple[int, int]]:
+        for ty in range(math.ceil(self.ny / tile_cells)):
+            for tx in range(math.ceil(self.nx / tile_cells)):
+                yield tx, ty
+
+    def tile_window(self, tx: int, ty: int, tile_cells: int) -> Tuple[int, int, int, int]:
+        """回傳 tile 在整體陣列中的 `(col0, row0, cols, rows)`。"""
+
+        col0, row0 = tx * tile_cells, ty * tile_cells
+        return col0, row0, min(tile_cells, self.nx - col0), min(tile_cells, self.ny - row0)
+
+
+# ---------------------------------------------------------------------------
+# 太陽位置
+# ---------------------------------------------------------------------------
+
+
+def sample_times(config: ShadeHoursConfig) -> Tuple[Any, np.ndarray]:
+    """整段期間每隔 `day_stride` 天、每天每隔 `step_minutes` 的取樣時間（含時區）與每個取樣代表的分鐘數。"""
+
+    import pandas as pd
+
+    start = date.fromisoformat(config.start_date)
+    per_day = pd.timedelta_range(start="0min", end="1439min", freq=f"{config.step_minutes}min")
+    stamps = []
+    weights = []
+    for offset in range(0, config.days, config.day_stride):
+        day = pd.Timestamp(start + timedelta(days=offset)).tz_localize(config.timezone)
+        # 跳著取樣時，該取樣日代表到下一個取樣日之前的所有天數（最後一段不超過結束日）
+        represented_days = min(config.day_stride, config.days - offset)
+        stamps.extend(day + step for step in per_day)
+        weights.extend([float(config.step_minutes * represented_days)] * len(per_day))
+    return pd.DatetimeIndex(stamps), np.asarray(weights)
+
+
+def sun_slots(config: ShadeHoursConfig) -> Tuple[List[SunSlot], float]:
+    """一次計算所有取樣時間的太陽位置並依 bucket 合併；另回傳平均每日日照時數。"""
+
+    from pvlib import solarposition
+
+    center_lat, center_lng = to_wgs84(
+        (config.bounds[0] + config.bounds[2]) / 2.0,
+        (config.bounds[1] + config.bounds[3]) / 2.0,
+    )
+    times, weights = sample_times(config)
+    solpos = solarposition.get_solarposition(
+        times,
+        latitude=float(center_lat),
+        longitude=float(center_lng),
+        altitude=20.0,
+        pressure=101325.0,
+        temperature=25.0,
+    )
+    sun_up = solpos["elevation"].to_numpy() > 0
+    azimuths = solpos["azimuth"].to_numpy()[sun_up]
+    elevations = solpos["elevation"].to_numpy()[sun_up]
+    weights = weights[sun_up]
+
+    minutes: Dict[SunBucket, float] = {}
+    for azimuth, elevation, weight in zip(azimuths, elevations, weights):
+        bucket = SunBucket.from_angles(float(azimuth), float(elevation))
+        minutes[bucket] = minutes.get(bucket, 0.0) + float(weight)
+
+    slots = [SunSlot(b.azimuth_deg, b.elevation_deg, m) for b, m in minutes.items()]
+    daylight_hours = float(weights.sum()) / 60.0 / config.days
+    return slots, daylight_hours
+
+
+# ---------------------------------------------------------------------------
+# Tile worker
+# ---------------------------------------------------------------------------
+
+
+def _init_worker() -> None:
+    # fork 出來的 process 不能沿用父行程連線池裡的連線
+    dispose_engines()
+
+
+def tile_checkpoint_path(run_dir: Path, tx: int, ty: int) -> Path:
+    return run_dir / "tiles" / f"{tx}_{ty}.npy"
+
+
+def process_tile(
+    run_dir: str,
+    config: ShadeHoursConfig,
+    grid: Grid,
+    slots: Sequence[SunSlot],
+    tx: int,
+    ty: int,
+) -> Tuple[int, int, int, float]:
+    """累加單一 tile 內每格被遮蔽的分鐘數並寫出檢查點；回傳 `(tx, ty, 多邊形數, 秒數)`。"""
+
+    started = time.perf_counter()
+    col0, row0, cols, rows = grid.tile_window(tx, ty, config.tile_cells)
+    origin_x = (grid.min_cx + col0) * grid.cell_size
+    origin_y = (grid.min_cy + row0) * grid.cell_size
+    bounds = (origin_x, origin_y, origin_x + cols * grid.cell_size, origin_y + rows * grid.cell_size)
+
+    shaded_minutes = np.zeros((rows, cols), dtype=np.float32)
+    polygon_count = 0
+    session = get_read_session()
+    try:
+        for slot in slots:
+            bucket = SunBucket(slot.azimuth_deg, slot.elevation_deg)
+            polygons = fetch_shadow_rings(session, bounds, bucket, config.max_shadow_length)
+            if not polygons:
+                continue
+            polygon_count += len(polygons)
+            mask = np.zeros((rows, cols), dtype=bool)
+            for rings in polygons:
+                rasterize_rings(mask, rings, origin_x, origin_y, grid.cell_size)
+            shaded_minutes[mask] += slot.minutes
+        session.rollback()
+    finally:
+        session.close()
+
+    path = tile_checkpoint_path(Path(run_dir), tx, ty)
+    tmp_path = path.with_name(path.stem + ".tmp.npy")
+    np.save(tmp_path, shaded_minutes)
+    os.replace(tmp_path, path)
+    return tx, ty, polygon_count, time.perf_counter() - started
+
+
+# ---------------------------------------------------------------------------
+# 批次執行
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class BuildSummary:
+    run_id: str
+    run_dir: str
+    output: str
+    tiles_total: int
+    tiles_resumed: int
+    sun_slots: int
+    daylight_hours: float
+    seconds: float
+
+
+def _prepare_run_dir(run_dir: Path, config: ShadeHoursConfig) -> None:
+    manifest_path = run_dir / "manifest.json"
+    manifest = asdict(config)
+    manifest["bounds"] = list(config.bounds)
+    if manifest_path.exists():
+        existing = json.loads(manifest_path.read_text())
+        if existing != manifest:
+            raise ValueError(f"{run_dir} 已存在不同設定的執行結果，請改用新的 --run-id 或刪除該資料夾")
+    (run_dir / "tiles").mkdir(parents=True, exist_ok=True)
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2))
+
+
+def run_shade_hours(config: ShadeHoursConfig, run_root: Path, *, workers: int) -> BuildSummary:
+    """平行處理所有 tile（已有檢查點者略過），再合併成 `shade_hours.npz`。"""
+
+    started = time.perf_counter()
+    run_dir = Path(run_root) / config.run_id
+    _prepare_run_dir(run_dir, config)
+    grid = Grid.from_bounds(config.bounds, config.cell_size)
+    slots, daylight_hours = sun_slots(config)
+
+    tiles = list(grid.tiles(config.tile_cells))
+    pending = [(tx, ty) for tx, ty in tiles if not tile_checkpoint_path(run_dir, tx, ty).exists()]
+    resumed = len(tiles) - len(pending)
+    print(f"{len(tiles)} 個 tile（{resumed} 個已完成）、{len(slots)} 個太陽 bucket", flush=True)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [
+                executor.submit(process_tile, str(run_dir), config, grid, slots, tx, ty) for tx, ty in pending
+            ]
+            for done, future in enumerate(as_completed(futures), start=1):
+                tx, ty, polygons, seconds = future.result()
+                print(f"[{done}/{len(pending)}] tile {tx},{ty}：{polygons} 個陰影多邊形，{seconds:.1f}s", flush=True)
+
+    output = run_dir / "shade_hours.npz"
+    write_shade_hours_array(output, run_dir, config, grid, daylight_hours)
+    return BuildSummary(
+        run_id=config.run_id,
+        run_dir=str(run_dir),
+        output=str(output),
+        tiles_total=len(tiles),
+        tiles_resumed=resumed,
+        sun_slots=len(slots),
+        daylight_hours=round(daylight_hours, 3),
+        seconds=round(time.perf_counter() - started, 1),
+    )
+
+
+def merge_tiles(run_dir: Path, config: ShadeHoursConfig, grid: Grid) -> np.ndarray:
+    """把所有 tile 檢查點拼成平均每日遮蔭時數陣列（列 0 為最南側）。"""
+
+    hours = np.zeros((grid.ny, grid.nx), dtype=np.float32)
+    for tx, ty in grid.tiles(config.tile_cells):
+        col0, row0, cols, rows = grid.tile_window(tx, ty, config.tile_cells)
+        hours[row0 : row0 + rows, col0 : col0 + cols] = np.load(tile_checkpoint_path(run_dir, tx, ty))
+    hours /= 60.0 * config.days
+    return hours
+
+
+def write_shade_hours_array(
+    output: Path,
+    run_dir: Path,
+    config: ShadeHoursConfig,
+    grid: Grid,
+    daylight_hours: float,
+) -> None:
+    hours = merge_tiles(run_dir, config, grid)
+    np.savez_compressed(
+        output,
+        shade_hours=hours,
+        daylight_hours=np.float32(daylight_hours),
+        origin=np.array([grid.min_cx * grid.cell_size, grid.min_cy * grid.cell_size]),
+        cell_size=np.float64(grid.cell_size),
+        metadata=np.array(json.dumps({**asdict(config), "crs": "EPSG:3826"}, ensure_ascii=False)),
+    )
+
+
+# ---------------------------------------------------------------------------
+# 資料表發佈與查詢
+# ---------------------------------------------------------------------------
+
+
+def publish_shade_hours(npz_path: Path) -> int:
+    """將 `shade_hours.npz` 寫入資料表（同一 run_id 會先清除），回傳寫入的格數。"""
+
+    with np.load(npz_path) as data:
+        hours = data["shade_hours"]
+        daylight_hours = float(data["daylight_hours"])
+        origin_x, origin_y = (float(v) for v in data["origin"])
+        cell_size = float(data["cell_size"])
+        metadata = json.loads(str(data["metadata"]))
+
+    min_cx = int(round(origin_x / cell_size))
+    min_cy = int(round(origin_y / cell_size))
+    rows, cols = np.nonzero(hours > 0)
+
+    session = get_session()
+    try:
+        session.execute(text("DELETE FROM shade_hours_cells WHERE run_id = :run_id"), {"run_id": metadata["run_id"]})
+        session.execute(
+            text(
+                """
+                INSERT INTO shade_hours_runs (run_id, start_date, end_date, cell_size, daylight_hours, metadata)
+                VALUES (:run_id, :start_date, :end_date, :cell_size, :daylight_hours, CAST(:metadata AS jsonb))
+                ON CONFLICT (run_id) DO UPDATE SET
+                  start_date = EXCLUDED.start_date,
+                  end_date = EXCLUDED.end_date,
+                  cell_size = EXCLUDED.cell_size,
+                  daylight_hours = EXCLUDED.daylight_hours,
+                  metadata = EXCLUDED.metadata,
+                  created_at = NOW()
+                """
+            ),
+            {
+                "run_id": metadata["run_id"],
+                "start_date": metadata["start_date"],
+                "end_date": metadata["end_date"],
+                "cell_size": cell_size,
+                "daylight_hours": daylight_hours,
+                "metadata": json.dumps(metadata, ensure_ascii=False),
+            },
+        )
+        raw = session.connection().connection.driver_connection
+        with raw.cursor() as cursor:
+            with cursor.copy("COPY shade_hours_cells (run_id, cell_x, cell_y, shade_hours) FROM STDIN") as copy:
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    copy.write_row((metadata["run_id"], min_cx + col, min_cy + row, float(hours[row, col])))
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+    return len(rows)
+
+
+def lookup_shade_hours(
+    lat: float,
+    lng: float,
+    *,
+    run_id: Optional[str] = None,
+    radius_m: float = 0.0,
+) -> Optional[Dict[str, Any]]:
+    """查詢某點（與半徑內格子）的平均每日遮蔭時數；找不到執行結果時回傳 None。"""
+
+    session = get_read_session()
+    try:
+        if run_id:
+            run = session.execute(text(RUN_SQL), {"run_id": run_id}).fetchone()
+        else:
+            run = session.execute(text(LATEST_RUN_SQL)).fetchone()
+        if run is None:
+            return None
+
+        cell_size = float(run.cell_size)
+        x, y = to_twd97(lat, lng)
+        cx, cy = int(math.floor(x / cell_size)), int(math.floor(y / cell_size))
+        span = int(math.ceil(min(radius_m, MAX_QUERY_RADIUS_M) / cell_size))
+        rows = session.execute(
+            text(CELLS_SQL),
+            {
+                "run_id": run.run_id,
+                "min_cx": cx - span,
+                "max_cx": cx + span,
+                "min_cy": cy - span,
+                "max_cy": cy + span,
+            },
+        ).fetchall()
+    finally:
+        session.close()
+
+    values = {(row.cell_x, row.cell_y): float(row.shade_hours) for row in rows}
+    daylight_hours = float(run.daylight_hours)
+    center_hours = values.get((cx, cy), 0.0)
+    result: Dict[str, Any] = {
+        "run_id": run.run_id,
+        "start_date": str(run.start_date),
+        "end_date": str(run.end_date),
+        "cell_size_m": cell_size,
+        "daylight_hours": round(daylight_hours, 3),
+        "shade_hours": round(center_hours, 3),
+        "shade_ratio": round(center_hours / daylight_hours, 4) if daylight_hours > 0 else None,
+    }
+    if span:
+        cells = []
+        for (cell_x, cell_y), hours in sorted(values.items()):
+            cell_lat, cell_lng = to_wgs84((cell_x + 0.5) * cell_size, (cell_y + 0.5) * cell_size)
+            cells.append({"lat": round(float(cell_lat), 6), "lng": round(float(cell_lng), 6), "shade_hours": round(hours, 3)})
+        result["cells"] = cells
+    return result
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _parse_bounds(value: str) -> Bounds:
+    parts = [float(item) for item in value.split(",")]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("--bbox 格式為 min_x,min_y,max_x,max_y（EPSG:3826）")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def _parse_lat_lng(value: str) -> Tuple[float, float]:
+    lat, lng = (float(item) for item in value.split(","))
+    return lat, lng
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="離線彙整每格平均每日遮蔭時數")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="平行計算（可續跑）並輸出 npz")
+    build.add_argument("--run-id", required=True, help="執行名稱，也是檢查點資料夾名稱與資料表的 run_id")
+    build.add_argument("--start", required=True, help="起始日期 YYYY-MM-DD")
+    build.add_argument("--end", required=True, help="結束日期 YYYY-MM-DD（含）")
+    area = build.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=_parse_bounds, help="EPSG:3826 範圍 min_x,min_y,max_x,max_y")
+    area.add_argument("--from-buildings", action="store_true", help="使用 buildings 資料表的完整範圍")
+    build.add_argument("--timezone", default="Asia/Taipei", help="日期所屬時區")
+    build.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE_M, help="格網大小（公尺）")
+    build.add_argument("--tile-cells", type=int, default=DEFAULT_TILE_CELLS, help="每個 tile 的格數（邊長）")
+    build.add_argument("--step-minutes", type=int, default=DEFAULT_STEP_MINUTES, help="每天的取樣間隔（分鐘）")
+    build.add_argument("--day-stride", type=int, default=1, help="每隔幾天取樣一次（其餘天數以相同權重補上）")
+    build.add_argument(
+        "--max-shadow-length",
+        type=float,
+        default=DEFAULT_MAX_SHADOW_LENGTH_M,
+        help="單棟建物陰影長度上限（公尺）",
+    )
+    build.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker process 數量")
+    build.add_argument("--run-root", default=str(DEFAULT_RUN_ROOT), help="檢查點與輸出的根目錄")
+    build.add_argument("--publish", action="store_true", help="完成後寫入 shade_hours 資料表")
+
+    publish = sub.add_parser("publish", help="將既有的 shade_hours.npz 寫入資料表")
+    publish.add_argument("path", help="shade_hours.npz 路徑")
+
+    query = sub.add_parser("query", help="查詢某點的平均每日遮蔭時數")
+    query.add_argument("--point", type=_parse_lat_lng, required=True, help="lat,lng")
+    query.add_argument("--run-id", help="不指定則使用最新一次發佈的結果")
+    query.add_argument("--radius", type=float, default=0.0, help="一併列出半徑內的格子（公尺）")
+    return parser
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        count = publish_shade_hours(Path(args.path))
+        print(f"已寫入 {count} 格遮蔭時數")
+        return
+
+    if args.command == "query":
+        result = lookup_shade_hours(*args.point, run_id=args.run_id, radius_m=args.radius)
+        if result is None:
+            parser.error("找不到已發佈的遮蔭時數結果")
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    if date.fromisoformat(args.end) < date.fromisoformat(args.start):
+        parser.error("--end 不可早於 --start")
+    if args.step_minutes < 1 or args.day_stride < 1 or args.workers < 1:
+        parser.error("--step-minutes、--day-stride 與 --workers 必須為正整數")
+    try:
+        bounds = buildings_extent() if args.from_buildings else args.bbox
+        config = ShadeHoursConfig(
+            run_id=args.run_id,
+            start_date=args.start,
+            end_date=args.end,
+            timezone=args.timezone,
+            bounds=tuple(bounds),
+            cell_size=args.cell_size,
+            tile_cells=args.tile_cells,
+            step_minutes=args.step_minutes,
+            day_stride=args.day_stride,
+            max_shadow_length=args.max_shadow_length,
+        )
+        summary = run_shade_hours(config, Path(args.run_root), workers=args.workers)
+    except ValueError as exc:
+        parser.error(str(exc))
+    print(json.dumps(asdict(summary), ensure_ascii=False, indent=2))
+
+    if args.publish:
+        count = publish_shade_hours(Path(summary.output))
+        print(f"已寫入 {count} 格遮蔭時數")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,633 @@
+"""以點陣（bitset）預先算好的陰影索引，提供微秒級的點與折線陰影查詢。
+
+離線流程（`build`）：
+1. 依太陽 bucket 取得範圍內每棟建物的陰影多邊形（`db/queries/building_shadow_polygons.sql`）。
+2. 以約 1 公尺的格網（EPSG:3826）將陰影柵格化成 256×256 的 tile，每格 1 bit，zlib 壓縮後寫入單一檔案。
+3. 檔案尾端記錄 tile 索引，讀取時以 mmap 開啟、只解壓被查到的 tile。
+
+查詢 API（`ShadeRaster`）：
+- `is_shaded(lat, lng)`：某點是否在陰影內。
+- `polyline_shade(coords)`：沿折線每隔半格取樣，回傳陰影長度與比例。
+結果為近似值（誤差約一格），可作為快速路徑或精確向量評分前的預先篩選。
+
+範例：
+    uv run python -m utils.shade_raster build --timestamp 2024-11-05T09:00 --from-buildings
+    uv run python -m utils.shade_raster query data/shade/shade-a132.50_e34.00.vshd --point 25.0217,121.5351
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+SRC_ROOT = Path(__file__).resolve().parents[1]
+if str(SRC_ROOT) not in sys.path:
+    sys.path.append(str(SRC_ROOT))
+
+from sqlalchemy import text
+
+from db.database import get_read_session
+from db.sql import load_query
+from utils.sun_bucket import SunBucket
+from utils.twd97 import to_twd97, to_wgs84
+
+MAGIC = b"VSHADE01"
+TRAILER = struct.Struct("<QI8s")
+FORMAT_VERSION = 1
+DEFAULT_CELL_SIZE_M = 1.0
+DEFAULT_TILE_SIZE = 256
+DEFAULT_MAX_SHADOW_LENGTH_M = 250.0
+DEFAULT_RASTER_DIR = SRC_ROOT.parent / "data" / "shade"
+# 點陣與請求的太陽角度（方位角、仰角）差距都在此範圍內才沿用
+SUN_MATCH_TOLERANCE_DEG = 1.0
+_RASTER_NAME = re.compile(r"^shade-a(\d+(?:\.\d+)?)_e(-?\d+(?:\.\d+)?)\.vshd$")
+
+BUILDINGS_EXTENT_SQL = """
+SELECT ST_XMin(e) AS min_x, ST_YMin(e) AS min_y, ST_XMax(e) AS max_x, ST_YMax(e) AS max_y
+FROM (SELECT ST_Extent(geom_3826)::geometry AS e FROM buildings) extent
+"""
+
+Ring = np.ndarray
+Bounds = Tuple[float, float, float, float]
+
+
+def shade_raster_path(bucket: SunBucket, directory: Path = DEFAULT_RASTER_DIR) -> Path:
+    return Path(directory) / f"shade-{bucket.key}.vshd"
+
+
+# ---------------------------------------------------------------------------
+# 柵格化
+# ---------------------------------------------------------------------------
+
+
+def geojson_rings(geometry: Dict[str, Any]) -> List[Ring]:
+    """取出 Polygon/MultiPolygon 的所有環（外環與洞一起以奇偶規則處理）。"""
+
+    geom_type = geometry.get("type")
+    if geom_type == "Polygon":
+        polygons = [geometry["coordinates"]]
+    elif geom_type == "MultiPolygon":
+        polygons = geometry["coordinates"]
+    else:
+        return []
+    return [np.asarray(ring, dtype=np.float64)[:, :2] for polygon in polygons for ring in polygon if len(ring) >= 4]
+
+
+def _rings_bounds(rings: Sequence[Ring]) -> Bounds:
+    stacked = np.vstack(rings)
+    return (
+        float(stacked[:, 0].min()),
+        float(stacked[:, 1].min()),
+        float(stacked[:, 0].max()),
+        float(stacked[:, 1].max()),
+    )
+
+
+def rasterize_rings(
+    mask: np.ndarray,
+    rings: Sequence[Ring],
+    origin_x: float,
+    origin_y: float,
+    cell_size: float,
+) -> None:
+    """將一個多邊形（多個環）以格中心點的奇偶測試畫進 `mask`（列 0 為最南側）。"""
+
+    if not rings:
+        return
+    rows, cols = mask.shape
+    min_x, min_y, max_x, max_y = _rings_bounds(rings)
+    c0 = max(0, int(math.floor((min_x - origin_x) / cell_size)))
+    c1 = min(cols, int(math.ceil((max_x - origin_x) / cell_size)))
+    r0 = max(0, int(math.floor((min_y - origin_y) / cell_size)))
+    r1 = min(rows, int(math.ceil((max_y - origin_y) / cell_size)))
+    if c0 >= c1 or r0 >= r1:
+        return
+
+    px = origin_x + (np.arange(c0, c1) + 0.5) * cell_size
+    py = origin_y + (np.arange(r0, r1) + 0.5) * cell_size
+    gx, gy = np.meshgrid(px, py)
+    inside = np.zeros(gx.shape, dtype=bool)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for ring in rings:
+            x1, y1 = ring[:-1, 0], ring[:-1, 1]
+            x2, y2 = ring[1:, 0], ring[1:, 1]
+            for ax, ay, bx, by in zip(x1, y1, x2, y2):
+                if ay == by:
+                    continue
+                crosses = (ay > gy) != (by > gy)
+                x_cross = (bx - ax) * (gy - ay) / (by - ay) + ax
+                inside ^= crosses & (gx < x_cross)
+    mask[r0:r1, c0:c1] |= inside
+
+
+# ---------------------------------------------------------------------------
+# 檔案格式：MAGIC | tile blobs | header JSON | trailer(header_offset, header_len, MAGIC)
+# ---------------------------------------------------------------------------
+
+
+class ShadeRasterWriter:
+    def __init__(self, path: Path, *, cell_size: float, tile_size: int, metadata: Dict[str, Any]) -> None:
+        if tile_size % 8:
+            raise ValueError("tile_size 必須是 8 的倍數")
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.cell_size = cell_size
+        self.tile_size = tile_size
+        self.metadata = metadata
+        self._tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        self._file = open(self._tmp_path, "wb")
+        self._file.write(MAGIC)
+        self._index: Dict[str, List[int]] = {}
+
+    def write_tile(self, tx: int, ty: int, mask: np.ndarray) -> bool:
+        if not mask.any():
+            return False
+        blob = zlib.compress(np.packbits(mask, axis=None).tobytes(), 6)
+        self._index[f"{tx}:{ty}"] = [self._file.tell(), len(blob)]
+        self._file.write(blob)
+        return True
+
+    def close(self) -> None:
+        header = {
+            "version": FORMAT_VERSION,
+            "crs": "EPSG:3826",
+            "cell_size": self.cell_size,
+            "tile_size": self.tile_size,
+            "metadata": self.metadata,
+            "tiles": self._index,
+        }
+        encoded = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        offset = self._file.tell()
+        self._file.write(encoded)
+        self._file.write(TRAILER.pack(offset, len(encoded), MAGIC))
+        self._file.close()
+        self._tmp_path.replace(self.path)
+
+    def abort(self) -> None:
+        self._file.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+@dataclass
+class PolylineShade:
+    length_m: float
+    shaded_m: float
+
+    @property
+    def fraction(self) -> float:
+        return self.shaded_m / self.length_m if self.length_m > 0 else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {"length_m": self.length_m, "shaded_m": self.shaded_m, "fraction": self.fraction}
+
+
+class ShadeRaster:
+    """以 mmap 讀取陰影點陣檔；解壓後的 tile 以 LRU 快取保留（可跨執行緒共用）。"""
+
+    def __init__(self, path: Path, *, cache_tiles: int = 1024) -> None:
+        self.path = Path(path)
+        self._file = open(self.path, "rb")
+        self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mm[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"不是陰影點陣檔：{self.path}")
+        offset, length, magic = TRAILER.unpack(self._mm[-TRAILER.size :])
+        if magic != MAGIC:
+            raise ValueError(f"陰影點陣檔結尾損毀：{self.path}")
+        header = json.loads(self._mm[offset : offset + length])
+        if header.get("version") != FORMAT_VERSION:
+            raise ValueError(f"不支援的陰影點陣版本：{header.get('version')}")
+        self.cell_size = float(header["cell_size"])
+        self.tile_size = int(header["tile_size"])
+        self.metadata: Dict[str, Any] = header.get("metadata", {})
+        self._index: Dict[Tuple[int, int], Tuple[int, int]] = {}
+        for key, (blob_offset, blob_length) in header["tiles"].items():
+            tx, ty = key.split(":")
+            self._index[(int(tx), int(ty))] = (blob_offset, blob_length)
+        self._cache: "OrderedDict[Tuple[int, int], np.ndarray]" = OrderedDict()
+        self._cache_tiles = cache_tiles
+        self._cache_lock = threading.Lock()
+
+    def close(self) -> None:
+        self._mm.close()
+        self._file.close()
+
+    def __enter__(self) -> "ShadeRaster":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    @property
+    def tile_count(self) -> int:
+        return len(self._index)
+
+    def _packed_tile(self, tile: Tuple[int, int]) -> Optional[np.ndarray]:
+        with self._cache_lock:
+            cached = self._cache.get(tile)
+            if cached is not None:
+                self._cache.move_to_end(tile)
+                return cached
+        location = self._index.get(tile)
+        if location is None:
+            return None
+        offset, length = location
+        # 解壓不持鎖；兩個執行緒同時解壓同一 tile 只是多做一次
+        packed = np.frombuffer(zlib.decompress(self._mm[offset : offset + length]), dtype=np.uint8)
+        with self._cache_lock:
+            self._cache[tile] = packed
+            self._cache.move_to_end(tile)
+            while len(self._cache) > self._cache_tiles:
+                self._cache.popitem(last=False)
+        return packed
+
+    def sample_xy(self, xs: np.ndarray, ys: np.ndarray) -> np.ndarray:
+        """向量化查詢多個 EPSG:3826 座標是否落在陰影格內。"""
+
+        xs = np.asarray(xs, dtype=np.float64)
+        ys = np.asarray(ys, dtype=np.float64)
+        cx = np.floor(xs / self.cell_size).astype(np.int64)
+        cy = np.floor(ys / self.cell_size).astype(np.int64)
+        tx = np.floor_divide(cx, self.tile_size)
+        ty = np.floor_divide(cy, self.tile_size)
+        bit_index = (cy - ty * self.tile_size) * self.tile_size + (cx - tx * self.tile_size)
+
+        result = np.zeros(xs.shape, dtype=bool)
+        tiles, inverse = np.unique(np.stack([tx.ravel(), ty.ravel()], axis=1), axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        flat_bits = bit_index.ravel()
+        flat_result = result.reshape(-1)
+        for tile_idx, (tile_x, tile_y) in enumerate(tiles):
+            packed = self._packed_tile((int(tile_x), int(tile_y)))
+            if packed is None:
+                continue
+            selected = inverse == tile_idx
+            bits = flat_bits[selected]
+            flat_result[selected] = (packed[bits >> 3] >> (7 - (bits & 7))) & 1 == 1
+        return result
+
+    def is_shaded_xy(self, x: float, y: float) -> bool:
+        cx = math.floor(x / self.cell_size)
+        cy = math.floor(y / self.cell_size)
+        tx, ty = cx // self.tile_size, cy // self.tile_size
+        packed = self._packed_tile((tx, ty))
+        if packed is None:
+            return False
+        bit = (cy - ty * self.tile_size) * self.tile_size + (cx - tx * self.tile_size)
+        return bool((packed[bit >> 3] >> (7 - (bit & 7))) & 1)
+
+    def is_shaded(self, lat: float, lng: float) -> bool:
+        x, y = to_twd97(lat, lng)
+        return self.is_shaded_xy(float(x), float(y))
+
+    def polyline_shade(self, coords: Sequence[Tuple[float, float]], *, step_m: Optional[float] = None) -> PolylineShade:
+        """沿 (lat, lng) 折線每隔 `step_m`（預設半格）取樣，估算陰影長度。"""
+
+        if len(coords) < 2:
+            return PolylineShade(length_m=0.0, shaded_m=0.0)
+        lat, lng = np.asarray(coords, dtype=np.float64).T
+        xs, ys = to_twd97(lat, lng)
+        return self.polyline_shade_xy(xs, ys, step_m=step_m)
+
+    def polyline_shade_xy(self, xs: np.ndarray, ys: np.ndarray, *, step_m: Optional[float] = None) -> PolylineShade:
+        step = step_m or self.cell_size / 2.0
+        dx = np.diff(xs)
+        dy = np.diff(ys)
+        seg_len = np.hypot(dx, dy)
+        total = float(seg_len.sum())
+        if total <= 0:
+            return PolylineShade(length_m=0.0, shaded_m=0.0)
+
+        counts = np.maximum(1, np.ceil(seg_len / step).astype(np.int64))
+        seg_idx = np.repeat(np.arange(len(seg_len)), counts)
+        starts = np.cumsum(counts) - counts
+        within = np.arange(counts.sum()) - np.repeat(starts, counts)
+        t = (within + 0.5) / counts[seg_idx]
+        sx = xs[:-1][seg_idx] + dx[seg_idx] * t
+        sy = ys[:-1][seg_idx] + dy[seg_idx] * t
+        sub_len = seg_len[seg_idx] / counts[seg_idx]
+        shaded = self.sample_xy(sx, sy)
+        return PolylineShade(length_m=total, shaded_m=float(sub_len[shaded].sum()))
+
+
+_OPEN_RASTERS: Dict[Path, Tuple[int, ShadeRaster]] = {}
+_open_lock = threading.Lock()
+
+
+def open_shade_raster(path: Path) -> Optional[ShadeRaster]:
+    """開啟點陣檔並依（路徑、修改時間）重複使用；重新建置後會換成新檔。不存在時回傳 None。"""
+
+    path = Path(path)
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _open_lock:
+        entry = _OPEN_RASTERS.get(path)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1]
+        # 舊的 ShadeRaster 可能仍有執行緒在讀，不主動關閉，等沒有參照時自然釋放
+        raster = ShadeRaster(path)
+        _OPEN_RASTERS[path] = (mtime_ns, raster)
+    return raster
+
+
+def load_shade_raster(bucket: SunBucket, directory: Path = DEFAULT_RASTER_DIR) -> Optional[ShadeRaster]:
+    """回傳該 bucket 的陰影點陣（已開啟者重複使用），不存在時回傳 None。"""
+
+    return open_shade_raster(shade_raster_path(bucket, directory))
+
+
+@lru_cache(maxsize=8)
+def _raster_buckets(directory: str, mtime_ns: int) -> Tuple[Tuple[str, SunBucket], ...]:
+    buckets = []
+    for path in sorted(Path(directory).glob("shade-*.vshd")):
+        match = _RASTER_NAME.match(path.name)
+        if match:
+            buckets.append((str(path), SunBucket(float(match.group(1)), float(match.group(2)))))
+    return tuple(buckets)
+
+
+def list_shade_rasters(directory: Path = DEFAULT_RASTER_DIR) -> List[Tuple[Path, SunBucket]]:
+    """列出資料夾內的點陣檔與其 bucket（依資料夾修改時間快取，新增或重建檔案後自動更新）。"""
+
+    try:
+        mtime_ns = Path(directory).stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    return [(Path(path), bucket) for path, bucket in _raster_buckets(str(directory), mtime_ns)]
+
+
+def nearest_shade_raster(
+    azimuth_deg: float,
+    elevation_deg: float,
+    directory: Path = DEFAULT_RASTER_DIR,
+    *,
+    tolerance_deg: float = SUN_MATCH_TOLERANCE_DEG,
+) -> Optional[ShadeRaster]:
+    """找出太陽角度最接近的點陣；方位角與仰角差距都需在 `tolerance_deg` 內。"""
+
+    best: Optional[Path] = None
+    best_distance = math.inf
+    for path, bucket in list_shade_rasters(directory):
+        d_az = abs((bucket.azimuth_deg - azimuth_deg + 180.0) % 360.0 - 180.0)
+        d_el = abs(bucket.elevation_deg - elevation_deg)
+        if d_az > tolerance_deg or d_el > tolerance_deg:
+            continue
+        distance = math.hypot(d_az, d_el)
+        if distance < best_distance:
+            best, best_distance = path, distance
+    return open_shade_raster(best) if best is not None else None
+
+
+# ---------------------------------------------------------------------------
+# 離線建置
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class BuildSummary:
+    path: str
+    bucket: str
+    tiles_total: int
+    tiles_written: int
+    shadow_polygons: int
+
+
+def _tile_range(bounds: Bounds, tile_span: float) -> Tuple[range, range]:
+    min_x, min_y, max_x, max_y = bounds
+    return (
+        range(int(math.floor(min_x / tile_span)), int(math.floor(max_x / tile_span)) + 1),
+        range(int(math.floor(min_y / tile_span)), int(math.floor(max_y / tile_span)) + 1),
+    )
+
+
+def _chunks(values: range, size: int) -> Iterator[range]:
+    for start in range(values.start, values.stop, size):
+        yield range(start, min(start + size, values.stop))
+
+
+def fetch_shadow_rings(
+    session: Any,
+    bounds: Bounds,
+    bucket: SunBucket,
+    max_shadow_length: float,
+) -> List[List[Ring]]:
+    rows = session.execute(
+        text(load_query("building_shadow_polygons.sql")),
+        {
+            "min_x": bounds[0],
+            "min_y": bounds[1],
+            "max_x": bounds[2],
+            "max_y": bounds[3],
+            "azimuth_deg": bucket.azimuth_deg,
+            "elevation_deg": bucket.elevation_deg,
+            "max_shadow_length": max_shadow_length,
+        },
+    ).fetchall()
+    polygons = [geojson_rings(json.loads(row.shadow_geojson)) for row in rows if row.shadow_geojson]
+    return [rings for rings in polygons if rings]
+
+
+def build_shade_raster(
+    output: Path,
+    bounds: Bounds,
+    bucket: SunBucket,
+    *,
+    cell_size: float = DEFAULT_CELL_SIZE_M,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    chunk_tiles: int = 4,
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M,
+) -> BuildSummary:
+    """將 `bounds`（EPSG:3826）內的建物陰影柵格化並寫成單一點陣檔。"""
+
+    tile_span = cell_size * tile_size
+    tx_range, ty_range = _tile_range(bounds, tile_span)
+    writer = ShadeRasterWriter(
+        output,
+        cell_size=cell_size,
+        tile_size=tile_size,
+        metadata={
+            "bucket": asdict(bucket),
+            "bounds": list(bounds),
+            "max_shadow_length": max_shadow_length,
+        },
+    )
+    written = 0
+    polygon_count = 0
+    session = get_read_session()
+    try:
+        for tx_chunk in _chunks(tx_range, chunk_tiles):
+            for ty_chunk in _chunks(ty_range, chunk_tiles):
+                chunk_bounds = (
+                    tx_chunk.start * tile_span,
+                    ty_chunk.start * tile_span,
+                    tx_chunk.stop * tile_span,
+                    ty_chunk.stop * tile_span,
+                )
+                polygons = fetch_shadow_rings(session, chunk_bounds, bucket, max_shadow_length)
+                polygon_count += len(polygons)
+                boxes = [_rings_bounds(rings) for rings in polygons]
+                for tx in tx_chunk:
+                    for ty in ty_chunk:
+                        x0, y0 = tx * tile_span, ty * tile_span
+                        mask = np.zeros((tile_size, tile_size), dtype=bool)
+                        for rings, (bx0, by0, bx1, by1) in zip(polygons, boxes):
+                            if bx1 < x0 or bx0 > x0 + tile_span or by1 < y0 or by0 > y0 + tile_span:
+                                continue
+                            rasterize_rings(mask, rings, x0, y0, cell_size)
+                        if writer.write_tile(tx, ty, mask):
+                            written += 1
+        session.rollback()
+        writer.close()
+    except Exception:
+        writer.abort()
+        raise
+    finally:
+        session.close()
+
+    return BuildSummary(
+        path=str(output),
+        bucket=bucket.key,
+        tiles_total=len(tx_range) * len(ty_range),
+        tiles_written=written,
+        shadow_polygons=polygon_count,
+    )
+
+
+def buildings_extent() -> Bounds:
+    session = get_read_session()
+    try:
+        row = session.execute(text(BUILDINGS_EXTENT_SQL)).fetchone()
+    finally:
+        session.close()
+    if not row or row.min_x is None:
+        raise ValueError("buildings 資料表沒有任何幾何，無法取得範圍")
+    return float(row.min_x), float(row.min_y), float(row.max_x), float(row.max_y)
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _parse_bounds(value: str) -> Bounds:
+    parts = [float(item) for item in value.split(",")]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("--bbox 格式為 min_x,min_y,max_x,max_y（EPSG:3826）")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def _parse_lat_lng(value: str) -> Tuple[float, float]:
+    lat, lng = (float(item) for item in value.split(","))
+    return lat, lng
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="建置或查詢陰影點陣索引")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="依太陽 bucket 將建物陰影柵格化")
+    area = build.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=_parse_bounds, help="EPSG:3826 範圍 min_x,min_y,max_x,max_y")
+    area.add_argument("--from-buildings", action="store_true", help="使用 buildings 資料表的完整範圍")
+    sun = build.add_mutually_exclusive_group(required=True)
+    sun.add_argument("--timestamp", help="ISO 8601 時間，以範圍中心計算太陽位置")
+    sun.add_argument("--sun", help="直接指定太陽角度 azimuth,elevation（度）")
+    build.add_argument("--timezone", default="Asia/Taipei", help="naive 時間套用的時區")
+    build.add_argument("--cell-size", type=float, default=DEFAULT_CELL_SIZE_M, help="格網大小（公尺）")
+    build.add_argument("--tile-size", type=int, default=DEFAULT_TILE_SIZE, help="每個 tile 的格數（邊長）")
+    build.add_argument(
+        "--max-shadow-length",
+        type=float,
+        default=DEFAULT_MAX_SHADOW_LENGTH_M,
+        help="單棟建物陰影長度上限（公尺），避免低仰角時無限延伸",
+    )
+    build.add_argument("--output-dir", default=str(DEFAULT_RASTER_DIR), help="輸出資料夾")
+
+    query = sub.add_parser("query", help="查詢點或 polyline 的陰影狀態")
+    query.add_argument("path", help="陰影點陣檔路徑")
+    target = query.add_mutually_exclusive_group(required=True)
+    target.add_argument("--point", type=_parse_lat_lng, help="lat,lng")
+    target.add_argument("--polyline", help="Google Encoded Polyline")
+    return parser
+
+
+def _resolve_bucket(args: argparse.Namespace, bounds: Bounds) -> SunBucket:
+    if args.sun:
+        azimuth, elevation = (float(item) for item in args.sun.split(","))
+        return SunBucket.from_angles(azimuth, elevation)
+
+    import pandas as pd
+
+    from utils import solar_position
+
+    center_lat, center_lng = to_wgs84((bounds[0] + bounds[2]) / 2.0, (bounds[1] + bounds[3]) / 2.0)
+    # ValueError 由 main() 轉成參數錯誤
+    timestamp = pd.Timestamp(args.timestamp)
+    try:
+        zone = ZoneInfo(args.timezone)
+    except (KeyError, ValueError) as exc:
+        raise ValueError(f"未知時區：{args.timezone}") from exc
+    timestamp = timestamp.tz_localize(zone) if timestamp.tzinfo is None else timestamp.tz_convert(zone)
+    solar = solar_position.compute_solar_position(
+        timestamp=timestamp,
+        latitude=float(center_lat),
+        longitude=float(center_lng),
+        altitude=20.0,
+        pressure=101325.0,
+        temperature=25.0,
+    )
+    if solar.elevation_deg <= 0:
+        raise ValueError("指定時間太陽已下山，整個範圍都在陰影中，不需建置點陣")
+    return SunBucket.from_angles(solar.azimuth_deg, solar.elevation_deg)
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.command == "query":
+        with ShadeRaster(Path(args.path)) as raster:
+            if args.point:
+                result: Dict[str, Any] = {"shaded": raster.is_shaded(*args.point)}
+            else:
+                from utils.shadow_route_optimizer import decode_polyline
+
+                result = raster.polyline_shade(decode_polyline(args.polyline)).to_dict()
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+        return
+
+    try:
+        bounds = buildings_extent() if args.from_buildings else args.bbox
+        bucket = _resolve_bucket(args, bounds)
+    except ValueError as exc:
+        parser.error(str(exc))
+    output = shade_raster_path(bucket, Path(args.output_dir))
+    summary = build_shade_raster(
+        output,
+        bounds,
+        bucket,
+        cell_size=args.cell_size,
+        tile_size=args.tile_size,
+        max_shadow_length=args.max_shadow_length,
+    )
+    print(json.dumps(asdict(summary), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,15 @@ from __future__ import annotations
 import json
 import os
 from dataclasses import dataclass, field
-from pathlib import Path
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
 
-from db.database import get_session
-
-QUERY_PATH = Path(__file__).resolve().parents[1] / "db" / "queries" / "building_shadow_geojson.sql"
-BUILDING_SHADOW_SQL = QUERY_PATH.read_text().replace("%(", ":").replace(")s", "")
+from db.database import get_read_session
+from db.sql import load_query
+from utils.deadline import Deadline, set_statement_timeout
 
 
 @dataclass
@@ -26,12 +24,16 @@ class ShadowAreaParams:
     azimuth_deg: float
     elevation_deg: float
     snap_to_grid: float = 0.05
+    max_shadow_length: float = 250.0
+
 
-def compute_shadow_geojson(params: ShadowAreaParams) -> Dict[str, Any]:
-    session = get_session()
+def compute_shadow_geojson(params: ShadowAreaParams, deadline: Optional[Deadline] = None) -> Dict[str, Any]:
+    session = get_read_session()
     try:
+        if deadline is not None:
+            set_statement_timeout(session, deadline.statement_timeout_ms())
         rows = session.execute(
-            text(BUILDING_SHADOW_SQL),
+            text(load_query("building_shadow_geojson.sql")),
             {
                 "center_lat": params.center_lat,
                 "center_lng": params.center_lng,
@@ -39,6 +41,7 @@ def compute_shadow_geojson(params: ShadowAreaParams) -> Dict[str, Any]:
                 "azimuth_deg": params.azimuth_deg,
                 "elevation_deg": params.elevation_deg,
                 "snap_to_grid": params.snap_to_grid,
+                "max_shadow_length": params.max_shadow_length,
             },
         ).fetchall()
     finally:
@@ -14,12 +14,14 @@ import argparse
 import json
 import os
 import sys
-from dataclasses import dataclass, field
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import Any, Dict, List, Sequence, Tuple
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import numpy as np
 import requests
-from dotenv import load_dotenv
 from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import Session
@@ -28,18 +30,22 @@ SRC_ROOT = Path(__file__).resolve().parents[1]
 if str(SRC_ROOT) not in sys.path:
     sys.path.append(str(SRC_ROOT))
 
-# 預先載入專案根目錄的 .env，讓 CLI 啟動方式不受 shell export 影響
-load_dotenv(SRC_ROOT.parent / ".env")
-
-from db.database import get_session
+from db.database import get_read_session
+from db.sql import load_query
+from utils.deadline import Deadline, set_statement_timeout
+from utils.sun_bucket import SunBucket
+from utils.twd97 import to_twd97
 
 DEFAULT_GOOGLE_ROUTES_API_KEY = "token"
-GOOGLE_ROUTES_ENDPOINT = "https://routes.googleapis.com/directions/v2:computeRoutes"
+DEFAULT_GOOGLE_ROUTES_ENDPOINT = "https://routes.googleapis.com/directions/v2:computeRoutes"
 GOOGLE_ROUTES_FIELD_MASK = (
     "routes.distanceMeters,routes.duration,routes.description,"
     "routes.polyline.encodedPolyline"
 )
 GOOGLE_TRAVEL_MODE = "WALK"
+GOOGLE_ROUTES_TIMEOUT_S = 30.0
+# 路線評分的單棟陰影長度上限：只在日出日落前後才會封頂
+DEFAULT_MAX_SHADOW_LENGTH_M = 1000.0
 
 
 @dataclass
@@ -57,6 +63,9 @@ class RouteCandidate:
     shadow_length_m: float = 0.0
     building_count: int = 0
     shadow_polygon_count: int = 0
+    # 分數來源：exact（精確 SQL）、estimate（兩階段排序的取樣估計）、cache、raster、coarse、none（未評分）、sun_down
+    score_source: str = "none"
+    estimate: Optional["ShadeEstimate"] = None
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -69,6 +78,10 @@ class RouteCandidate:
             "shadow_length_m": self.shadow_length_m,
             "building_count": self.building_count,
             "shadow_polygon_count": self.shadow_polygon_count,
+            "score_source": self.score_source,
+            "shadow_area_bounds_m2": (
+                [round(self.estimate.low_m2, 3), round(self.estimate.high_m2, 3)] if self.estimate else None
+            ),
             "wkt": self.wkt,
         }
 
@@ -85,8 +98,11 @@ class ShadowRouteParams:
     azimuth_deg: float = 132.62093746276173
     elevation_deg: float = 34.01104286714345
     building_search_radius: float = 250.0
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M
     route_buffer_m: float = 3.0
     snap_tolerance: float = 0.05
+    scoring_mode: str = "clip"
+    ranking: str = "exact"
     google_routes_api_key: str | None = None
 
     def resolve_api_key(self) -> str:
@@ -126,7 +142,13 @@ def build_parser() -> argparse.ArgumentParser:
         "--building-search-radius",
         type=float,
         default=250.0,
-        help="沿路徑抓取建物的距離（公尺）",
+        help="建物搜尋半徑（公尺），只納入距路徑此範圍內的建物",
+    )
+    parser.add_argument(
+        "--max-shadow-length",
+        type=float,
+        default=DEFAULT_MAX_SHADOW_LENGTH_M,
+        help="單棟建物陰影長度上限（公尺）；只沿太陽方向抓取陰影可及的建物",
     )
     parser.add_argument(
         "--route-buffer-m",
@@ -140,6 +162,18 @@ def build_parser() -> argparse.ArgumentParser:
         default=0.05,
         help="陰影融合時的 ST_SnapToGrid 容差（公尺）",
     )
+    parser.add_argument(
+        "--scoring-mode",
+        choices=sorted(SCORING_QUERIES),
+        default="clip",
+        help="clip：先把陰影裁切到路徑緩衝區再融合（預設）；dissolve：融合整個搜尋半徑的陰影",
+    )
+    parser.add_argument(
+        "--ranking",
+        choices=sorted(RANKING_MODES),
+        default="exact",
+        help="exact：每條候選都精確評分（預設）；two_phase：先取樣估計上下界，只精確評分可能勝出的路線",
+    )
     parser.add_argument(
         "--google-routes-api-key",
         help="Google Routes API 金鑰，不指定則使用環境變數或預設常數",
@@ -193,7 +227,11 @@ def coords_to_wkt(coords: Sequence[Tuple[float, float]]) -> str:
     return "LINESTRING (" + ", ".join(parts) + ")"
 
 
-def call_google_routes(params: ShadowRouteParams, api_key: str) -> List[RouteCandidate]:
+def call_google_routes(
+    params: ShadowRouteParams,
+    api_key: str,
+    timeout_s: float = GOOGLE_ROUTES_TIMEOUT_S,
+) -> List[RouteCandidate]:
     body = {
         "origin": {
             "location": {"latLng": {"latitude": params.origin_lat, "longitude": params.origin_lng}}
@@ -212,11 +250,14 @@ def call_google_routes(params: ShadowRouteParams, api_key: str) -> List[RouteCan
         "X-Goog-FieldMask": GOOGLE_ROUTES_FIELD_MASK,
     }
 
+    # 壓力測試時以 GOOGLE_ROUTES_ENDPOINT 指向本機 stub（見 loadtest/routes_stub.py），避免打到計費 API；
+    # 每次呼叫才讀取，CLI 在 main() 載入的 .env 也會生效
+    endpoint = os.getenv("GOOGLE_ROUTES_ENDPOINT", DEFAULT_GOOGLE_ROUTES_ENDPOINT)
     response = requests.post(
-        GOOGLE_ROUTES_ENDPOINT,
+        endpoint,
         headers=headers,
         json=body,
-        timeout=30,
+        timeout=timeout_s,
     )
     response.raise_for_status()
     data = response.json()
@@ -246,20 +287,27 @@ def call_google_routes(params: ShadowRouteParams, api_key: str) -> List[RouteCan
     return candidates
 
 
-QUERY_DIR = Path(__file__).resolve().parents[1] / "db" / "queries"
-INTERSECTION_SQL = (QUERY_DIR / "route_shadow_intersection.sql").read_text().replace("%(", ":").replace(")s", "")
+# dissolve 會融合搜尋半徑內所有陰影；clip 只融合落在路徑緩衝區內的碎片，數值相同但幾何運算少很多
+SCORING_QUERIES = {
+    "dissolve": "route_shadow_intersection.sql",
+    "clip": "route_shadow_intersection_clipped.sql",
+}
 
 
 def score_route(candidate: RouteCandidate, session: Session, config: ShadowRouteParams) -> None:
+    query_name = SCORING_QUERIES.get(config.scoring_mode)
+    if query_name is None:
+        raise ValueError(f"未知的評分模式：{config.scoring_mode}")
     query_params = {
         "route_wkt": candidate.wkt,
         "azimuth_deg": config.azimuth_deg,
         "elevation_deg": config.elevation_deg,
         "building_search_radius": config.building_search_radius,
+        "max_shadow_length": config.max_shadow_length,
         "route_buffer": config.route_buffer_m,
         "snap_to_grid": config.snap_tolerance,
     }
-    result = session.execute(text(INTERSECTION_SQL), query_params)
+    result = session.execute(text(load_query(query_name)), query_params)
     row = result.fetchone()
     if not row:
         # 代表找不到建物或陰影，分數維持 0
@@ -270,14 +318,41 @@ def score_route(candidate: RouteCandidate, session: Session, config: ShadowRoute
     candidate.building_count = int(row[3] or 0)
 
 
-def optimize_shadow_route(config: ShadowRouteParams) -> Dict[str, Any]:
+def fetch_route_candidates(
+    config: ShadowRouteParams,
+    timeout_s: float = GOOGLE_ROUTES_TIMEOUT_S,
+) -> List[RouteCandidate]:
+    """呼叫 Google Routes 取得候選路線（尚未評分）。"""
+
     api_key = config.resolve_api_key()
-    candidates = call_google_routes(config, api_key)
+    return call_google_routes(config, api_key, timeout_s)
+
+
+def score_candidates(
+    config: ShadowRouteParams,
+    candidates: Sequence[RouteCandidate],
+    deadline: Optional[Deadline] = None,
+    *,
+    reserve_s: float = 0.0,
+    source: str = "exact",
+) -> None:
+    """以同一個 session 為尚未評分的候選路線計算陰影分數。
+
+    給定 `deadline` 時，每條路線查詢前依剩餘預算（扣掉 `reserve_s`）設定 statement_timeout；
+    已評分的路線在後續路線逾時時仍保留分數。
+    """
 
-    session = get_session()
+    session = get_read_session()
     try:
         for candidate in candidates:
+            if candidate.score_source != "none":
+                continue
+            if deadline is not None:
+                set_statement_timeout(session, deadline.statement_timeout_ms(reserve_s=reserve_s))
             score_route(candidate, session, config)
+            candidate.score_source = source
+            if source == "exact":
+                remember_score(config, candidate)
         session.commit()
     except Exception:
         session.rollback()
@@ -285,19 +360,436 @@ def optimize_shadow_route(config: ShadowRouteParams) -> Dict[str, Any]:
     finally:
         session.close()
 
-    best = max(candidates, key=lambda c: c.shadow_area_m2)
+
+# ---------------------------------------------------------------------------
+# 預算不足時的降級評分
+# ---------------------------------------------------------------------------
+
+# 快取與粗略評分使用的 bucket：方位角 2°、仰角 1°（約 8 分鐘內的太陽位置共用）
+COARSE_AZIMUTH_STEP_DEG = 2.0
+COARSE_ELEVATION_STEP_DEG = 1.0
+COARSE_SNAP_TOLERANCE_M = 0.5
+COARSE_MAX_SHADOW_LENGTH_M = 120.0
+
+_score_cache: "OrderedDict[Tuple[Any, ...], Tuple[float, float, int, int]]" = OrderedDict()
+_score_cache_lock = threading.Lock()
+
+
+def coarse_bucket(config: ShadowRouteParams) -> SunBucket:
+    return SunBucket.from_angles(
+        config.azimuth_deg,
+        config.elevation_deg,
+        azimuth_step=COARSE_AZIMUTH_STEP_DEG,
+        elevation_step=COARSE_ELEVATION_STEP_DEG,
+    )
+
+
+def _score_cache_key(config: ShadowRouteParams, candidate: RouteCandidate) -> Tuple[Any, ...]:
+    return (
+        candidate.encoded_polyline,
+        config.scoring_mode,
+        config.route_buffer_m,
+        config.building_search_radius,
+        config.max_shadow_length,
+        coarse_bucket(config).key,
+    )
+
+
+def remember_score(config: ShadowRouteParams, candidate: RouteCandidate) -> None:
+    """保存精確分數，之後同一路線在相近太陽位置預算不足時可直接沿用。"""
+
+    key = _score_cache_key(config, candidate)
+    value = (
+        candidate.shadow_area_m2,
+        candidate.shadow_length_m,
+        candidate.shadow_polygon_count,
+        candidate.building_count,
+    )
+    with _score_cache_lock:
+        _score_cache[key] = value
+        _score_cache.move_to_end(key)
+        while len(_score_cache) > int(os.getenv("ROUTE_SCORE_CACHE_SIZE", "2048")):
+            _score_cache.popitem(last=False)
+
+
+def apply_cached_scores(config: ShadowRouteParams, candidates: Sequence[RouteCandidate]) -> None:
+    for candidate in candidates:
+        if candidate.score_source != "none":
+            continue
+        with _score_cache_lock:
+            cached = _score_cache.get(_score_cache_key(config, candidate))
+        if cached is None:
+            continue
+        (
+            candidate.shadow_area_m2,
+            candidate.shadow_length_m,
+            candidate.shadow_polygon_count,
+            candidate.building_count,
+        ) = cached
+        candidate.score_source = "cache"
+
+
+def apply_raster_scores(config: ShadowRouteParams, candidates: Sequence[RouteCandidate]) -> None:
+    """有預先建好的陰影點陣（utils.shade_raster）時，以取樣估算陰影長度與面積。"""
+
+    from utils.shade_raster import nearest_shade_raster
+
+    raster = nearest_shade_raster(config.azimuth_deg, config.elevation_deg)
+    if raster is None:
+        return
+    buffer_width = config.route_buffer_m * 2.0
+    for candidate in candidates:
+        if candidate.score_source != "none":
+            continue
+        shade = raster.polyline_shade(candidate.coordinates)
+        candidate.shadow_length_m = shade.shaded_m
+        candidate.shadow_area_m2 = shade.shaded_m * buffer_width
+        candidate.score_source = "raster"
+
+
+def coarse_params(config: ShadowRouteParams) -> ShadowRouteParams:
+    """粗略評分參數：較粗的太陽 bucket、較大的吸附容差與較短的陰影可及距離。"""
+
+    bucket = coarse_bucket(config)
+    return replace(
+        config,
+        azimuth_deg=bucket.azimuth_deg,
+        elevation_deg=bucket.elevation_deg,
+        snap_tolerance=max(config.snap_tolerance, COARSE_SNAP_TOLERANCE_M),
+        max_shadow_length=min(config.max_shadow_length, COARSE_MAX_SHADOW_LENGTH_M),
+        scoring_mode="clip",
+    )
+
+
+# ---------------------------------------------------------------------------
+# 兩階段排序：先取樣估計上下界，再只精確評分可能勝出的路線
+# ---------------------------------------------------------------------------
+
+RANKING_MODES = ("exact", "two_phase")
+# 沿路線的取樣間距，以及橫跨緩衝區寬度的取樣線數；每個取樣點代表一格
+TWO_PHASE_SPACING_M = 8.0
+TWO_PHASE_LANES = 3
+# 確認半徑的額外餘裕：座標轉換與浮點誤差
+CERTIFY_SLACK_M = 0.01
+# 取樣點依此邊長分格，各格分別計算陰影可及距離
+REACH_TILE_M = 250.0
+
+
+@dataclass
+class ShadeEstimate:
+    """取樣估計的陰影面積，以及保證涵蓋精確評分結果的上下界（m²）。"""
+
+    shadow_area_m2: float
+    shadow_length_m: float
+    low_m2: float
+    high_m2: float
+
+
+@dataclass
+class RouteSamples:
+    """每段路徑的平頭矩形（寬 2 × 緩衝半徑）切成「沿線 × 取樣線」格，取樣點在格中心。
+
+    精確評分的緩衝區是 `endcap=flat join=round`：包含所有矩形，再加上轉折外側的圓角。
+    """
+
+    xs: np.ndarray  # (沿線格數, 取樣線數)，EPSG:3826
+    ys: np.ndarray
+    cell_len: np.ndarray  # 每一排格子的沿線長度
+    lane_width: float
+    length_m: float
+    join_area_m2: float  # 轉折外側圓角面積的上限（矩形沒涵蓋、精確緩衝區有）
+    overlap_m2: float  # 矩形彼此重疊面積的上限（格子重複計算的部分）
+
+    @property
+    def radii(self) -> np.ndarray:
+        """每一排格子的半對角線長：取樣點周圍這個半徑內狀態確定，整格就確定。"""
+
+        return 0.5 * np.hypot(self.cell_len, self.lane_width)
+
+
+def _empty_samples(lanes: int, half_width_m: float) -> RouteSamples:
+    empty = np.zeros((0, lanes))
+    return RouteSamples(empty, empty, np.zeros(0), 2.0 * half_width_m / lanes, 0.0, 0.0, 0.0)
+
+
+def route_samples(
+    coordinates: Sequence[Tuple[float, float]],
+    half_width_m: float,
+    *,
+    spacing_m: float = TWO_PHASE_SPACING_M,
+    lanes: int = TWO_PHASE_LANES,
+) -> RouteSamples:
+    if len(coordinates) < 2:
+        return _empty_samples(lanes, half_width_m)
+    lat, lng = np.asarray(coordinates, dtype=np.float64).T
+    xs, ys = to_twd97(lat, lng)
+    return route_samples_xy(xs, ys, half_width_m, spacing_m=spacing_m, lanes=lanes)
+
+
+def route_samples_xy(
+    xs: np.ndarray,
+    ys: np.ndarray,
+    half_width_m: float,
+    *,
+    spacing_m: float = TWO_PHASE_SPACING_M,
+    lanes: int = TWO_PHASE_LANES,
+) -> RouteSamples:
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    dx, dy = np.diff(xs), np.diff(ys)
+    seg_len = np.hypot(dx, dy)
+    keep = seg_len > 0
+    x0, y0, dx, dy, seg_len = xs[:-1][keep], ys[:-1][keep], dx[keep], dy[keep], seg_len[keep]
+    if not len(seg_len):
+        return _empty_samples(lanes, half_width_m)
+
+    counts = np.maximum(1, np.ceil(seg_len / spacing_m).astype(np.int64))
+    seg_idx = np.repeat(np.arange(len(seg_len)), counts)
+    starts = np.cumsum(counts) - counts
+    t = (np.arange(counts.sum()) - np.repeat(starts, counts) + 0.5) / counts[seg_idx]
+    cx = x0[seg_idx] + dx[seg_idx] * t
+    cy = y0[seg_idx] + dy[seg_idx] * t
+    # 路段的左法向量
+    nx, ny = -dy[seg_idx] / seg_len[seg_idx], dx[seg_idx] / seg_len[seg_idx]
+    lane_width = 2.0 * half_width_m / lanes
+    offsets = (np.arange(lanes) + 0.5) * lane_width - half_width_m
+    join_area, overlap = _rectangle_slack(x0, y0, dx, dy, seg_len, half_width_m)
+    return RouteSamples(
+        xs=cx[:, None] + nx[:, None] * offsets[None, :],
+        ys=cy[:, None] + ny[:, None] * offsets[None, :],
+        cell_len=seg_len[seg_idx] / counts[seg_idx],
+        lane_width=lane_width,
+        length_m=float(seg_len.sum()),
+        join_area_m2=join_area,
+        overlap_m2=overlap,
+    )
+
+
+def _rectangle_slack(
+    x0: np.ndarray,
+    y0: np.ndarray,
+    dx: np.ndarray,
+    dy: np.ndarray,
+    seg_len: np.ndarray,
+    half_width_m: float,
+) -> Tuple[float, float]:
+    """（圓角面積上限, 矩形重疊面積上限）。
+
+    相鄰兩段轉角 θ：外側圓角為半徑 w、角度 θ 的扇形（w²θ/2），內側重疊最多 w²·tan(θ/2)；
+    不相鄰的段只要外框相交，就把較小的矩形整個算成重疊。重疊都不超過較小的矩形。
+    """
+
+    w = half_width_m
+    rect_area = 2.0 * w * seg_len
+    ux, uy = dx / seg_len, dy / seg_len
+    theta = np.arccos(np.clip(ux[:-1] * ux[1:] + uy[:-1] * uy[1:], -1.0, 1.0))
+    join_area = float((w * w * theta / 2.0).sum())
+    with np.errstate(over="ignore", invalid="ignore"):
+        kite = w * w * np.tan(np.minimum(theta, np.pi * 0.999999) / 2.0)
+    overlap = float(np.minimum(kite, np.minimum(rect_area[:-1], rect_area[1:])).sum())
+
+    if len(seg_len) >= 3:
+        x1, y1 = x0 + dx, y0 + dy
+        min_x, max_x = np.minimum(x0, x1) - w, np.maximum(x0, x1) + w
+        min_y, max_y = np.minimum(y0, y1) - w, np.maximum(y0, y1) + w
+        i, j = np.triu_indices(len(seg_len), k=2)
+        hit = (min_x[i] <= max_x[j]) & (min_x[j] <= max_x[i]) & (min_y[i] <= max_y[j]) & (min_y[j] <= max_y[i])
+        overlap += float(np.minimum(rect_area[i], rect_area[j])[hit].sum())
+    return join_area, overlap
+
+
+def shade_estimate(samples: RouteSamples, shaded: np.ndarray, certain: np.ndarray) -> ShadeEstimate:
+    """由取樣格估計面積與上下界。
+
+    `certain` 表示整格的狀態已確定（與取樣點相同）。下界只算確定在陰影中的格子並扣掉重疊；
+    上界把不確定的格子整格算入，再加上轉折外側的圓角。
+    """
+
+    cell_area = samples.cell_len[:, None] * samples.lane_width * np.ones_like(shaded, dtype=np.float64)
+    estimate = float(cell_area[shaded].sum())
+    low = max(0.0, float(cell_area[shaded & certain].sum()) - samples.overlap_m2)
+    high = float(cell_area[shaded | ~certain].sum()) + samples.join_area_m2
+    shaded_rows = shaded.mean(axis=1) if shaded.size else np.zeros(0)
+    return ShadeEstimate(
+        shadow_area_m2=min(max(estimate, low), high),
+        shadow_length_m=float((samples.cell_len * shaded_rows).sum()),
+        low_m2=low,
+        high_m2=high,
+    )
+
+
+def classify_samples(
+    session: Session,
+    config: ShadowRouteParams,
+    xs: np.ndarray,
+    ys: np.ndarray,
+    radii: np.ndarray,
+    route_idxs: np.ndarray,
+    route_wkts: Sequence[str],
+) -> Tuple[np.ndarray, np.ndarray]:
+    """以 `route_sample_shade.sql` 一次判斷所有取樣點：回傳（是否在陰影中, 半徑內狀態是否確定）。
+
+    `route_idxs` 是每個取樣點所屬路線在 `route_wkts` 中的索引，用來套用 building_search_radius。
+    """
+
+    shaded = np.zeros(len(xs), dtype=bool)
+    certain = np.zeros(len(xs), dtype=bool)
+    if not len(xs):
+        return shaded, certain
+    rows = session.execute(
+        text(load_query("route_sample_shade.sql")),
+        {
+            "idxs": list(range(len(xs))),
+            "route_idxs": [int(i) for i in route_idxs],
+            "route_wkts": list(route_wkts),
+            "xs": [float(x) for x in xs],
+            "ys": [float(y) for y in ys],
+            "radii": [float(r) for r in radii],
+            "reach_tile": REACH_TILE_M,
+            "azimuth_deg": config.azimuth_deg,
+            "elevation_deg": config.elevation_deg,
+            "building_search_radius": config.building_search_radius,
+            "max_shadow_length": config.max_shadow_length,
+        },
+    ).fetchall()
+    for row in rows:
+        shaded[row.idx] = row.shaded
+        certain[row.idx] = row.covered if row.shaded else not row.near
+    return shaded, certain
+
+
+def estimate_candidates(
+    config: ShadowRouteParams,
+    candidates: Sequence[RouteCandidate],
+    deadline: Optional[Deadline] = None,
+    *,
+    reserve_s: float = 0.0,
+    spacing_m: float = TWO_PHASE_SPACING_M,
+    lanes: int = TWO_PHASE_LANES,
+) -> int:
+    """第一階段：以一次查詢取樣所有候選路線，估計陰影面積上下界；回傳取樣點數。
+
+    陰影點陣以格中心判斷，比一格還窄的陰影可能漏掉，無法給出保證的上下界，因此這裡一律查資料庫。
+    給定 `deadline` 時以剩餘預算（扣掉 `reserve_s`）設定 statement_timeout。
+    """
+
+    half_width = config.route_buffer_m
+    samples = [
+        route_samples(candidate.coordinates, half_width, spacing_m=spacing_m, lanes=lanes) for candidate in candidates
+    ]
+    xs = np.concatenate([sample.xs.ravel() for sample in samples]) if samples else np.zeros(0)
+    ys = np.concatenate([sample.ys.ravel() for sample in samples]) if samples else np.zeros(0)
+    # 精確評分會把陰影吸附到 snap_tolerance 的格網，確認半徑也要涵蓋這段位移
+    slack = config.snap_tolerance + CERTIFY_SLACK_M
+    radii = np.concatenate([np.repeat(sample.radii, lanes) for sample in samples]) + slack if samples else np.zeros(0)
+    route_idxs = (
+        np.concatenate([np.full(sample.xs.size, k) for k, sample in enumerate(samples)]) if samples else np.zeros(0)
+    )
+
+    session = get_read_session()
+    try:
+        if deadline is not None:
+            set_statement_timeout(session, deadline.statement_timeout_ms(reserve_s=reserve_s))
+        shaded, certain = classify_samples(
+            session, config, xs, ys, radii, route_idxs, [candidate.wkt for candidate in candidates]
+        )
+        session.rollback()
+    finally:
+        session.close()
+
+    offset = 0
+    for candidate, sample in zip(candidates, samples):
+        size = sample.xs.size
+        candidate.estimate = shade_estimate(
+            sample,
+            shaded[offset : offset + size].reshape(sample.xs.shape),
+            certain[offset : offset + size].reshape(sample.xs.shape),
+        )
+        offset += size
+    return int(len(xs))
+
+
+def select_for_exact(candidates: Sequence[RouteCandidate]) -> List[RouteCandidate]:
+    """上界仍不低於領先者下界的候選才需要精確評分；其餘以估計值回傳。
+
+    上下界保證涵蓋精確分數，被剪枝的路線精確分數必定低於領先者，不可能勝出。
+    """
+
+    estimated = [c for c in candidates if c.estimate is not None]
+    if not estimated:
+        return list(candidates)
+    leader_low = max(c.estimate.low_m2 for c in estimated)
+    selected = []
+    for candidate in candidates:
+        if candidate.estimate is None or candidate.estimate.high_m2 >= leader_low:
+            selected.append(candidate)
+            continue
+        candidate.shadow_area_m2 = candidate.estimate.shadow_area_m2
+        candidate.shadow_length_m = candidate.estimate.shadow_length_m
+        candidate.score_source = "estimate"
+    return selected
+
+
+def rank_two_phase(
+    config: ShadowRouteParams,
+    candidates: Sequence[RouteCandidate],
+    samples: int,
+) -> Dict[str, Any]:
+    """被剪枝的路線上界低於領先者下界，勝出者只從精確評分的路線中挑。
+
+    有路線沒拿到精確分數（降級評分或估計失敗）時，退回一般排序。
+    """
+
+    exact = [c for c in candidates if c.score_source == "exact"]
+    if exact and all(c.score_source in ("exact", "estimate") for c in candidates):
+        result = build_route_result(config, candidates, max(exact, key=lambda c: c.shadow_area_m2).route_id)
+    else:
+        result = rank_candidates(config, candidates)
+    result["ranking"] = {
+        "mode": "two_phase",
+        "samples": samples,
+        "exact_scored": len(exact),
+        "pruned": sum(1 for c in candidates if c.score_source == "estimate"),
+        "candidates": len(candidates),
+    }
+    return result
+
+
+def build_route_result(
+    config: ShadowRouteParams,
+    candidates: Sequence[RouteCandidate],
+    best_route_id: str | None,
+) -> Dict[str, Any]:
     return {
         "origin": {"lat": config.origin_lat, "lng": config.origin_lng},
         "destination": {"lat": config.dest_lat, "lng": config.dest_lng},
         "travel_mode": GOOGLE_TRAVEL_MODE,
-        "best_route_id": best.route_id,
+        "best_route_id": best_route_id,
         "routes": [c.to_dict() for c in candidates],
     }
 
 
-def full_shadow_coverage_routes(config: ShadowRouteParams) -> Dict[str, Any]:
-    api_key = config.resolve_api_key()
-    candidates = call_google_routes(config, api_key)
+def rank_candidates(config: ShadowRouteParams, candidates: Sequence[RouteCandidate]) -> Dict[str, Any]:
+    scored = [c for c in candidates if c.score_source != "none"]
+    if not scored:
+        # 全部未評分時沿用 Google 的排序
+        return build_route_result(config, candidates, candidates[0].route_id if candidates else None)
+    best = max(scored, key=lambda c: c.shadow_area_m2)
+    return build_route_result(config, candidates, best.route_id)
+
+
+def optimize_shadow_route(config: ShadowRouteParams) -> Dict[str, Any]:
+    candidates = fetch_route_candidates(config)
+    if config.ranking == "two_phase":
+        samples = estimate_candidates(config, candidates) if len(candidates) > 1 else 0
+        score_candidates(config, select_for_exact(candidates))
+        return rank_two_phase(config, candidates, samples)
+    score_candidates(config, candidates)
+    return rank_candidates(config, candidates)
+
+
+def apply_full_shadow_coverage(config: ShadowRouteParams, candidates: Sequence[RouteCandidate]) -> Dict[str, Any]:
+    """太陽下山時不查資料庫，直接將每條路線視為全程陰影。"""
 
     buffer_width = config.route_buffer_m * 2.0
     for candidate in candidates:
@@ -306,18 +798,23 @@ def full_shadow_coverage_routes(config: ShadowRouteParams) -> Dict[str, Any]:
         candidate.shadow_area_m2 = distance * buffer_width
         candidate.shadow_polygon_count = 0
         candidate.building_count = 0
+        candidate.score_source = "sun_down"
 
     best_route_id = candidates[0].route_id if candidates else None
-    return {
-        "origin": {"lat": config.origin_lat, "lng": config.origin_lng},
-        "destination": {"lat": config.dest_lat, "lng": config.dest_lng},
-        "travel_mode": GOOGLE_TRAVEL_MODE,
-        "best_route_id": best_route_id,
-        "routes": [c.to_dict() for c in candidates],
-    }
+    return build_route_result(config, candidates, best_route_id)
+
+
+def full_shadow_coverage_routes(config: ShadowRouteParams) -> Dict[str, Any]:
+    candidates = fetch_route_candidates(config)
+    return apply_full_shadow_coverage(config, candidates)
 
 
 def main() -> None:
+    from dotenv import load_dotenv
+
+    # 載入專案根目錄的 .env，讓 CLI 啟動方式不受 shell export 影響；
+    # 這時模組早已匯入，本模組的環境變數都要在使用時才讀取
+    load_dotenv(SRC_ROOT.parent / ".env")
     parser = build_parser()
     args = parser.parse_args()
 
@@ -330,8 +827,11 @@ def main() -> None:
         azimuth_deg=args.azimuth_deg,
         elevation_deg=args.elevation_deg,
         building_search_radius=args.building_search_radius,
+        max_shadow_length=args.max_shadow_length,
         route_buffer_m=args.route_buffer_m,
         snap_tolerance=args.snap_tolerance,
+        scoring_mode=args.scoring_mode,
+        ranking=args.ranking,
         google_routes_api_key=args.google_routes_api_key,
     )
 
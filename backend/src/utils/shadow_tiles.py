@@ -0,0 +1,505 @@
+"""預先渲染建物陰影向量圖磚（MBTiles），尖峰時段的地圖流量不必再碰 PostGIS。
+
+離線流程（`build`）：
+1. 由 `--sun` 或 `--date` + `--times` 決定要預算的太陽 bucket（同一 bucket 只算一次）。
+2. 以 `buildings` 範圍（或 `--bbox`）列出各縮放層級的 XYZ 圖磚。
+3. 多個執行緒各自持有資料庫連線，平行執行 `db/queries/shadow_tile_mvt.sql`（`ST_AsMVT`），
+   主執行緒將 gzip 後的 MVT 寫入每個 bucket 一個的 `data/tiles/shadow-<bucket>.mbtiles`。
+
+MBTiles 為單一 SQLite 檔，可直接交給 API（`GET /shadow-tiles/{bucket}/{z}/{x}/{y}.pbf`）
+或任何支援 MBTiles 的靜態圖磚伺服器。
+
+範例：
+    uv run python -m utils.shadow_tiles build --from-buildings --date 2024-07-15 --times 08:00,10:00,12:00,14:00,16:00 --zooms 14-17
+    uv run python -m utils.shadow_tiles list
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import math
+import os
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+SRC_ROOT = Path(__file__).resolve().parents[1]
+if str(SRC_ROOT) not in sys.path:
+    sys.path.append(str(SRC_ROOT))
+
+from sqlalchemy import text
+
+from db.database import get_read_session
+from db.sql import load_query
+from utils.shade_raster import DEFAULT_MAX_SHADOW_LENGTH_M, Bounds, buildings_extent
+from utils.sun_bucket import SunBucket
+from utils.twd97 import to_wgs84
+
+DEFAULT_TILES_DIR = SRC_ROOT.parent / "data" / "tiles"
+DEFAULT_ZOOMS = (14, 15, 16, 17)
+MVT_EXTENT = 4096
+MVT_BUFFER = 64
+LAYER_NAME = "shadow"
+
+MBTILES_SCHEMA = """
+CREATE TABLE metadata (name TEXT, value TEXT);
+CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB);
+CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+"""
+
+# 依請求時間挑選圖磚包時允許的太陽角度誤差（太陽每分鐘約移動 0.25°，約等於 4 分鐘）
+_SUN_MATCH_TOLERANCE_DEG = 1.0
+
+TileCoord = Tuple[int, int, int]
+
+
+def shadow_tiles_path(bucket: SunBucket, directory: Path = DEFAULT_TILES_DIR) -> Path:
+    return Path(directory) / f"shadow-{bucket.key}.mbtiles"
+
+
+# ---------------------------------------------------------------------------
+# XYZ 圖磚座標
+# ---------------------------------------------------------------------------
+
+
+def lng_lat_to_tile(lng: float, lat: float, zoom: int) -> Tuple[int, int]:
+    n = 2**zoom
+    x = int((lng + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def wgs84_bounds(bounds: Bounds) -> Tuple[float, float, float, float]:
+    """EPSG:3826 範圍四角轉成 `(west, south, east, north)`。"""
+
+    corners = [to_wgs84(x, y) for x in (bounds[0], bounds[2]) for y in (bounds[1], bounds[3])]
+    lats = [float(lat) for lat, _ in corners]
+    lngs = [float(lng) for _, lng in corners]
+    return min(lngs), min(lats), max(lngs), max(lats)
+
+
+def iter_tiles(lng_lat_bounds: Tuple[float, float, float, float], zooms: Sequence[int]) -> Iterator[TileCoord]:
+    west, south, east, north = lng_lat_bounds
+    for zoom in zooms:
+        x0, y0 = lng_lat_to_tile(west, north, zoom)
+        x1, y1 = lng_lat_to_tile(east, south, zoom)
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                yield zoom, x, y
+
+
+# ---------------------------------------------------------------------------
+# 渲染
+# ---------------------------------------------------------------------------
+
+
+def render_tile(
+    session: Any,
+    tile: TileCoord,
+    bucket: SunBucket,
+    *,
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M,
+    snap_to_grid: float = 0.05,
+) -> bytes:
+    """回傳單一圖磚的 MVT（未壓縮）；圖磚內沒有陰影時回傳空 bytes。"""
+
+    z, x, y = tile
+    row = session.execute(
+        text(load_query("shadow_tile_mvt.sql")),
+        {
+            "z": z,
+            "x": x,
+            "y": y,
+            "azimuth_deg": bucket.azimuth_deg,
+            "elevation_deg": bucket.elevation_deg,
+            "max_shadow_length": max_shadow_length,
+            "snap_to_grid": snap_to_grid,
+            "extent": MVT_EXTENT,
+            "buffer": MVT_BUFFER,
+        },
+    ).fetchone()
+    session.rollback()
+    return bytes(row.tile) if row and row.tile else b""
+
+
+class MBTilesWriter:
+    """寫入暫存檔，完成後才換名，伺服器不會讀到寫到一半的圖磚包。"""
+
+    def __init__(self, path: Path, metadata: Dict[str, str]) -> None:
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        self._tmp_path.unlink(missing_ok=True)
+        self._conn = sqlite3.connect(self._tmp_path)
+        self._conn.executescript(MBTILES_SCHEMA)
+        self._conn.executemany("INSERT INTO metadata (name, value) VALUES (?, ?)", metadata.items())
+
+    def write_tile(self, tile: TileCoord, mvt: bytes) -> None:
+        z, x, y = tile
+        # MBTiles 採 TMS 列序（y 軸由南往北）
+        self._conn.execute(
+            "INSERT OR REPLACE INTO tiles (zoom_level, tile_column, tile_row, tile_data) VALUES (?, ?, ?, ?)",
+            (z, x, (2**z - 1) - y, gzip.compress(mvt)),
+        )
+
+    def close(self) -> None:
+        self._conn.commit()
+        self._conn.close()
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._conn.close()
+        self._tmp_path.unlink(missing_ok=True)
+
+
+def _mbtiles_metadata(
+    bucket: SunBucket,
+    lng_lat_bounds: Tuple[float, float, float, float],
+    zooms: Sequence[int],
+    max_shadow_length: float,
+) -> Dict[str, str]:
+    west, south, east, north = lng_lat_bounds
+    return {
+        "name": f"shadow-{bucket.key}",
+        "format": "pbf",
+        "type": "overlay",
+        "minzoom": str(min(zooms)),
+        "maxzoom": str(max(zooms)),
+        "bounds": f"{west:.6f},{south:.6f},{east:.6f},{north:.6f}",
+        "center": f"{(west + east) / 2:.6f},{(south + north) / 2:.6f},{min(zooms)}",
+        "json": json.dumps({"vector_layers": [{"id": LAYER_NAME, "fields": {}}]}),
+        "azimuth_deg": str(bucket.azimuth_deg),
+        "elevation_deg": str(bucket.elevation_deg),
+        "max_shadow_length": str(max_shadow_length),
+    }
+
+
+@dataclass
+class BuildSummary:
+    path: str
+    bucket: str
+    tiles_total: int
+    tiles_written: int
+    seconds: float
+
+
+def build_shadow_tiles(
+    output: Path,
+    bounds: Bounds,
+    bucket: SunBucket,
+    zooms: Sequence[int],
+    *,
+    workers: int,
+    max_shadow_length: float = DEFAULT_MAX_SHADOW_LENGTH_M,
+) -> BuildSummary:
+    """以 `workers` 個資料庫連線平行渲染 `bounds`（EPSG:3826）內所有圖磚並寫成 MBTiles。"""
+
+    started = time.perf_counter()
+    lng_lat_bounds = wgs84_bounds(bounds)
+    tiles = list(iter_tiles(lng_lat_bounds, zooms))
+    writer = MBTilesWriter(output, _mbtiles_metadata(bucket, lng_lat_bounds, zooms, max_shadow_length))
+    written = 0
+
+    # 每個執行緒各自持有一個 session（一條連線），結束後統一關閉
+    local = threading.local()
+    sessions: List[Any] = []
+
+    def render(tile: TileCoord) -> Tuple[TileCoord, bytes]:
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = get_read_session()
+            sessions.append(session)
+        return tile, render_tile(session, tile, bucket, max_shadow_length=max_shadow_length)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="shadow-tiles") as executor:
+            futures = [executor.submit(render, tile) for tile in tiles]
+            for done, future in enumerate(as_completed(futures), start=1):
+                tile, mvt = future.result()
+                if mvt:
+                    writer.write_tile(tile, mvt)
+                    written += 1
+                if done % 500 == 0:
+                    print(f"[{bucket.key}] {done}/{len(tiles)} 個圖磚", flush=True)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        for session in sessions:
+            session.close()
+
+    return BuildSummary(
+        path=str(output),
+        bucket=bucket.key,
+        tiles_total=len(tiles),
+        tiles_written=written,
+        seconds=round(time.perf_counter() - started, 1),
+    )
+
+
+# ---------------------------------------------------------------------------
+# 讀取
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class TilePack:
+    key: str
+    path: str
+    azimuth_deg: float
+    elevation_deg: float
+
+
+class MBTilesReader:
+    """唯讀開啟 MBTiles；多執行緒共用同一個連線，查詢以鎖保護。"""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._conn: Optional[sqlite3.Connection] = self._connect()
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+
+    def _fetch(self, sql: str, params: Sequence[Any] = ()) -> List[Any]:
+        with self._lock:
+            if self._conn is not None:
+                return self._conn.execute(sql, params).fetchall()
+        # 已被新版 reader 取代（檔案重建），仍拿著舊 reader 的請求改用臨時連線
+        conn = self._connect()
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+    def metadata(self) -> Dict[str, str]:
+        return dict(self._fetch("SELECT name, value FROM metadata"))
+
+    def tile(self, z: int, x: int, y: int) -> Optional[bytes]:
+        """回傳 gzip 壓縮的 MVT；不存在（無陰影或超出範圍）時回傳 None。"""
+
+        rows = self._fetch(
+            "SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+            (z, x, (2**z - 1) - y),
+        )
+        return bytes(rows[0][0]) if rows else None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 每個圖磚包路徑只保留最新修改時間的 reader：(mtime_ns, reader)
+_readers: Dict[str, Tuple[int, MBTilesReader]] = {}
+_readers_lock = threading.Lock()
+
+
+def _open_reader(path: str, mtime_ns: int) -> MBTilesReader:
+    """同一檔案重新建置（修改時間改變）後關閉舊連線，換成新的 reader。"""
+
+    with _readers_lock:
+        cached = _readers.get(path)
+        if cached is not None and cached[0] == mtime_ns:
+            return cached[1]
+        reader = MBTilesReader(Path(path))
+        _readers[path] = (mtime_ns, reader)
+    if cached is not None:
+        cached[1].close()
+    return reader
+
+
+def open_tile_pack(key: str, directory: Path = DEFAULT_TILES_DIR) -> Optional[MBTilesReader]:
+    """依 bucket key 開啟圖磚包（重新建置後會依檔案修改時間換新的連線）；不存在時回傳 None。"""
+
+    path = Path(directory) / f"shadow-{key}.mbtiles"
+    try:
+        mtime_ns = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return None
+    return _open_reader(str(path), mtime_ns)
+
+
+@lru_cache(maxsize=8)
+def _pack_index(directory: str, mtime_ns: int) -> Tuple[TilePack, ...]:
+    packs = []
+    for path in sorted(Path(directory).glob("shadow-*.mbtiles")):
+        reader = open_tile_pack(path.stem[len("shadow-") :], Path(directory))
+        if reader is None:
+            continue
+        metadata = reader.metadata()
+        packs.append(
+            TilePack(
+                key=path.stem[len("shadow-") :],
+                path=str(path),
+                azimuth_deg=float(metadata["azimuth_deg"]),
+                elevation_deg=float(metadata["elevation_deg"]),
+            )
+        )
+    return tuple(packs)
+
+
+def list_tile_packs(directory: Path = DEFAULT_TILES_DIR) -> List[TilePack]:
+    """列出圖磚包；依資料夾修改時間快取（建置以 os.replace 寫入，新增或重建都會更新）。"""
+
+    try:
+        mtime_ns = Path(directory).stat().st_mtime_ns
+    except FileNotFoundError:
+        return []
+    return list(_pack_index(str(directory), mtime_ns))
+
+
+def nearest_tile_pack(
+    azimuth_deg: float,
+    elevation_deg: float,
+    directory: Path = DEFAULT_TILES_DIR,
+    *,
+    tolerance_deg: float = _SUN_MATCH_TOLERANCE_DEG,
+) -> Optional[TilePack]:
+    """找出太陽角度最接近的圖磚包；方位角與仰角差距都需在 `tolerance_deg` 內。"""
+
+    best: Optional[TilePack] = None
+    best_distance = math.inf
+    for pack in list_tile_packs(directory):
+        d_az = abs((pack.azimuth_deg - azimuth_deg + 180.0) % 360.0 - 180.0)
+        d_el = abs(pack.elevation_deg - elevation_deg)
+        if d_az > tolerance_deg or d_el > tolerance_deg:
+            continue
+        distance = math.hypot(d_az, d_el)
+        if distance < best_distance:
+            best, best_distance = pack, distance
+    return best
+
+
+# ---------------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------------
+
+
+def _parse_bounds(value: str) -> Bounds:
+    parts = [float(item) for item in value.split(",")]
+    if len(parts) != 4:
+        raise argparse.ArgumentTypeError("--bbox 格式為 min_x,min_y,max_x,max_y（EPSG:3826）")
+    return parts[0], parts[1], parts[2], parts[3]
+
+
+def _parse_zooms(value: str) -> List[int]:
+    zooms: List[int] = []
+    for item in value.split(","):
+        if "-" in item:
+            start, end = (int(part) for part in item.split("-"))
+            zooms.extend(range(start, end + 1))
+        elif item.strip():
+            zooms.append(int(item))
+    return sorted(set(zooms))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="預先渲染建物陰影向量圖磚（MBTiles）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="依太陽 bucket 渲染圖磚包")
+    area = build.add_mutually_exclusive_group(required=True)
+    area.add_argument("--bbox", type=_parse_bounds, help="EPSG:3826 範圍 min_x,min_y,max_x,max_y")
+    area.add_argument("--from-buildings", action="store_true", help="使用 buildings 資料表的完整範圍")
+    sun = build.add_mutually_exclusive_group(required=True)
+    sun.add_argument("--sun", action="append", help="直接指定太陽角度 azimuth,elevation（度），可重複")
+    sun.add_argument("--date", help="日期 YYYY-MM-DD，搭配 --times 以範圍中心計算太陽位置")
+    build.add_argument("--times", default="08:00,10:00,12:00,14:00,16:00", help="--date 當天的時間（逗號分隔）")
+    build.add_argument("--timezone", default="Asia/Taipei", help="--date/--times 所屬時區")
+    build.add_argument("--zooms", type=_parse_zooms, default=list(DEFAULT_ZOOMS), help="縮放層級，例如 14-17 或 15,17")
+    build.add_argument(
+        "--max-shadow-length",
+        type=float,
+        default=DEFAULT_MAX_SHADOW_LENGTH_M,
+        help="單棟建物陰影長度上限（公尺）",
+    )
+    build.add_argument(
+        "--workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="平行渲染的資料庫連線數（不宜超過連線池上限）",
+    )
+    build.add_argument("--output-dir", default=str(DEFAULT_TILES_DIR), help="輸出資料夾")
+
+    listing = sub.add_parser("list", help="列出已建置的圖磚包")
+    listing.add_argument("--output-dir", default=str(DEFAULT_TILES_DIR), help="圖磚包資料夾")
+    return parser
+
+
+def _resolve_buckets(args: argparse.Namespace, bounds: Bounds) -> List[SunBucket]:
+    if args.sun:
+        angles = [tuple(float(item) for item in value.split(",")) for value in args.sun]
+    else:
+        import pandas as pd
+        from pvlib import solarposition
+
+        center_lat, center_lng = to_wgs84((bounds[0] + bounds[2]) / 2.0, (bounds[1] + bounds[3]) / 2.0)
+        times = pd.DatetimeIndex(
+            [pd.Timestamp(f"{args.date}T{value.strip()}") for value in args.times.split(",") if value.strip()]
+        ).tz_localize(args.timezone)
+        solpos = solarposition.get_solarposition(
+            times,
+            latitude=float(center_lat),
+            longitude=float(center_lng),
+            altitude=20.0,
+            pressure=101325.0,
+            temperature=25.0,
+        )
+        angles = list(zip(solpos["azimuth"].to_numpy(), solpos["elevation"].to_numpy()))
+
+    buckets: List[SunBucket] = []
+    for azimuth, elevation in angles:
+        if elevation <= 0:
+            print(f"略過太陽在地平線下的角度 ({azimuth:.2f}, {elevation:.2f})", flush=True)
+            continue
+        bucket = SunBucket.from_angles(float(azimuth), float(elevation))
+        if bucket not in buckets:
+            buckets.append(bucket)
+    if not buckets:
+        raise ValueError("沒有任何太陽在地平線上的時間點，無需建置")
+    return buckets
+
+
+def main() -> None:
+    parser = build_parser()
+    args = parser.parse_args()
+
+    if args.command == "list":
+        packs = [asdict(pack) for pack in list_tile_packs(Path(args.output_dir))]
+        print(json.dumps(packs, ensure_ascii=False, indent=2))
+        return
+
+    if not args.zooms or args.workers < 1:
+        parser.error("--zooms 不可為空，--workers 必須為正整數")
+    try:
+        bounds = buildings_extent() if args.from_buildings else args.bbox
+        buckets = _resolve_buckets(args, bounds)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    for bucket in buckets:
+        summary = build_shadow_tiles(
+            shadow_tiles_path(bucket, Path(args.output_dir)),
+            bounds,
+            bucket,
+            args.zooms,
+            workers=args.workers,
+            max_shadow_length=args.max_shadow_length,
+        )
+        print(json.dumps(asdict(summary), ensure_ascii=False, indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    main()
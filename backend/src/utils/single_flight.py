@@ -0,0 +1,73 @@
+"""Coalesce identical in-flight computations into a single execution."""
+
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    executions: int = 0
+    deduplicated: int = 0
+    failures: int = 0
+
+
+class SingleFlight:
+    """Run at most one computation per key; concurrent callers share its result.
+
+    Callers are shielded from each other: a waiter that is cancelled (e.g. the
+    client disconnected) does not cancel the shared computation.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.stats = SingleFlightStats()
+        self._inflight: Dict[Hashable, asyncio.Future[Any]] = {}
+        _REGISTRY[name] = self
+
+    async def do(self, key: Hashable, func: Callable[[], Awaitable[T]]) -> T:
+        self.stats.calls += 1
+        existing = self._inflight.get(key)
+        if existing is not None:
+            self.stats.deduplicated += 1
+            return await asyncio.shield(existing)
+
+        task = asyncio.ensure_future(func())
+        self._inflight[key] = task
+        self.stats.executions += 1
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future[Any]) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # 取出例外，避免所有等待者都取消時出現 "exception was never retrieved"
+        if not task.cancelled() and task.exception() is not None:
+            self.stats.failures += 1
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def snapshot(self) -> Dict[str, int]:
+        return {
+            "calls": self.stats.calls,
+            "executions": self.stats.executions,
+            "deduplicated": self.stats.deduplicated,
+            "failures": self.stats.failures,
+            "in_flight": self.in_flight,
+        }
+
+
+_REGISTRY: Dict[str, SingleFlight] = {}
+
+
+def single_flight_stats() -> Dict[str, Dict[str, int]]:
+    """Return counters for every registered single-flight group."""
+
+    return {name: group.snapshot() for name, group in _REGISTRY.items()}
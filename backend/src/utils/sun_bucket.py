@@ -0,0 +1,48 @@
+"""Quantize solar angles into shared "sun buckets".
+
+Requests whose sun position falls into the same bucket produce visually
+identical shadows, so caching and request-coalescing layers key on the bucket
+and compute shadows with the bucket's representative angles.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+# 太陽每分鐘約移動 0.25°；0.5° 的方位角與 0.25° 的仰角約等於 1～2 分鐘
+AZIMUTH_STEP_DEG = 0.5
+ELEVATION_STEP_DEG = 0.25
+
+
+def quantize(value: float, step: float) -> float:
+    """Snap ``value`` to the nearest multiple of ``step``."""
+
+    if step <= 0:
+        return value
+    return round(round(value / step) * step, 6)
+
+
+@dataclass(frozen=True)
+class SunBucket:
+    azimuth_deg: float
+    elevation_deg: float
+
+    @classmethod
+    def from_angles(
+        cls,
+        azimuth_deg: float,
+        elevation_deg: float,
+        *,
+        azimuth_step: float = AZIMUTH_STEP_DEG,
+        elevation_step: float = ELEVATION_STEP_DEG,
+    ) -> "SunBucket":
+        azimuth = quantize(azimuth_deg % 360.0, azimuth_step) % 360.0
+        elevation = quantize(elevation_deg, elevation_step)
+        if elevation_deg > 0 >= elevation:
+            # 日出/日落前後不能讓 bucket 把太陽壓到地平線下（tan(0) 會讓陰影長度爆掉）
+            elevation = elevation_deg
+        return cls(azimuth_deg=azimuth, elevation_deg=elevation)
+
+    @property
+    def key(self) -> str:
+        return f"a{self.azimuth_deg:.2f}_e{self.elevation_deg:.2f}"
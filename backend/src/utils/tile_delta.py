@@ -0,0 +1,76 @@
+"""Per-tile dissolved shadow and its difference from the previous sun bucket.
+
+Used by the live shadow subscription: each watched XYZ tile keeps the WKB of
+its current shadow, and when the sun bucket advances
+``live_shadow_tile.sql`` returns the new shadow together with the
+``added`` and ``removed`` parts, so only the change is sent to clients.
+"""
+
+from __future__ import annotations
+
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+
+from db.database import get_read_session
+from db.sql import load_query
+from utils.shadow_tiles import TileCoord
+from utils.sun_bucket import SunBucket
+
+# GeoJSON 座標小數位數，7 位約 1 cm
+GEOJSON_PRECISION = 7
+
+
+@dataclass
+class TileShadow:
+    shadow_wkb: Optional[bytes]
+    shadow: Optional[Dict[str, Any]]
+    added: Optional[Dict[str, Any]]
+    removed: Optional[Dict[str, Any]]
+
+
+def _geojson(value: Optional[str]) -> Optional[Dict[str, Any]]:
+    return json.loads(value) if value else None
+
+
+def compute_tile_delta(
+    tile: TileCoord,
+    bucket: SunBucket,
+    previous_wkb: Optional[bytes],
+    *,
+    max_shadow_length: float,
+    snap_to_grid: float = 0.05,
+) -> TileShadow:
+    """計算圖磚在 `bucket` 的陰影；`previous_wkb` 為 None 時 added 即整塊陰影。"""
+
+    z, x, y = tile
+    session = get_read_session()
+    try:
+        row = session.execute(
+            text(load_query("live_shadow_tile.sql")),
+            {
+                "z": z,
+                "x": x,
+                "y": y,
+                "azimuth_deg": bucket.azimuth_deg,
+                "elevation_deg": bucket.elevation_deg,
+                "max_shadow_length": max_shadow_length,
+                "snap_to_grid": snap_to_grid,
+                "previous_wkb": previous_wkb,
+                "precision": GEOJSON_PRECISION,
+            },
+        ).fetchone()
+        session.rollback()
+    finally:
+        session.close()
+
+    if row is None:
+        return TileShadow(None, None, None, None)
+    return TileShadow(
+        shadow_wkb=bytes(row.shadow_wkb) if row.shadow_wkb is not None else None,
+        shadow=_geojson(row.shadow),
+        added=_geojson(row.added),
+        removed=_geojson(row.removed),
+    )
@@ -0,0 +1,116 @@
+"""WGS84 <-> TWD97 TM2 (EPSG:3826) conversion without a PROJ dependency.
+
+The database stores building geometry in EPSG:3826. Python-side fast paths
+(raster lookups, route sampling) need the same planar coordinates, so this
+module implements the Transverse Mercator series (Snyder, *Map Projections:
+A Working Manual*, pp. 61-64) for the GRS80 ellipsoid. Accuracy is well below
+a centimetre inside Taiwan. Functions accept floats or NumPy arrays.
+"""
+
+from __future__ import annotations
+
+from typing import Tuple, TypeVar
+
+import numpy as np
+
+ArrayLike = TypeVar("ArrayLike", float, np.ndarray)
+
+# GRS80 / TWD97 TM2 121 度分帶參數
+_A = 6_378_137.0
+_F = 1.0 / 298.257222101
+_E2 = _F * (2.0 - _F)
+_EP2 = _E2 / (1.0 - _E2)
+_K0 = 0.9999
+_LON0 = np.radians(121.0)
+_FALSE_EASTING = 250_000.0
+_FALSE_NORTHING = 0.0
+
+_E4 = _E2 * _E2
+_E6 = _E4 * _E2
+_M1 = 1.0 - _E2 / 4.0 - 3.0 * _E4 / 64.0 - 5.0 * _E6 / 256.0
+_M2 = 3.0 * _E2 / 8.0 + 3.0 * _E4 / 32.0 + 45.0 * _E6 / 1024.0
+_M3 = 15.0 * _E4 / 256.0 + 45.0 * _E6 / 1024.0
+_M4 = 35.0 * _E6 / 3072.0
+_E1 = (1.0 - np.sqrt(1.0 - _E2)) / (1.0 + np.sqrt(1.0 - _E2))
+
+
+def _meridian_arc(phi: ArrayLike) -> ArrayLike:
+    return _A * (
+        _M1 * phi
+        - _M2 * np.sin(2.0 * phi)
+        + _M3 * np.sin(4.0 * phi)
+        - _M4 * np.sin(6.0 * phi)
+    )
+
+
+def to_twd97(lat: ArrayLike, lng: ArrayLike) -> Tuple[ArrayLike, ArrayLike]:
+    """Convert WGS84 latitude/longitude (degrees) to EPSG:3826 ``(x, y)`` metres."""
+
+    phi = np.radians(lat)
+    lam = np.radians(lng)
+    sin_phi = np.sin(phi)
+    cos_phi = np.cos(phi)
+    tan_phi = np.tan(phi)
+
+    n = _A / np.sqrt(1.0 - _E2 * sin_phi * sin_phi)
+    t = tan_phi * tan_phi
+    c = _EP2 * cos_phi * cos_phi
+    a = (lam - _LON0) * cos_phi
+    a2 = a * a
+
+    x = _FALSE_EASTING + _K0 * n * (
+        a
+        + (1.0 - t + c) * a2 * a / 6.0
+        + (5.0 - 18.0 * t + t * t + 72.0 * c - 58.0 * _EP2) * a2 * a2 * a / 120.0
+    )
+    y = _FALSE_NORTHING + _K0 * (
+        _meridian_arc(phi)
+        + n
+        * tan_phi
+        * (
+            a2 / 2.0
+            + (5.0 - t + 9.0 * c + 4.0 * c * c) * a2 * a2 / 24.0
+            + (61.0 - 58.0 * t + t * t + 600.0 * c - 330.0 * _EP2) * a2 * a2 * a2 / 720.0
+        )
+    )
+    return x, y
+
+
+def to_wgs84(x: ArrayLike, y: ArrayLike) -> Tuple[ArrayLike, ArrayLike]:
+    """Convert EPSG:3826 ``(x, y)`` metres back to WGS84 ``(lat, lng)`` degrees."""
+
+    mu = ((y - _FALSE_NORTHING) / _K0) / (_A * _M1)
+    phi1 = (
+        mu
+        + (3.0 * _E1 / 2.0 - 27.0 * _E1**3 / 32.0) * np.sin(2.0 * mu)
+        + (21.0 * _E1**2 / 16.0 - 55.0 * _E1**4 / 32.0) * np.sin(4.0 * mu)
+        + (151.0 * _E1**3 / 96.0) * np.sin(6.0 * mu)
+        + (1097.0 * _E1**4 / 512.0) * np.sin(8.0 * mu)
+    )
+    sin_phi1 = np.sin(phi1)
+    cos_phi1 = np.cos(phi1)
+    tan_phi1 = np.tan(phi1)
+
+    c1 = _EP2 * cos_phi1 * cos_phi1
+    t1 = tan_phi1 * tan_phi1
+    denom = 1.0 - _E2 * sin_phi1 * sin_phi1
+    n1 = _A / np.sqrt(denom)
+    r1 = _A * (1.0 - _E2) / (denom * np.sqrt(denom))
+    d = (x - _FALSE_EASTING) / (n1 * _K0)
+    d2 = d * d
+
+    phi = phi1 - (n1 * tan_phi1 / r1) * (
+        d2 / 2.0
+        - (5.0 + 3.0 * t1 + 10.0 * c1 - 4.0 * c1 * c1 - 9.0 * _EP2) * d2 * d2 / 24.0
+        + (61.0 + 90.0 * t1 + 298.0 * c1 + 45.0 * t1 * t1 - 252.0 * _EP2 - 3.0 * c1 * c1)
+        * d2
+        * d2
+        * d2
+        / 720.0
+    )
+    lam = _LON0 + (
+        d
+        - (1.0 + 2.0 * t1 + c1) * d2 * d / 6.0
+        + (5.0 - 2.0 * c1 + 28.0 * t1 - 3.0 * c1 * c1 + 8.0 * _EP2 + 24.0 * t1 * t1) * d2 * d2 * d / 120.0
+    ) / cos_phi1
+    return np.degrees(phi), np.degrees(lam)
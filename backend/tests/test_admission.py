@@ -0,0 +1,89 @@
+import asyncio
+import threading
+
+import pytest
+
+from api.admission import OverCapacityError, WorkloadPool
+
+
+def _blocking(release: threading.Event, started: threading.Event | None = None):
+    def work():
+        if started is not None:
+            started.set()
+        release.wait(5)
+        return "done"
+
+    return work
+
+
+def test_rejects_when_workers_and_queue_are_full():
+    pool = WorkloadPool("test-reject", max_workers=1, queue_depth=1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.ensure_future(pool.run(_blocking(release)))
+        queued = asyncio.ensure_future(pool.run(_blocking(release)))
+        await asyncio.sleep(0.05)
+        assert pool.running == 1 and pool.queued == 1
+        with pytest.raises(OverCapacityError) as info:
+            await pool.run(_blocking(release))
+        assert info.value.retry_after_s >= 1
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    try:
+        assert asyncio.run(main()) == ["done", "done"]
+    finally:
+        pool.shutdown()
+    assert pool.stats.rejected == 1
+    assert pool.stats.completed == 2
+
+
+def test_cancelled_caller_keeps_slot_until_worker_finishes():
+    pool = WorkloadPool("test-cancel", max_workers=1, queue_depth=0)
+    release = threading.Event()
+    started = threading.Event()
+
+    async def main():
+        task = asyncio.ensure_future(pool.run(_blocking(release, started)))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 呼叫端已放棄，但 worker 還在跑：名額不能釋放
+        assert pool.running == 1
+        with pytest.raises(OverCapacityError):
+            await pool.run(_blocking(release))
+        release.set()
+        for _ in range(100):
+            if pool.running == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert pool.running == 0
+        return await pool.run(lambda: "next")
+
+    try:
+        assert asyncio.run(main()) == "next"
+    finally:
+        pool.shutdown()
+    assert pool.stats.completed == 2
+    assert pool.stats.rejected == 1
+
+
+def test_failures_are_counted_and_propagated():
+    pool = WorkloadPool("test-failure", max_workers=1, queue_depth=0)
+
+    def boom():
+        raise ValueError("boom")
+
+    async def main():
+        with pytest.raises(ValueError):
+            await pool.run(boom)
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert pool.stats.failed == 1
+    assert pool.running == 0
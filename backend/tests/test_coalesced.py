@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from api.routes.shadow import _coalesced
+from utils.deadline import Deadline, DeadlineExceeded
+from utils.single_flight import SingleFlight
+
+
+def _compute_for(deadline, calls):
+    async def compute():
+        calls.append(deadline.budget_ms)
+        await asyncio.sleep(0.02)
+        return {"degraded": deadline.budget_ms < 100}
+
+    return compute
+
+
+def _run(*deadlines, fail_small=False):
+    flight = SingleFlight(f"test-coalesced-{time.monotonic_ns()}")
+    calls = []
+
+    def compute_for(deadline):
+        if not fail_small:
+            return _compute_for(deadline, calls)
+
+        async def compute():
+            calls.append(deadline.budget_ms)
+            await asyncio.sleep(0.02)
+            if deadline.budget_ms < 100:
+                raise DeadlineExceeded("tiny budget")
+            return {"degraded": False}
+
+        return compute
+
+    async def main():
+        tasks = []
+        for deadline in deadlines:
+            tasks.append(
+                asyncio.ensure_future(_coalesced(flight, "k", deadline, compute_for(deadline), min_retry_s=0.5))
+            )
+            await asyncio.sleep(0)
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    return asyncio.run(main()), calls
+
+
+def test_followers_share_a_good_result():
+    results, calls = _run(Deadline(5000), Deadline(5000), Deadline(5000))
+    assert results == [{"degraded": False}] * 3
+    assert calls == [5000]
+
+
+def test_follower_recomputes_degraded_result_with_its_own_budget():
+    results, calls = _run(Deadline(1), Deadline(5000))
+    assert results[0] == {"degraded": True}
+    assert results[1] == {"degraded": False}
+    assert calls == [1, 5000]
+
+
+def test_follower_without_budget_keeps_degraded_result():
+    results, calls = _run(Deadline(1), Deadline(200))
+    assert results == [{"degraded": True}, {"degraded": True}]
+    assert calls == [1]
+
+
+def test_follower_retries_after_leader_timeout():
+    results, calls = _run(Deadline(1), Deadline(5000), fail_small=True)
+    assert isinstance(results[0], DeadlineExceeded)
+    assert results[1] == {"degraded": False}
+    assert calls == [1, 5000]
+
+
+def test_leader_errors_are_not_retried():
+    flight = SingleFlight("test-coalesced-error")
+
+    async def boom():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(_coalesced(flight, "k", Deadline(5000), boom, min_retry_s=0.5))
@@ -0,0 +1,86 @@
+import time
+
+import pytest
+
+from utils.deadline import (
+    MIN_STATEMENT_TIMEOUT_MS,
+    Deadline,
+    DeadlineExceeded,
+    is_statement_timeout,
+    set_statement_timeout,
+)
+
+
+@pytest.fixture(autouse=True)
+def _budget_env(monkeypatch):
+    monkeypatch.setenv("REQUEST_BUDGET_MS", "15000")
+    monkeypatch.setenv("REQUEST_BUDGET_MAX_MS", "60000")
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (None, 15000),
+        ("", 15000),
+        ("2500", 2500),
+        ("2500.9", 2500),
+        ("999999", 60000),
+        ("0", 1),
+        ("-50", 1),
+        ("abc", 15000),
+        ("nan", 15000),
+        ("inf", 15000),
+        ("-inf", 15000),
+        ("1e400", 15000),
+    ],
+)
+def test_from_header(header, expected):
+    assert Deadline.from_header(header).budget_ms == expected
+
+
+def test_timeout_respects_cap_and_reserve():
+    deadline = Deadline(budget_ms=10_000)
+    assert deadline.timeout_s(cap_s=2.0) == pytest.approx(2.0)
+    assert deadline.timeout_s(reserve_s=4.0) == pytest.approx(6.0, abs=0.05)
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout_s(reserve_s=10.0)
+    with pytest.raises(DeadlineExceeded):
+        deadline.timeout_s(min_s=11.0)
+
+
+def test_expired_deadline():
+    deadline = Deadline(budget_ms=1, started_at=time.monotonic() - 1.0)
+    assert deadline.remaining_s() == 0.0
+    assert deadline.elapsed_ms() >= 1000.0
+    with pytest.raises(DeadlineExceeded):
+        deadline.statement_timeout_ms()
+
+
+def test_statement_timeout_is_never_zero():
+    # PostgreSQL 把 0 視為不限時
+    deadline = Deadline(budget_ms=10_000, started_at=time.monotonic() - 9.9999)
+    assert deadline.statement_timeout_ms() >= MIN_STATEMENT_TIMEOUT_MS
+
+
+def test_set_statement_timeout_is_transaction_local():
+    calls = []
+
+    class Session:
+        def execute(self, statement, params):
+            calls.append((str(statement), params))
+
+    set_statement_timeout(Session(), 1234)
+    sql, params = calls[0]
+    assert "set_config('statement_timeout'" in sql and "true" in sql
+    assert params == {"timeout": "1234ms"}
+
+
+def test_is_statement_timeout():
+    class Orig:
+        sqlstate = "57014"
+
+    class Wrapped(Exception):
+        orig = Orig()
+
+    assert is_statement_timeout(Wrapped())
+    assert not is_statement_timeout(ValueError())
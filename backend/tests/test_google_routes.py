@@ -0,0 +1,45 @@
+import pytest
+
+from loadtest.routes_stub import StubConfig, start_stub
+from utils.shadow_route_optimizer import ShadowRouteParams, call_google_routes
+
+PARAMS = ShadowRouteParams(origin_lat=25.0330, origin_lng=121.5654, dest_lat=25.0375, dest_lng=121.5637)
+
+
+@pytest.fixture
+def stub():
+    server, stats = start_stub(StubConfig(latency_ms=0, latency_jitter_ms=0, alternatives=2), port=0)
+    yield f"http://127.0.0.1:{server.server_address[1]}/directions/v2:computeRoutes", stats
+    server.shutdown()
+    server.server_close()
+
+
+def test_endpoint_is_read_at_call_time(stub, monkeypatch):
+    # 模組匯入之後才設定（CLI 在 main() 才載入 .env）
+    endpoint, stats = stub
+    monkeypatch.setenv("GOOGLE_ROUTES_ENDPOINT", endpoint)
+
+    candidates = call_google_routes(PARAMS, "stub", timeout_s=5)
+
+    assert stats.requests == 1
+    assert [c.route_id for c in candidates] == ["route_1", "route_2"]
+    assert all(c.wkt.startswith("LINESTRING") for c in candidates)
+
+
+def test_cli_uses_endpoint_from_dotenv(stub, tmp_path, monkeypatch, capsys):
+    from utils import shadow_route_optimizer
+
+    endpoint, stats = stub
+    (tmp_path / ".env").write_text(f"GOOGLE_ROUTES_ENDPOINT={endpoint}\nGOOGLE_ROUTES_API_KEY=stub\n")
+    # setenv 再 delenv：測試結束時會把 main() 載入的值一併清掉
+    for name in ("GOOGLE_ROUTES_ENDPOINT", "GOOGLE_ROUTES_API_KEY"):
+        monkeypatch.setenv(name, "")
+        monkeypatch.delenv(name)
+    monkeypatch.setattr(shadow_route_optimizer, "SRC_ROOT", tmp_path / "src")
+    monkeypatch.setattr(shadow_route_optimizer, "score_candidates", lambda config, candidates: None)
+    monkeypatch.setattr("sys.argv", ["shadow_route_optimizer", "25.0330", "121.5654", "25.0375", "121.5637"])
+
+    shadow_route_optimizer.main()
+
+    assert stats.requests == 1
+    assert '"best_route_id": "route_1"' in capsys.readouterr().out
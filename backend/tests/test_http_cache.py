@@ -0,0 +1,119 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import http_cache
+from utils.sun_bucket import SunBucket
+
+
+@pytest.mark.parametrize("value", [25.02177, 121.53512, -33.86785, 0.00011, 179.99995])
+def test_snap_is_idempotent(value):
+    snapped = http_cache.snap_coord(value)
+    assert http_cache.snap_coord(snapped) == snapped
+    assert abs(snapped - value) <= http_cache.CANONICAL_GRID_DEG / 2 + 1e-12
+    assert float(http_cache.format_coord(snapped)) == snapped
+
+
+def test_canonical_radius_covers_request_and_is_stable():
+    lat, lng = 25.02177, 121.53512
+    snapped = http_cache.snap_coord(lat), http_cache.snap_coord(lng)
+    offset = http_cache.snap_offset_m(lat, lng, *snapped)
+    radius = http_cache.canonical_radius(60.0, offset)
+    assert radius >= 60.0 + offset
+    assert radius % http_cache.RADIUS_STEP_M == 0
+    # 已在格點上的中心沒有偏移，同一個半徑不再改變
+    assert http_cache.canonical_radius(radius, 0.0) == radius
+
+
+def test_canonical_radius_is_capped():
+    assert http_cache.canonical_radius(http_cache.MAX_RADIUS_M, 12.0) == http_cache.MAX_RADIUS_M
+
+
+def test_sun_key_round_trip():
+    key = http_cache.sun_key(132.62, 34.05)
+    assert key == SunBucket.from_angles(132.62, 34.05).key
+    assert http_cache.parse_sun_key(key) == (key, SunBucket.from_angles(132.62, 34.05))
+    assert http_cache.sun_key(200.0, -1.0) == http_cache.NIGHT
+    assert http_cache.parse_sun_key("night") == ("night", None)
+
+
+@pytest.mark.parametrize("value", ["", "a132.5_e34.00", "a400.00_e10.00", "sunny", "a1.00_e1.00x"])
+def test_parse_sun_key_rejects_malformed(value):
+    assert http_cache.parse_sun_key(value) is None
+
+
+def test_parse_sun_key_normalizes_off_grid_angles():
+    key, bucket = http_cache.parse_sun_key("a132.60_e34.10")
+    assert key == "a132.50_e34.00"
+    assert bucket == SunBucket(132.5, 34.0)
+
+
+def test_etag_matching():
+    etag = http_cache.make_etag("10:2024", "/shadow-area?lat=1")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert etag != http_cache.make_etag("11:2024", "/shadow-area?lat=1")
+    assert http_cache.etag_matches(etag, etag)
+    assert http_cache.etag_matches(f'"other", W/{etag}', etag)
+    assert http_cache.etag_matches("*", etag)
+    assert not http_cache.etag_matches(None, etag)
+    assert not http_cache.etag_matches('"other"', etag)
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    import main
+    from api.routes import shadow
+
+    async def version():
+        return "test-version"
+
+    def fake_area(params, deadline=None):
+        return {"feature_collection": {"type": "FeatureCollection", "features": []}, "building_count": 0}
+
+    monkeypatch.setattr(http_cache, "buildings_version", version)
+    monkeypatch.setattr(shadow, "compute_shadow_geojson", fake_area)
+    # 不進 lifespan：結束時會關掉全域的執行緒池，後續測試就不能再用
+    return TestClient(main.app)
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"lat": "25.02177", "lng": "121.53512", "radius_m": "60", "sun": "a132.60_e34.10"},
+        {"lat": "25.02177", "lng": "121.53512", "radius_m": "1999", "max_shadow_length_m": "995", "sun": "night"},
+    ],
+)
+def test_canonical_url_is_a_fixed_point(client, params):
+    first = client.get("/shadow-area", params=params, follow_redirects=False)
+    assert first.status_code == 308
+    canonical = first.headers["location"]
+    second = client.get(canonical, follow_redirects=False)
+    assert second.status_code == 200
+    assert "ETag" in second.headers
+
+    query = parse_qs(urlsplit(canonical).query)
+    assert int(query["radius_m"][0]) <= http_cache.MAX_RADIUS_M
+
+    revalidated = client.get(canonical, headers={"If-None-Match": second.headers["ETag"]}, follow_redirects=False)
+    assert revalidated.status_code == 304
+
+
+def test_buildings_version_is_cached(monkeypatch):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        return f"v{len(calls)}"
+
+    monkeypatch.setattr(http_cache, "_fetch_buildings_version", fetch)
+    monkeypatch.setitem(http_cache._version_cache, "value", None)
+    monkeypatch.setenv("BUILDINGS_VERSION_TTL_S", "60")
+
+    async def main():
+        return [await http_cache.buildings_version() for _ in range(3)]
+
+    assert asyncio.run(main()) == ["v1", "v1", "v1"]
+    assert len(calls) == 1
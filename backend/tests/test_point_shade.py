@@ -0,0 +1,68 @@
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from api.schemas import PointShadeRequest
+from utils.point_shade import available_poi_sets, load_poi_set
+
+
+@pytest.mark.parametrize("name", ["toliet", "water_dispenser"])
+def test_default_poi_sets_load_and_validate(monkeypatch, name):
+    monkeypatch.delenv("POI_DATA_DIR", raising=False)
+
+    points = load_poi_set(name)
+
+    assert name in available_poi_sets()
+    assert len(points) > 100
+    assert len({point.id for point in points}) == len(points)
+    # 前端圖層都在台北市內
+    assert all(24.9 < point.lat < 25.2 and 121.4 < point.lng < 121.7 for point in points)
+
+
+def test_poi_dir_override_skips_non_point_features(tmp_path, monkeypatch):
+    features = [
+        {"type": "Feature", "id": "kiosk", "geometry": {"type": "Point", "coordinates": [121.5, 25.0]}},
+        {"type": "Feature", "properties": {"id": 7}, "geometry": {"type": "Point", "coordinates": [121.6, 25.1, 12.0]}},
+        {"type": "Feature", "geometry": {"type": "LineString", "coordinates": [[121.5, 25.0], [121.6, 25.1]]}},
+        {"type": "Feature", "geometry": {"type": "Point", "coordinates": [121.7, 25.2]}},
+    ]
+    (tmp_path / "stalls.geojson").write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+    monkeypatch.setenv("POI_DATA_DIR", str(tmp_path))
+
+    points = load_poi_set("stalls")
+
+    assert available_poi_sets() == ["stalls"]
+    assert [(point.id, point.lat, point.lng) for point in points] == [
+        ("kiosk", 25.0, 121.5),
+        ("7", 25.1, 121.6),
+        ("3", 25.2, 121.7),
+    ]
+
+
+@pytest.mark.parametrize("name", ["missing", "../toliet", ".hidden", ""])
+def test_unknown_or_unsafe_poi_sets_are_not_loaded(name):
+    assert load_poi_set(name) is None
+
+
+def _request(**kwargs):
+    return PointShadeRequest(timestamp="2024-07-15T12:00:00+08:00", **kwargs)
+
+
+def test_request_takes_points_or_poi_set():
+    assert _request(poi_set="toliet").points is None
+    assert _request(points=[{"lat": 25.03, "lng": 121.56}]).poi_set is None
+    # 空清單也算有提供 points
+    assert _request(points=[]).points == []
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {},
+        {"poi_set": "toliet", "points": [{"lat": 25.03, "lng": 121.56}]},
+    ],
+)
+def test_request_rejects_neither_or_both(kwargs):
+    with pytest.raises(ValidationError, match="points 與 poi_set 需擇一提供"):
+        _request(**kwargs)
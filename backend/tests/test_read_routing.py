@@ -0,0 +1,107 @@
+from types import SimpleNamespace
+
+import pytest
+
+from db import database
+from db.database import choose_read_endpoint, primary_endpoint, read_endpoints
+
+
+@pytest.fixture
+def endpoints(monkeypatch):
+    monkeypatch.setenv("PGHOST", "primary")
+    monkeypatch.setenv("PGPORT", "5432")
+    monkeypatch.setenv("PGREAD_HOSTS", "replica-a:5433, replica-b")
+    monkeypatch.setenv("PGPOOL_SIZE", "4")
+    monkeypatch.setenv("PGREAD_COOLDOWN_S", "30")
+    primary_endpoint.cache_clear()
+    read_endpoints.cache_clear()
+    yield read_endpoints()
+    primary_endpoint.cache_clear()
+    read_endpoints.cache_clear()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(database.time, "monotonic", lambda: now.value)
+    return now
+
+
+def test_read_hosts_are_parsed_with_default_port(endpoints):
+    assert [(e.host, e.port, e.role) for e in endpoints] == [("replica-a", 5433, "replica"), ("replica-b", 5432, "replica")]
+
+
+def test_primary_listed_as_read_host_is_shared(monkeypatch, endpoints):
+    monkeypatch.setenv("PGREAD_HOSTS", "primary,replica-a")
+    read_endpoints.cache_clear()
+
+    assert read_endpoints()[0] is primary_endpoint()
+
+
+def test_no_read_hosts_falls_back_to_primary(monkeypatch, endpoints):
+    monkeypatch.setenv("PGREAD_HOSTS", "")
+    read_endpoints.cache_clear()
+
+    assert choose_read_endpoint() is primary_endpoint()
+
+
+def test_least_busy_endpoint_wins(endpoints):
+    a, b = endpoints
+    a.active_sessions, b.active_sessions = 3, 1
+
+    assert {choose_read_endpoint() for _ in range(4)} == {b}
+
+    a.active_sessions = 0
+    assert choose_read_endpoint() is a
+
+
+def test_ties_rotate_between_endpoints(endpoints):
+    picks = [choose_read_endpoint() for _ in range(4)]
+
+    assert set(picks) == set(endpoints)
+    assert picks[0] is not picks[1]
+
+
+def test_failed_endpoint_cools_down(endpoints, clock):
+    a, b = endpoints
+    b.active_sessions = 3
+    a.mark_failed("connection refused")
+
+    assert not a.healthy
+    assert a.failures == 1 and a.last_error == "connection refused"
+    assert {choose_read_endpoint() for _ in range(4)} == {b}
+
+    clock.value += 30.0
+    assert a.healthy
+    assert choose_read_endpoint() is a
+
+
+def test_all_endpoints_cooling_down_use_primary(endpoints, clock):
+    for endpoint in endpoints:
+        endpoint.mark_failed("down")
+
+    assert choose_read_endpoint() is primary_endpoint()
+
+
+def test_only_connection_errors_trigger_cooldown(endpoints):
+    a, _ = endpoints
+
+    a._on_error(SimpleNamespace(connection=object(), is_disconnect=False, original_exception="statement timeout"))
+    assert a.healthy
+
+    a._on_error(SimpleNamespace(connection=object(), is_disconnect=True, original_exception="server closed"))
+    assert not a.healthy
+    assert a.last_error == "server closed"
+
+
+def test_sessions_count_towards_load_until_closed(endpoints):
+    a, _ = endpoints
+
+    session = a.session()
+    assert a.active_sessions == 1
+    assert a.load() == pytest.approx(0.25)
+
+    session.close()
+    session.close()
+    assert a.active_sessions == 0
+    assert a.sessions_total == 1
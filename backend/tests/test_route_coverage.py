@@ -0,0 +1,125 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from benchmarks.synthetic_city import encode_polyline
+from utils import route_coverage
+from utils.route_coverage import CorridorShadow, CoverageRoute, chunked, coverage_result, score_coverage_chunk
+
+ROUTE = [(25.0330, 121.5654), (25.0340, 121.5660), (25.0352, 121.5648)]
+
+
+def test_decode_valid_route():
+    route = CoverageRoute.decode("a", encode_polyline(ROUTE))
+
+    assert route.error is None
+    assert route.coordinates == ROUTE
+    assert route.wkt.startswith("LINESTRING (121.5654 25.033")
+    assert route.length_m() > 0
+
+
+@pytest.mark.parametrize(
+    "coords",
+    [
+        [(25.0330, 121.5654), (95.0, 121.5660)],
+        [(25.0330, 121.5654), (25.0340, 181.0)],
+    ],
+)
+def test_decode_rejects_out_of_range_coordinates(coords):
+    route = CoverageRoute.decode("bad", encode_polyline(coords))
+
+    assert route.wkt is None
+    assert route.error == "路徑座標超出經緯度範圍"
+
+
+def test_decode_rejects_truncated_polyline():
+    route = CoverageRoute.decode("bad", encode_polyline(ROUTE)[:-1])
+
+    assert route.wkt is None
+    assert route.error
+
+
+def test_chunked_keeps_order_and_sizes():
+    routes = [CoverageRoute(f"r{i}", []) for i in range(7)]
+
+    chunks = chunked(routes, 3)
+
+    assert [len(chunk) for chunk in chunks] == [3, 3, 1]
+    assert [route.route_id for chunk in chunks for route in chunk] == [f"r{i}" for i in range(7)]
+    assert chunked([], 3) == []
+
+
+def test_coverage_result_clamps_and_rounds():
+    assert coverage_result("a", 200.0, 50.123) == {
+        "route_id": "a",
+        "total_length_m": 200.0,
+        "shaded_length_m": 50.12,
+        "coverage_percent": 25.06,
+    }
+    assert coverage_result("a", 100.0, 100.0001)["coverage_percent"] == 100.0
+    assert coverage_result("a", 0.0, 0.0)["coverage_percent"] == 0.0
+
+
+def test_score_chunk_matches_rows_by_route_id(monkeypatch):
+    calls = []
+
+    class FakeSession:
+        def execute(self, statement, params):
+            calls.append(params)
+            return SimpleNamespace(
+                fetchall=lambda: [SimpleNamespace(route_id="b", total_length_m=80.0, shaded_length_m=20.0)]
+            )
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            pass
+
+    monkeypatch.setattr(route_coverage, "get_read_session", FakeSession)
+    routes = [CoverageRoute.decode(route_id, encode_polyline(ROUTE)) for route_id in ("a", "b")]
+
+    results = score_coverage_chunk(routes, CorridorShadow(b"wkb", 1, 1))
+
+    assert calls[0]["route_ids"] == ["a", "b"]
+    assert calls[0]["shadow_wkb"] == b"wkb"
+    assert results[0] == {"route_id": "a", "error": "資料庫未回傳此路線的結果"}
+    assert results[1]["coverage_percent"] == 25.0
+
+
+def test_batch_reports_bad_route_on_its_own_line(monkeypatch):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    import main
+    from api.routes import shadow
+
+    corridors = []
+
+    def fake_corridor(routes, params):
+        corridors.append([route.route_id for route in routes])
+        return CorridorShadow(b"wkb", 1, 1)
+
+    def fake_chunk(routes, corridor):
+        return [coverage_result(route.route_id, 100.0, 40.0) for route in routes]
+
+    monkeypatch.setattr(shadow, "compute_corridor_shadow", fake_corridor)
+    monkeypatch.setattr(shadow, "score_coverage_chunk", fake_chunk)
+    body = {
+        "routes": [
+            {"route_id": "good", "encoded_polyline": encode_polyline(ROUTE)},
+            {"route_id": "bad", "encoded_polyline": encode_polyline([(25.0330, 121.5654), (95.0, 121.5660)])},
+        ],
+        "timestamp": "2024-07-15T12:00:00+08:00",
+    }
+
+    # 不進 lifespan：結束時會關掉全域的執行緒池
+    response = TestClient(main.app).post("/shadow-coverage/batch", json=body)
+
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    routes = {line["route_id"]: line for line in lines if line["type"] == "route"}
+    assert corridors == [["good"]]
+    assert routes["bad"]["error"] == "路徑座標超出經緯度範圍"
+    assert routes["good"]["coverage_percent"] == 40.0
+    assert lines[-1] == {"type": "done", "route_count": 2}
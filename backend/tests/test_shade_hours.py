@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from utils import shade_hours
+from utils.shade_hours import (
+    Grid,
+    ShadeHoursConfig,
+    SunSlot,
+    run_shade_hours,
+    sample_times,
+    sun_slots,
+    tile_checkpoint_path,
+)
+
+CELL = 10.0
+
+
+def _config(**kwargs):
+    defaults = dict(
+        run_id="test",
+        start_date="2024-07-01",
+        end_date="2024-07-01",
+        timezone="Asia/Taipei",
+        bounds=(0.0, 0.0, 40.0, 40.0),
+        cell_size=CELL,
+        tile_cells=2,
+    )
+    defaults.update(kwargs)
+    return ShadeHoursConfig(**defaults)
+
+
+def _square(x0, y0, x1, y1):
+    return [np.array([(x0, y0), (x1, y0), (x1, y1), (x0, y1), (x0, y0)], dtype=float)]
+
+
+# 兩個 bucket 的陰影在 (1, 0) 這格重疊
+SLOTS = [SunSlot(90.0, 30.0, 30.0), SunSlot(270.0, 30.0, 15.0)]
+SHADOWS = {90.0: _square(0, 0, 20, 10), 270.0: _square(10, 0, 30, 10)}
+
+
+class FakeSession:
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def fetches(monkeypatch):
+    calls = []
+
+    def fetch(session, bounds, bucket, max_shadow_length):
+        calls.append((bounds, bucket.azimuth_deg))
+        rings = SHADOWS[bucket.azimuth_deg]
+        x0, y0 = rings[0].min(axis=0)
+        x1, y1 = rings[0].max(axis=0)
+        # 只回傳和 tile 範圍相交的陰影，與 SQL 相同
+        if x1 <= bounds[0] or x0 >= bounds[2] or y1 <= bounds[1] or y0 >= bounds[3]:
+            return []
+        return [rings]
+
+    monkeypatch.setattr(shade_hours, "sun_slots", lambda config: (SLOTS, 12.0))
+    monkeypatch.setattr(shade_hours, "fetch_shadow_rings", fetch)
+    monkeypatch.setattr(shade_hours, "get_read_session", FakeSession)
+    # 以執行緒代替 process，monkeypatch 才會生效
+    monkeypatch.setattr(shade_hours, "ProcessPoolExecutor", ThreadPoolExecutor)
+    monkeypatch.setattr(shade_hours, "_init_worker", lambda: None)
+    return calls
+
+
+def test_sample_times_weights_cover_every_day():
+    config = _config(start_date="2024-07-01", end_date="2024-07-05", step_minutes=30, day_stride=2)
+
+    times, weights = sample_times(config)
+
+    # 取樣日 7/1、7/3、7/5，各代表 2、2、1 天
+    assert len(times) == 3 * 48
+    assert str(times[0].tz) == "Asia/Taipei"
+    assert weights.sum() == pytest.approx(5 * 24 * 60)
+    assert set(weights[:48]) == {60.0} and set(weights[-48:]) == {30.0}
+
+
+def test_sun_slots_minutes_add_up_to_daylight():
+    bounds = (302000.0, 2770000.0, 306000.0, 2774000.0)  # 台北市中心
+    config = _config(bounds=bounds, start_date="2024-07-01", end_date="2024-07-02")
+
+    slots, daylight_hours = sun_slots(config)
+
+    assert 13.0 < daylight_hours < 14.0
+    assert sum(slot.minutes for slot in slots) / 60.0 / config.days == pytest.approx(daylight_hours)
+    assert all(slot.elevation_deg > 0 for slot in slots)
+    assert len({(slot.azimuth_deg, slot.elevation_deg) for slot in slots}) == len(slots)
+
+
+def test_grid_tiles_cover_every_cell():
+    grid = Grid.from_bounds((5.0, -5.0, 45.0, 25.0), CELL)
+
+    assert (grid.min_cx, grid.min_cy, grid.nx, grid.ny) == (0, -1, 5, 4)
+    covered = np.zeros((grid.ny, grid.nx), dtype=int)
+    for tx, ty in grid.tiles(2):
+        col0, row0, cols, rows = grid.tile_window(tx, ty, 2)
+        covered[row0 : row0 + rows, col0 : col0 + cols] += 1
+    assert (covered == 1).all()
+
+
+def test_build_sums_bucket_minutes_per_cell(tmp_path, fetches):
+    config = _config(start_date="2024-07-01", end_date="2024-07-02")
+
+    summary = run_shade_hours(config, tmp_path, workers=2)
+
+    assert summary.tiles_total == 4 and summary.tiles_resumed == 0
+    with np.load(summary.output) as data:
+        hours = data["shade_hours"]
+        assert float(data["daylight_hours"]) == 12.0
+        assert tuple(data["origin"]) == (0.0, 0.0)
+    # slot 的分鐘數是整段期間的總和：30、45、15 分鐘攤到兩天
+    assert hours[0, :4] == pytest.approx([0.25, 0.375, 0.125, 0.0])
+    assert not hours[1:].any()
+
+
+def test_build_resumes_from_tile_checkpoints(tmp_path, fetches):
+    config = _config()
+    run_dir = tmp_path / config.run_id
+    # 先跑一次建立資料夾與 manifest，再換掉其中一個 tile 的檢查點
+    run_shade_hours(config, tmp_path, workers=1)
+    np.save(tile_checkpoint_path(run_dir, 1, 1), np.full((2, 2), 120.0, dtype=np.float32))
+    tile_checkpoint_path(run_dir, 0, 0).unlink()
+    fetches.clear()
+
+    summary = run_shade_hours(config, tmp_path, workers=1)
+
+    assert summary.tiles_resumed == 3
+    assert {bounds for bounds, _ in fetches} == {(0.0, 0.0, 20.0, 20.0)}
+    with np.load(summary.output) as data:
+        hours = data["shade_hours"]
+    assert hours[0, :2] == pytest.approx([0.5, 0.75])
+    assert hours[2:, 2:] == pytest.approx(np.full((2, 2), 2.0))
+
+
+def test_build_refuses_a_run_dir_with_other_settings(tmp_path, fetches):
+    run_shade_hours(_config(), tmp_path, workers=1)
+
+    with pytest.raises(ValueError, match="不同設定"):
+        run_shade_hours(_config(cell_size=5.0), tmp_path, workers=1)
@@ -0,0 +1,145 @@
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from utils import shade_raster
+from utils.shade_raster import (
+    ShadeRaster,
+    ShadeRasterWriter,
+    list_shade_rasters,
+    nearest_shade_raster,
+    open_shade_raster,
+    rasterize_rings,
+    shade_raster_path,
+)
+from utils.sun_bucket import SunBucket
+
+TILE = 16
+CELL = 1.0
+# 遠離原點的 tile，確認負數與大座標的 tile 索引都正確
+ORIGIN_TILE = (15000, 170000)
+
+
+def _write(path, masks, *, bucket=SunBucket(180.0, 45.0)):
+    writer = ShadeRasterWriter(path, cell_size=CELL, tile_size=TILE, metadata={"bucket": {"key": bucket.key}})
+    for (tx, ty), mask in masks.items():
+        writer.write_tile(tx, ty, mask)
+    writer.close()
+
+
+def _square_mask():
+    mask = np.zeros((TILE, TILE), dtype=bool)
+    rasterize_rings(mask, [np.array([[4.0, 4.0], [12.0, 4.0], [12.0, 12.0], [4.0, 12.0], [4.0, 4.0]])], 0.0, 0.0, CELL)
+    return mask
+
+
+def test_rasterize_square_marks_inside_cells():
+    mask = _square_mask()
+    assert mask.sum() == 64
+    assert mask[4:12, 4:12].all()
+
+
+def test_round_trip_point_and_polyline_lookups(tmp_path):
+    path = tmp_path / "shade.vshd"
+    tx, ty = ORIGIN_TILE
+    _write(path, {(tx, ty): _square_mask(), (tx + 1, ty): np.zeros((TILE, TILE), dtype=bool)})
+
+    x0, y0 = tx * TILE * CELL, ty * TILE * CELL
+    with ShadeRaster(path) as raster:
+        assert raster.tile_count == 1  # 空 tile 不寫入
+        assert raster.is_shaded_xy(x0 + 8.5, y0 + 8.5)
+        assert not raster.is_shaded_xy(x0 + 1.5, y0 + 1.5)
+        assert not raster.is_shaded_xy(x0 + TILE + 8.5, y0 + 8.5)
+
+        xs = x0 + np.array([0.5, 4.5, 11.5, 12.5])
+        ys = np.full(4, y0 + 8.5)
+        assert raster.sample_xy(xs, ys).tolist() == [False, True, True, False]
+
+        line = raster.polyline_shade_xy(np.array([x0, x0 + TILE]), np.array([y0 + 8.5, y0 + 8.5]))
+        assert line.length_m == pytest.approx(TILE)
+        assert line.shaded_m == pytest.approx(8.0)
+
+
+def test_rejects_non_raster_file(tmp_path):
+    path = tmp_path / "bogus.vshd"
+    path.write_bytes(b"not a raster at all" * 4)
+    with pytest.raises(ValueError):
+        ShadeRaster(path)
+
+
+def test_tile_cache_is_safe_across_threads(tmp_path):
+    path = tmp_path / "shade.vshd"
+    masks = {(tx, 0): _square_mask() for tx in range(8)}
+    _write(path, masks)
+    raster = ShadeRaster(path, cache_tiles=2)
+    errors = []
+
+    def worker(offset):
+        try:
+            for step in range(300):
+                tx = (offset + step) % 8
+                assert raster.is_shaded_xy(tx * TILE + 8.5, 8.5)
+        except Exception as exc:  # pragma: no cover - 只在競態時發生
+            errors.append(exc)
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    raster.close()
+    assert errors == []
+
+
+def test_open_cache_reloads_rebuilt_file(tmp_path):
+    path = tmp_path / "shade.vshd"
+    _write(path, {(0, 0): _square_mask()})
+    first = open_shade_raster(path)
+    assert open_shade_raster(path) is first
+    assert first.is_shaded_xy(8.5, 8.5)
+
+    _write(path, {(0, 0): np.zeros((TILE, TILE), dtype=bool) | np.eye(TILE, dtype=bool)})
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    second = open_shade_raster(path)
+    assert second is not first
+    assert not second.is_shaded_xy(8.5, 9.5)
+    assert open_shade_raster(tmp_path / "missing.vshd") is None
+
+
+def test_nearest_raster_within_tolerance(tmp_path):
+    exact = SunBucket(132.5, 34.0)
+    other = SunBucket(140.0, 34.0)
+    for bucket in (exact, other):
+        _write(shade_raster_path(bucket, tmp_path), {(0, 0): _square_mask()}, bucket=bucket)
+
+    assert sorted(bucket.key for _, bucket in list_shade_rasters(tmp_path)) == [exact.key, other.key]
+    found = nearest_shade_raster(132.83, 34.2, tmp_path)
+    assert found is not None and found.path == shade_raster_path(exact, tmp_path)
+    assert nearest_shade_raster(136.0, 34.0, tmp_path) is None
+    assert nearest_shade_raster(132.5, 35.5, tmp_path) is None
+    assert nearest_shade_raster(132.5, 34.0, tmp_path / "missing") is None
+
+
+def test_nearest_raster_wraps_azimuth(tmp_path):
+    bucket = SunBucket(359.5, 10.0)
+    _write(shade_raster_path(bucket, tmp_path), {(0, 0): _square_mask()}, bucket=bucket)
+    assert nearest_shade_raster(0.2, 10.0, tmp_path) is not None
+
+
+def test_listing_picks_up_new_files(tmp_path):
+    assert list_shade_rasters(tmp_path) == []
+    bucket = SunBucket(90.0, 20.0)
+    _write(shade_raster_path(bucket, tmp_path), {(0, 0): _square_mask()}, bucket=bucket)
+    stat = tmp_path.stat()
+    os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert [found for _, found in list_shade_rasters(tmp_path)] == [bucket]
+
+
+@pytest.fixture(autouse=True)
+def _reset_open_rasters():
+    shade_raster._OPEN_RASTERS.clear()
+    yield
+    shade_raster._OPEN_RASTERS.clear()
@@ -0,0 +1,104 @@
+import gzip
+import os
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from utils import shadow_tiles
+from utils.shadow_tiles import MBTilesWriter, iter_tiles, lng_lat_to_tile, nearest_tile_pack, open_tile_pack
+from utils.sun_bucket import SunBucket
+
+
+def _write_pack(directory, azimuth, elevation, tiles=()):
+    bucket = SunBucket(azimuth, elevation)
+    writer = MBTilesWriter(
+        shadow_tiles.shadow_tiles_path(bucket, directory),
+        {"azimuth_deg": str(azimuth), "elevation_deg": str(elevation)},
+    )
+    for tile, mvt in tiles:
+        writer.write_tile(tile, mvt)
+    writer.close()
+    return bucket
+
+
+def test_lng_lat_to_tile():
+    assert lng_lat_to_tile(0.0, 0.0, 0) == (0, 0)
+    assert lng_lat_to_tile(0.1, -0.1, 1) == (1, 1)
+    assert lng_lat_to_tile(-0.1, 0.1, 1) == (0, 0)
+    # 台北 101
+    assert lng_lat_to_tile(121.5654, 25.0330, 15) == (27449, 14029)
+
+
+def test_lng_lat_to_tile_clamps_to_the_grid():
+    assert lng_lat_to_tile(180.0, -89.9, 3) == (7, 7)
+    assert lng_lat_to_tile(-180.0, 89.9, 3) == (0, 0)
+
+
+def test_iter_tiles_covers_bounds_at_every_zoom():
+    bounds = (121.50, 25.00, 121.56, 25.05)
+    tiles = list(iter_tiles(bounds, [14, 15]))
+
+    for zoom in (14, 15):
+        x0, y0 = lng_lat_to_tile(bounds[0], bounds[3], zoom)
+        x1, y1 = lng_lat_to_tile(bounds[2], bounds[1], zoom)
+        level = [(x, y) for z, x, y in tiles if z == zoom]
+        assert len(level) == (x1 - x0 + 1) * (y1 - y0 + 1)
+        assert set(level) == {(x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)}
+    assert len(tiles) == len(set(tiles))
+
+
+def test_mbtiles_rows_are_flipped_to_tms(tmp_path):
+    bucket = _write_pack(tmp_path, 132.5, 34.0, [((15, 27449, 14029), b"mvt")])
+
+    path = shadow_tiles.shadow_tiles_path(bucket, tmp_path)
+    with sqlite3.connect(path) as conn:
+        rows = conn.execute("SELECT zoom_level, tile_column, tile_row FROM tiles").fetchall()
+    assert rows == [(15, 27449, 2**15 - 1 - 14029)]
+
+    reader = open_tile_pack(bucket.key, tmp_path)
+    assert gzip.decompress(reader.tile(15, 27449, 14029)) == b"mvt"
+    assert reader.tile(15, 27449, 2**15 - 1 - 14029) is None
+
+
+def test_nearest_tile_pack(tmp_path):
+    _write_pack(tmp_path, 132.5, 34.0)
+    _write_pack(tmp_path, 133.5, 34.0)
+    _write_pack(tmp_path, 0.5, 20.0)
+
+    assert nearest_tile_pack(132.8, 34.1, tmp_path).azimuth_deg == 132.5
+    assert nearest_tile_pack(133.2, 34.1, tmp_path).azimuth_deg == 133.5
+    # 方位角跨過正北
+    assert nearest_tile_pack(359.8, 20.0, tmp_path).azimuth_deg == 0.5
+    assert nearest_tile_pack(132.5, 35.5, tmp_path) is None
+    assert nearest_tile_pack(90.0, 34.0, tmp_path) is None
+    assert nearest_tile_pack(132.5, 34.0, tmp_path / "missing") is None
+
+
+def test_rebuilt_pack_replaces_and_closes_the_old_reader(tmp_path):
+    bucket = _write_pack(tmp_path, 132.5, 34.0, [((14, 1, 1), b"old")])
+    old = open_tile_pack(bucket.key, tmp_path)
+    assert open_tile_pack(bucket.key, tmp_path) is old
+
+    _write_pack(tmp_path, 132.5, 34.0, [((14, 1, 1), b"new")])
+    path = shadow_tiles.shadow_tiles_path(bucket, tmp_path)
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    new = open_tile_pack(bucket.key, tmp_path)
+
+    assert new is not old
+    assert old._conn is None
+    assert gzip.decompress(new.tile(14, 1, 1)) == b"new"
+    # 仍拿著舊 reader 的請求改用臨時連線讀到新檔
+    assert gzip.decompress(old.tile(14, 1, 1)) == b"new"
+
+
+@pytest.mark.parametrize("z", [-1, 23])
+def test_tile_endpoint_rejects_out_of_range_zoom(monkeypatch, z):
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+    import main
+
+    # 不進 lifespan：結束時會關掉全域的執行緒池
+    response = TestClient(main.app).get(f"/shadow-tiles/a132.50_e34.00/{z}/0/0.pbf")
+
+    assert response.status_code == 422
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from utils.single_flight import SingleFlight
+
+
+def test_concurrent_callers_share_one_execution():
+    group = SingleFlight("test-share")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(group.do("k", compute) for _ in range(5)))
+
+    assert asyncio.run(main()) == [1] * 5
+    assert calls == 1
+    assert group.stats.executions == 1
+    assert group.stats.deduplicated == 4
+    assert group.in_flight == 0
+
+
+def test_different_keys_run_separately():
+    group = SingleFlight("test-keys")
+
+    async def main():
+        return await asyncio.gather(group.do("a", _value("a")), group.do("b", _value("b")))
+
+    assert asyncio.run(main()) == ["a", "b"]
+    assert group.stats.executions == 2
+
+
+def test_leader_failure_reaches_every_waiter():
+    group = SingleFlight("test-failure")
+
+    async def boom():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        return await asyncio.gather(*(group.do("k", boom) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert group.stats.executions == 1
+    assert group.stats.failures == 1
+    assert group.in_flight == 0
+
+
+def test_failure_is_not_cached():
+    group = SingleFlight("test-retry")
+    attempts = 0
+
+    async def flaky():
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("first")
+        return "ok"
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            await group.do("k", flaky)
+        return await group.do("k", flaky)
+
+    assert asyncio.run(main()) == "ok"
+    assert attempts == 2
+
+
+def test_cancelled_waiter_does_not_cancel_shared_computation():
+    group = SingleFlight("test-cancel")
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    async def main():
+        first = asyncio.ensure_future(group.do("k", slow))
+        second = asyncio.ensure_future(group.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(main()) == "done"
+    assert group.stats.executions == 1
+
+
+def _value(value):
+    async def compute():
+        await asyncio.sleep(0.01)
+        return value
+
+    return compute
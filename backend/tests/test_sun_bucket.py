@@ -0,0 +1,32 @@
+import pytest
+
+from utils.sun_bucket import SunBucket, quantize
+
+
+def test_quantize_snaps_to_nearest_step():
+    assert quantize(132.62, 0.5) == 132.5
+    assert quantize(132.76, 0.5) == 133.0
+    assert quantize(34.13, 0.25) == 34.25
+    assert quantize(1.23, 0) == 1.23
+
+
+def test_nearby_angles_share_a_bucket():
+    first = SunBucket.from_angles(132.62, 34.05)
+    second = SunBucket.from_angles(132.70, 33.95)
+    assert first == second
+    assert first.key == "a132.50_e34.00"
+
+
+def test_azimuth_wraps_around_north():
+    assert SunBucket.from_angles(359.9, 10.0).azimuth_deg == 0.0
+    assert SunBucket.from_angles(-0.2, 10.0).azimuth_deg == 0.0
+
+
+@pytest.mark.parametrize("elevation", [0.05, 0.1, 0.12])
+def test_low_sun_never_quantizes_below_horizon(elevation):
+    assert SunBucket.from_angles(250.0, elevation).elevation_deg == pytest.approx(elevation)
+
+
+def test_custom_steps():
+    bucket = SunBucket.from_angles(133.1, 34.4, azimuth_step=2.0, elevation_step=1.0)
+    assert bucket == SunBucket(134.0, 34.0)
@@ -0,0 +1,161 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from api import live_shadow
+from api.live_shadow import LiveShadowHub, Subscriber, TileState
+from utils import tile_delta
+from utils.sun_bucket import SunBucket
+from utils.tile_delta import GEOJSON_PRECISION, TileShadow, compute_tile_delta
+
+TILE = (16, 54900, 28040)
+BUCKET = SunBucket(135.0, 40.0)
+SQUARE = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    calls = SimpleNamespace(params=[], row=None, closed=0)
+
+    class FakeSession:
+        def execute(self, statement, params):
+            calls.params.append(params)
+            return SimpleNamespace(fetchone=lambda: calls.row)
+
+        def rollback(self):
+            pass
+
+        def close(self):
+            calls.closed += 1
+
+    monkeypatch.setattr(tile_delta, "get_read_session", FakeSession)
+    return calls
+
+
+def test_params_carry_tile_bucket_and_previous_shadow(db):
+    compute_tile_delta(TILE, BUCKET, b"previous", max_shadow_length=300.0)
+
+    assert db.params == [
+        {
+            "z": 16,
+            "x": 54900,
+            "y": 28040,
+            "azimuth_deg": 135.0,
+            "elevation_deg": 40.0,
+            "max_shadow_length": 300.0,
+            "snap_to_grid": 0.05,
+            "previous_wkb": b"previous",
+            "precision": GEOJSON_PRECISION,
+        }
+    ]
+    assert db.closed == 1
+
+
+def test_row_is_parsed_into_tile_shadow(db):
+    db.row = SimpleNamespace(
+        shadow_wkb=memoryview(b"\x01\x03"),
+        shadow=json.dumps(SQUARE),
+        added=json.dumps(SQUARE),
+        removed="",
+    )
+
+    result = compute_tile_delta(TILE, BUCKET, None, max_shadow_length=300.0)
+
+    # psycopg2 回傳 memoryview，狀態裡要存成 bytes 才能當下一輪的參數
+    assert result.shadow_wkb == b"\x01\x03" and isinstance(result.shadow_wkb, bytes)
+    assert result.shadow == SQUARE
+    assert result.added == SQUARE
+    assert result.removed is None
+
+
+def test_empty_tile_has_no_shadow(db):
+    db.row = SimpleNamespace(shadow_wkb=None, shadow=None, added=None, removed=json.dumps(SQUARE))
+
+    result = compute_tile_delta(TILE, BUCKET, b"previous", max_shadow_length=300.0)
+
+    assert result == TileShadow(None, None, None, SQUARE)
+
+
+def test_missing_row_gives_empty_tile_shadow(db):
+    assert compute_tile_delta(TILE, BUCKET, b"previous", max_shadow_length=300.0) == TileShadow(None, None, None, None)
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    computed = []
+
+    def fake_delta(tile, bucket, previous_wkb, *, max_shadow_length):
+        computed.append((bucket.key, previous_wkb))
+        wkb = bucket.key.encode()
+        return TileShadow(wkb, {"bucket": bucket.key}, {"added": bucket.key}, {"removed": previous_wkb and previous_wkb.decode()})
+
+    async def run(func):
+        return func()
+
+    monkeypatch.setattr(live_shadow, "compute_tile_delta", fake_delta)
+    monkeypatch.setattr(live_shadow.db_pool, "run", run)
+    hub = LiveShadowHub(
+        zoom=16,
+        max_tiles=4,
+        tick_s=60.0,
+        queue_size=8,
+        max_shadow_length=300.0,
+        concurrency=1,
+        sun_location=(25.03, 121.56),
+    )
+    hub.computed = computed
+    return hub
+
+
+def _messages(subscriber):
+    messages = []
+    while not subscriber.queue.empty():
+        messages.append(json.loads(subscriber.queue.get_nowait()))
+    return messages
+
+
+def test_hub_diffs_each_bucket_against_the_previous_one(hub):
+    first, second = SunBucket(135.0, 40.0), SunBucket(137.5, 40.0)
+    state = TileState()
+    subscriber = Subscriber(8)
+    state.subscribers.add(subscriber)
+
+    async def advance(bucket):
+        hub._sun = (bucket.key, bucket)
+        await hub._advance(TILE, state)
+
+    asyncio.run(advance(first))
+    asyncio.run(advance(second))
+
+    # 第二個 bucket 以第一個 bucket 的陰影為基準求差異
+    assert hub.computed == [(first.key, None), (second.key, first.key.encode())]
+    assert state.sun == second.key and state.shadow_wkb == second.key.encode()
+    snapshot, delta = _messages(subscriber)
+    assert snapshot == {"type": "snapshot", "tile": "16/54900/28040", "sun": first.key, "shadow": {"bucket": first.key}}
+    assert delta == {
+        "type": "delta",
+        "tile": "16/54900/28040",
+        "sun": second.key,
+        "previous_sun": first.key,
+        "added": {"added": second.key},
+        "removed": {"removed": first.key},
+    }
+    assert hub.stats.tile_computations == 2
+    assert (hub.stats.snapshots_sent, hub.stats.deltas_sent) == (1, 1)
+
+
+def test_hub_night_removes_the_whole_shadow_without_querying(hub):
+    day = SunBucket(135.0, 40.0)
+    state = TileState(sun=day.key, shadow_wkb=b"day", shadow=SQUARE)
+    subscriber = Subscriber(8)
+    state.subscribers.add(subscriber)
+    hub._sun = (live_shadow.NIGHT, None)
+
+    asyncio.run(hub._advance(TILE, state))
+
+    assert hub.computed == []
+    assert (state.sun, state.shadow_wkb, state.shadow) == (live_shadow.NIGHT, None, None)
+    (delta,) = _messages(subscriber)
+    assert delta["added"] is None and delta["removed"] == SQUARE
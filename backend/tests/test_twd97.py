@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+from utils.twd97 import to_twd97, to_wgs84
+
+pyproj = pytest.importorskip("pyproj")
+
+# 台灣本島南北兩端、東西兩側與台北市區
+POINTS = np.array(
+    [
+        (25.0217746, 121.5351267),
+        (25.2992, 121.5370),
+        (21.9000, 120.8530),
+        (23.5, 120.0),
+        (24.0, 121.65),
+        (22.7, 121.15),
+    ]
+)
+
+
+def test_forward_matches_pyproj():
+    transformer = pyproj.Transformer.from_crs("EPSG:4326", "EPSG:3826", always_xy=True)
+    expected_x, expected_y = transformer.transform(POINTS[:, 1], POINTS[:, 0])
+    x, y = to_twd97(POINTS[:, 0], POINTS[:, 1])
+    np.testing.assert_allclose(x, expected_x, atol=0.01)
+    np.testing.assert_allclose(y, expected_y, atol=0.01)
+
+
+def test_inverse_matches_pyproj():
+    transformer = pyproj.Transformer.from_crs("EPSG:3826", "EPSG:4326", always_xy=True)
+    x, y = to_twd97(POINTS[:, 0], POINTS[:, 1])
+    expected_lng, expected_lat = transformer.transform(x, y)
+    lat, lng = to_wgs84(x, y)
+    np.testing.assert_allclose(lat, expected_lat, atol=1e-7)
+    np.testing.assert_allclose(lng, expected_lng, atol=1e-7)
+
+
+def test_round_trip_scalar():
+    x, y = to_twd97(25.0217746, 121.5351267)
+    lat, lng = to_wgs84(float(x), float(y))
+    assert lat == pytest.approx(25.0217746, abs=1e-8)
+    assert lng == pytest.approx(121.5351267, abs=1e-8)
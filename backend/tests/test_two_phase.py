@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from utils.shadow_route_optimizer import (
+    RouteCandidate,
+    ShadeEstimate,
+    route_samples_xy,
+    select_for_exact,
+    shade_estimate,
+)
+
+HALF_WIDTH = 3.0
+
+
+def _classify(samples, rects, slack=0.01):
+    """與 route_sample_shade.sql 相同的判斷，陰影以軸對齊矩形 (x0, y0, x1, y1) 表示。"""
+
+    xs, ys = samples.xs, samples.ys
+    radius = np.broadcast_to((samples.radii + slack)[:, None], xs.shape)
+    shaded = np.zeros(xs.shape, dtype=bool)
+    near = np.zeros(xs.shape, dtype=bool)
+    covered = np.zeros(xs.shape, dtype=bool)
+    for x0, y0, x1, y1 in rects:
+        inside = (xs >= x0) & (xs <= x1) & (ys >= y0) & (ys <= y1)
+        gap = np.hypot(np.maximum(0, np.maximum(x0 - xs, xs - x1)), np.maximum(0, np.maximum(y0 - ys, ys - y1)))
+        edge = np.minimum(np.minimum(xs - x0, x1 - xs), np.minimum(ys - y0, y1 - ys))
+        shaded |= inside
+        near |= gap <= radius
+        covered |= inside & (edge >= radius)
+    return shaded, np.where(shaded, covered, ~near)
+
+
+def _exact_area(xs, ys, rects, step=0.05):
+    """在細格網上量 `endcap=flat join=round` 緩衝區內的陰影面積。"""
+
+    pad = HALF_WIDTH + 1
+    gx, gy = np.meshgrid(
+        np.arange(min(xs) - pad, max(xs) + pad, step) + step / 2,
+        np.arange(min(ys) - pad, max(ys) + pad, step) + step / 2,
+    )
+    in_buffer = np.zeros(gx.shape, dtype=bool)
+    for ax, ay, bx, by in zip(xs[:-1], ys[:-1], xs[1:], ys[1:]):
+        length = np.hypot(bx - ax, by - ay)
+        ux, uy = (bx - ax) / length, (by - ay) / length
+        along = (gx - ax) * ux + (gy - ay) * uy
+        across = -(gx - ax) * uy + (gy - ay) * ux
+        in_buffer |= (along >= 0) & (along <= length) & (np.abs(across) <= HALF_WIDTH)
+    for vx, vy in zip(xs[1:-1], ys[1:-1]):
+        in_buffer |= np.hypot(gx - vx, gy - vy) <= HALF_WIDTH
+    in_shadow = np.zeros(gx.shape, dtype=bool)
+    for x0, y0, x1, y1 in rects:
+        in_shadow |= (gx >= x0) & (gx <= x1) & (gy >= y0) & (gy <= y1)
+    return float((in_buffer & in_shadow).sum()) * step * step
+
+
+def _estimate(xs, ys, rects, **kwargs):
+    samples = route_samples_xy(np.asarray(xs, float), np.asarray(ys, float), HALF_WIDTH, **kwargs)
+    return shade_estimate(samples, *_classify(samples, rects))
+
+
+def _candidate(route_id, estimate):
+    return RouteCandidate(route_id, "", [], None, None, None, "", estimate=estimate)
+
+
+def _stripes():
+    # 100 m 直線路徑，每 10 m 一條 4 m 寬的陰影，剛好落在 10 m 取樣排之間
+    return [(10 * k - 2, -10, 10 * k + 2, 10) for k in range(11)]
+
+
+def test_stripes_between_sample_rows_stay_within_bounds():
+    estimate = _estimate([0, 100], [0, 0], _stripes(), spacing_m=10, lanes=3)
+
+    assert estimate.shadow_area_m2 == 0
+    assert estimate.low_m2 <= 240 <= estimate.high_m2
+
+
+def test_stripes_between_sample_rows_are_not_pruned():
+    striped = _candidate("striped", _estimate([0, 100], [0, 0], _stripes(), spacing_m=10, lanes=3))
+    leader = _candidate("leader", ShadeEstimate(200.0, 40.0, 200.0, 220.0))
+
+    assert [c.route_id for c in select_for_exact([leader, striped])] == ["leader", "striped"]
+
+
+def test_route_samples_partition_the_route_rectangles():
+    samples = route_samples_xy(np.array([0.0, 25.0, 25.0]), np.array([0.0, 0.0, 18.0]), HALF_WIDTH, spacing_m=8, lanes=3)
+
+    assert samples.length_m == pytest.approx(43.0)
+    assert samples.xs.shape == (4 + 3, 3)
+    assert (samples.cell_len * samples.lane_width * 3).sum() == pytest.approx(2 * HALF_WIDTH * 43.0)
+    assert samples.join_area_m2 == pytest.approx(HALF_WIDTH**2 * np.pi / 4)
+    assert samples.overlap_m2 == pytest.approx(HALF_WIDTH**2)
+
+
+def test_fully_covered_route_has_tight_bounds():
+    estimate = _estimate([0, 100], [0, 0], [(-50, -50, 150, 50)])
+
+    assert estimate.low_m2 == pytest.approx(600.0)
+    assert estimate.high_m2 == pytest.approx(600.0)
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_bounds_cover_exact_area_on_bent_routes(seed):
+    rng = np.random.default_rng(seed)
+    xs = np.cumsum(np.r_[0, rng.uniform(-30, 30, 5)])
+    ys = np.cumsum(np.r_[0, rng.uniform(5, 30, 5)])
+    rects = []
+    for _ in range(12):
+        x0, y0 = rng.uniform(xs.min() - 10, xs.max() + 10), rng.uniform(ys.min() - 10, ys.max() + 10)
+        rects.append((x0, y0, x0 + rng.uniform(0.5, 15), y0 + rng.uniform(0.5, 15)))
+
+    estimate = _estimate(xs, ys, rects)
+    area = _exact_area(xs, ys, rects)
+
+    # 格網量測本身有誤差，留 1% 餘裕
+    assert estimate.low_m2 <= area * 1.01 + 0.5
+    assert area <= estimate.high_m2 * 1.01 + 0.5
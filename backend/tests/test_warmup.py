@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from api import warmup
+from api.warmup import WarmupState, warmup_loop
+
+
+@pytest.fixture
+def state(monkeypatch):
+    import main
+
+    fresh = WarmupState()
+    monkeypatch.setattr(warmup, "warmup_state", fresh)
+    monkeypatch.setattr(main, "warmup_state", fresh)
+    monkeypatch.setenv("WARMUP_ENABLED", "1")
+    monkeypatch.setenv("WARMUP_RETRY_S", "0")
+    return fresh
+
+
+@pytest.fixture
+def client():
+    import main
+
+    # 不進 lifespan：暖機由各測試自己驅動
+    return TestClient(main.app)
+
+
+def test_ready_is_503_until_warmup_finishes(state, client, monkeypatch):
+    calls = []
+
+    async def run_warmup():
+        calls.append(1)
+        warmup.warmup_state.steps_ms["queries"] = 1.0
+
+    monkeypatch.setattr(warmup, "run_warmup", run_warmup)
+
+    before = client.get("/ready")
+    assert before.status_code == 503
+    assert before.json()["status"] == "pending"
+
+    asyncio.run(warmup_loop())
+
+    after = client.get("/ready")
+    assert after.status_code == 200
+    body = after.json()
+    assert body["status"] == "ready"
+    assert body["attempts"] == 1
+    assert body["steps_ms"] == {"queries": 1.0}
+    assert body["warmup_s"] is not None
+    assert calls == [1]
+
+
+def test_failed_warmup_is_reported_then_retried(state, client, monkeypatch):
+    attempts = []
+    between = []
+
+    async def run_warmup():
+        attempts.append(client.get("/ready").json()["status"])
+        if len(attempts) == 1:
+            raise RuntimeError("connection refused")
+
+    async def no_wait(_):
+        # 重試前的等待期間，/ready 應回報失敗原因
+        response = client.get("/ready")
+        between.append((response.status_code, response.json()["status"], response.json()["error"]))
+
+    monkeypatch.setattr(warmup, "run_warmup", run_warmup)
+    monkeypatch.setattr(warmup.asyncio, "sleep", no_wait)
+
+    asyncio.run(warmup_loop())
+
+    assert attempts == ["warming", "warming"]
+    assert between == [(503, "failed", "connection refused")]
+    body = client.get("/ready").json()
+    assert body["status"] == "ready"
+    assert body["attempts"] == 2
+    assert body["error"] is None
+
+
+def test_disabled_warmup_is_ready_immediately(state, client, monkeypatch):
+    async def run_warmup():
+        raise AssertionError("不應執行暖機")
+
+    monkeypatch.setattr(warmup, "run_warmup", run_warmup)
+    monkeypatch.setenv("WARMUP_ENABLED", "0")
+
+    asyncio.run(warmup_loop())
+
+    assert client.get("/ready").status_code == 200